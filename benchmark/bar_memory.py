@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, '..', 'tool'))
+
+from bar_series import read_bar_series
+from synthetic_bars import generate_bars
+
+MIB = 2**20
+
+
+def load_dataframe_lists(csv_file):
+    """原本的讀取方式：float64/object DataFrame，再轉成 Python 的時間、開盤價和收盤價列表"""
+    df = pd.read_csv(csv_file)
+    df['ts'] = pd.to_datetime(df['ts'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
+    return df, (df['ts'].tolist(), df['open'].tolist(), df['close'].tolist())
+
+
+def load_dataframe(csv_file):
+    """float64 DataFrame (不轉成列表)"""
+    df = pd.read_csv(csv_file)
+    df['ts'] = pd.to_datetime(df['ts'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
+    return df
+
+
+def load_bar_series(csv_file):
+    """BarSeries 的預設設定：int64 時間、float64 價格、int64 成交量"""
+    return read_bar_series(csv_file, time_format='%Y-%m-%d %H:%M:%S', errors='coerce')
+
+
+def load_bar_series_compact(csv_file):
+    """指定 float32 價格、int32 成交量的 BarSeries (合成數據為整數點數，可以精確轉換)"""
+    return read_bar_series(csv_file, time_format='%Y-%m-%d %H:%M:%S', errors='coerce',
+                           price_dtype=np.float32, volume_dtype=np.int32)
+
+
+# 名稱 -> 讀取函數
+LOADERS = {
+    'dataframe+lists': load_dataframe_lists,
+    'dataframe': load_dataframe,
+    'bar_series': load_bar_series,
+    'bar_series_f32': load_bar_series_compact,
+}
+
+
+def measure(loader, csv_file):
+    """返回讀取後仍佔用的記憶體和讀取過程中的峰值 (bytes)"""
+    gc.collect()
+    tracemalloc.start()
+    result = loader(csv_file)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='量測每一百萬根K棒讀入記憶體後的大小')
+    parser.add_argument('--size', default='1y', help='synthetic_bars 的數據長度 (例如 1y、3y)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = generate_bars(args.size, seed=args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'bars.csv')
+        df.to_csv(csv_file, index=False, date_format='%Y-%m-%d %H:%M:%S')
+        scale = 10**6 / len(df)
+        print(f"{len(df)} 根K棒 (CSV {os.path.getsize(csv_file) / MIB:.1f} MiB)，以下為每一百萬根K棒的數值")
+        for name, loader in LOADERS.items():
+            retained, peak = measure(loader, csv_file)
+            print(f"{name:<16} 佔用 {retained * scale / MIB:8.1f} MiB  峰值 {peak * scale / MIB:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, '..', 'tool'))
+sys.path.append(os.path.join(BASE_DIR, '..', 'strategy'))
+
+import raw_to_reading
+import resample
+import Euler_Strategy as euler
+import Dual_Moving_Average_Turning_Point_Strategy as dual_ma
+from synthetic_bars import SIZES, generate_bars
+
+
+def stage_aggregate(raw):
+    """raw_to_reading.aggregate_data：一分鐘K棒聚合為日K"""
+    return lambda: raw_to_reading.aggregate_data(raw.copy(), '13:45')
+
+
+def stage_resample(raw):
+    """resample.resample_bars：同時產生多個週期"""
+    return lambda: resample.resample_bars(raw, ['5min', '15min', '60min', 'day', 'night'])
+
+
+def stage_euler(raw):
+    """Euler_Strategy.euler_predict + generate_signals"""
+    timestamps, open_prices, prices = euler.process_data(raw)
+    return lambda: euler.generate_signals(timestamps, prices, open_prices, 10, 0.00002, 18)
+
+
+def stage_moving_average(raw):
+    """calculate_moving_averages + find_moving_average_signals"""
+    df = raw.rename(columns={'ts': 'date'})
+    return lambda: dual_ma.find_moving_average_signals(dual_ma.calculate_moving_averages(df.copy(), 1, 3), 1, 3)
+
+
+def stage_plot(raw):
+    """plot.build_figure：建立 K 線圖 (需要 plotly)"""
+    import plot
+    return lambda: plot.build_figure(raw.copy())
+
+
+# 名稱 -> 準備函數 (返回要計時的函數)
+STAGES = {
+    'aggregate': stage_aggregate,
+    'resample': stage_resample,
+    'euler': stage_euler,
+    'moving_average': stage_moving_average,
+    'plot': stage_plot,
+}
+
+
+def measure(func, repeat):
+    """返回最短的執行時間 (秒) 和單次執行的記憶體峰值 (bytes)"""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    # 記憶體追蹤會拖慢執行，因此與計時分開量測
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, stages, repeat, seed):
+    """對每個數據大小執行各階段，返回結果列表"""
+    results = []
+    for size in sizes:
+        raw = generate_bars(size, seed=seed)
+        for name in stages:
+            try:
+                func = STAGES[name](raw)
+            except ImportError as e:
+                print(f"{size:>4} {name:<15} 略過 ({e})")
+                continue
+            seconds, peak = measure(func, repeat)
+            results.append({'size': size, 'rows': len(raw), 'stage': name,
+                            'seconds': seconds, 'peak_bytes': peak})
+            print(f"{size:>4} {name:<15} {len(raw):>9} 筆  {seconds:9.4f} 秒  {peak / 2**20:9.1f} MiB")
+    return results
+
+
+def compare(results, previous_file):
+    """與先前的結果比較，列出時間和記憶體的比例 (>1 代表變慢/變大)"""
+    with open(previous_file, 'r') as f:
+        previous = {(r['size'], r['stage']): r for r in json.load(f)['results']}
+    print(f"\n=== 與 {previous_file} 比較 ===")
+    for r in results:
+        old = previous.get((r['size'], r['stage']))
+        if old is None:
+            continue
+        print(f"{r['size']:>4} {r['stage']:<15} 時間 x{r['seconds'] / old['seconds']:6.2f}  "
+              f"記憶體 x{r['peak_bytes'] / max(old['peak_bytes'], 1):6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='以合成的台指期一分鐘K棒量測各階段的執行時間和記憶體')
+    parser.add_argument('--sizes', nargs='+', default=['1m', '6m', '1y'], choices=list(SIZES))
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-dir', default=os.path.join(BASE_DIR, 'results'))
+    parser.add_argument('--compare', help='要比較的先前結果檔案')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.stages, args.repeat, args.seed)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_file = os.path.join(args.output_dir, datetime.now().strftime('%Y%m%d_%H%M%S') + '.json')
+    with open(output_file, 'w') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'seed': args.seed,
+            'results': results,
+        }, f, indent=2)
+    print(f"\n結果已儲存至 {output_file}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, '..', 'tool'))
+
+from kbar_cache import trading_days_of
+
+# 產生類似台指期的一分鐘K棒 (不需要 Shioaji 帳號)
+# K棒時間為該分鐘的結束時間：日盤 08:46 ~ 13:45，夜盤 15:01 ~ 隔天 05:00
+DAY_SESSION = (8 * 60 + 46, 13 * 60 + 45)
+NIGHT_SESSION = (15 * 60 + 1, 24 * 60 + 5 * 60)
+
+# 預設的數據長度 (交易日曆的天數)
+SIZES = {
+    '1m': 31,
+    '6m': 182,
+    '1y': 365,
+    '3y': 3 * 365,
+    '10y': 10 * 365,
+}
+
+
+def trading_days(start_date, n_days, rng, holiday_rate=0.02):
+    """返回交易日列表：排除週末，並隨機挑選部分平日作為假日 (含一段連續的農曆年假)"""
+    days = pd.date_range(start_date, periods=n_days, freq='D')
+    days = days[days.dayofweek < 5]
+    holidays = rng.random(len(days)) < holiday_rate
+    # 每年二月第一週休市 (模擬農曆年假)
+    lunar = (days.month == 2) & (days.day <= 7)
+    return days[~(holidays | lunar)]
+
+
+def session_minutes():
+    """返回一個交易日內所有K棒相對於當天零時的分鐘數，以及是否為夜盤"""
+    day = np.arange(DAY_SESSION[0], DAY_SESSION[1] + 1)
+    night = np.arange(NIGHT_SESSION[0], NIGHT_SESSION[1] + 1)
+    minutes = np.concatenate([day, night])
+    is_night = np.concatenate([np.zeros(len(day), dtype=bool), np.ones(len(night), dtype=bool)])
+    return minutes, is_night
+
+
+def generate_bars(size='1y', seed=0, start_date='2015-01-05', start_price=9000.0, gap_rate=0.003):
+    """
+    產生固定種子的一分鐘K棒，包含日盤、夜盤、假日、缺漏的K棒和盤中成交量變化。
+    :param size: SIZES 中的名稱或交易日曆天數
+    :param seed: 隨機種子，相同參數會產生相同數據
+    :param gap_rate: 隨機缺漏K棒的比例
+    :return: 欄位與 fetch_kbars 相同的 DataFrame (ts/open/high/low/close/volume)
+    """
+    rng = np.random.default_rng(seed)
+    n_days = SIZES[size] if isinstance(size, str) else int(size)
+    days = trading_days(start_date, n_days, rng)
+    minutes, is_night = session_minutes()
+
+    ts = (days.to_numpy(dtype='datetime64[ns]')[:, None]
+          + (minutes * 60 * 10**9).astype('timedelta64[ns]')[None, :]).ravel()
+    night = np.tile(is_night, len(days))
+    position = np.tile(np.concatenate([np.linspace(0, 1, (~is_night).sum()), np.linspace(0, 1, is_night.sum())]), len(days))
+    keep = rng.random(len(ts)) >= gap_rate
+    ts, night, position = ts[keep], night[keep], position[keep]
+    n = len(ts)
+
+    # 波動度會隨時間改變，夜盤波動較小；開盤時有跳空
+    regime = rng.lognormal(0.0, 0.35, len(days) * 2 + 1)
+    session_index = np.cumsum(np.concatenate(([0], np.diff(night.astype(int)) != 0)))
+    volatility = np.where(night, 0.6, 1.0) * regime[session_index] * 4.0
+    returns = rng.standard_t(4, n) * volatility
+    session_open = np.concatenate(([True], session_index[1:] != session_index[:-1]))
+    returns[session_open] += rng.normal(0, 30, session_open.sum())
+    close = np.round(start_price + np.cumsum(returns))
+    close = np.maximum(close, 1000.0)
+
+    open_ = np.round(np.concatenate(([start_price], close[:-1])) + rng.normal(0, 1.0, n))
+    spread = np.abs(rng.normal(0, volatility))
+    high = np.maximum(open_, close) + np.round(spread)
+    low = np.minimum(open_, close) - np.round(spread * rng.random(n))
+
+    # 成交量在開盤和收盤時較大 (U 形)，夜盤較小
+    u_shape = 1.0 + 3.0 * (position - 0.5) ** 2 * 4
+    volume = rng.poisson(np.where(night, 80, 300) * u_shape).astype(np.int64) + 1
+
+    return pd.DataFrame({
+        'ts': ts,
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume,
+    })
+
+
+class FakeKbarsAPI:
+    """
+    本地的假 Shioaji API，用於在沒有帳號的情況下測試歷史K棒下載 (get_raw_data_from_shioaji)。
+    數據由 generate_bars 一次產生，kbars 依交易日 (夜盤屬於下一個交易日) 返回區間內的K棒，
+    因此不論如何分段下載，合併後都是同一份數據。
+    """
+
+    def __init__(self, size=91, seed=0, start_date='2024-01-01', fail_ranges=(), remaining_bytes=None):
+        """
+        :param size: 數據長度 (見 generate_bars)
+        :param fail_ranges: 第一次請求時拋出例外的區間開始日期 (測試續傳)
+        :param remaining_bytes: usage() 返回的剩餘流量，None 代表不限制；每次請求依K棒數量扣除
+        """
+        self.bars = generate_bars(size, seed, start_date)
+        self.days = trading_days_of(self.bars['ts']).astype(str)
+        self.fail_ranges = set(fail_ranges)
+        self.remaining_bytes = remaining_bytes
+        self.calls = []  # [(開始日期, 結束日期, time.monotonic()), ...]
+        self.lock = threading.Lock()
+
+    def expected(self, start, end):
+        """返回交易日在 [start, end] 之間的K棒 (測試用的正確答案)"""
+        return self.bars[(self.days >= start) & (self.days <= end)].reset_index(drop=True)
+
+    def kbars(self, contract, start, end, **kwargs):
+        with self.lock:
+            self.calls.append((start, end, time.monotonic()))
+            if start in self.fail_ranges:
+                self.fail_ranges.discard(start)
+                raise ConnectionError(f"模擬的連線中斷: {start} ~ {end}")
+            df = self.expected(start, end)
+            if self.remaining_bytes is not None:
+                self.remaining_bytes -= len(df) * 48
+        return SimpleNamespace(
+            ts=df['ts'].to_numpy(dtype='datetime64[ns]').view(np.int64).tolist(),
+            Open=df['open'].tolist(),
+            High=df['high'].tolist(),
+            Low=df['low'].tolist(),
+            Close=df['close'].tolist(),
+            Volume=df['volume'].tolist(),
+            Amount=(df['close'] * df['volume']).tolist(),
+        )
+
+    def usage(self):
+        return SimpleNamespace(remaining_bytes=self.remaining_bytes)
+
+
+if __name__ == "__main__":
+    for name in SIZES:
+        df = generate_bars(name)
+        print(f"{name}: {len(df)} 根K棒，{df['ts'].iloc[0]} ~ {df['ts'].iloc[-1]}")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+# 逐筆成交的交易時段 (交易日 D 包含前一天 15:00 開始的夜盤和當天的日盤)，單位為相對於 D 零時的分鐘
+NIGHT_SESSION = (15 * 60 - 24 * 60, 5 * 60)
+DAY_SESSION = (8 * 60 + 45, 13 * 60 + 45)
+
+
+def generate_ticks(date, seed=0, ticks_per_minute=40, holiday_rate=0.02, start_price=9000.0):
+    """
+    產生一個交易日的逐筆成交，同一日期和種子一定產生相同數據 (與下載順序無關)。
+    週末和隨機挑選的假日沒有成交。
+    :return: 包含 ts/price/volume/tick_type 列的 DataFrame
+    """
+    day = pd.Timestamp(date)
+    rng = np.random.default_rng([seed, day.toordinal()])
+    if day.dayofweek >= 5 or rng.random() < holiday_rate:
+        return pd.DataFrame({'ts': pd.to_datetime(np.array([], dtype='datetime64[ns]')),
+                             'price': np.array([], dtype=np.float64),
+                             'volume': np.array([], dtype=np.int64), 'tick_type': np.array([], dtype=np.int64)})
+
+    times = []
+    for start, end in (NIGHT_SESSION, DAY_SESSION):
+        n = rng.poisson(ticks_per_minute * (end - start))
+        # 毫秒精度，同一毫秒可能有多筆成交
+        offsets = np.sort(rng.integers(start * 60_000, end * 60_000 + 1, n))
+        times.append(offsets)
+    offsets = np.concatenate(times)
+    n = len(offsets)
+
+    steps = rng.choice([-1, 0, 1], n, p=[0.3, 0.4, 0.3])
+    price = np.round(start_price + rng.normal(0, 200)) + np.cumsum(steps)
+    tick_type = np.where(steps > 0, 1, np.where(steps < 0, 2, rng.integers(1, 3, n)))
+    return pd.DataFrame({
+        'ts': day.to_datetime64() + offsets.astype('timedelta64[ms]'),
+        'price': price.astype(np.float64),
+        'volume': rng.geometric(0.5, n).astype(np.int64),
+        'tick_type': tick_type,
+    })
+
+
+class FakeTickAPI:
+    """
+    本地的假 Shioaji API，用於在沒有帳號的情況下測試逐筆成交下載 (get_ticks_from_shioaji)。
+    ticks 返回與 Shioaji 相同屬性的物件 (ts 為 int64 奈秒列表，close/volume/tick_type 等為列表)。
+    """
+
+    def __init__(self, seed=0, ticks_per_minute=40, fail_dates=(), remaining_bytes=None, empty_dates=()):
+        """
+        :param fail_dates: 第一次請求時拋出例外的日期 (測試續傳)
+        :param empty_dates: 返回沒有成交的日期 (模擬資料尚未就緒)
+        :param remaining_bytes: usage() 返回的剩餘流量，None 代表不限制；每次請求依成交筆數扣除
+        """
+        self.seed = seed
+        self.ticks_per_minute = ticks_per_minute
+        self.fail_dates = set(fail_dates)
+        self.remaining_bytes = remaining_bytes
+        self.empty_dates = set(empty_dates)
+        self.calls = []
+
+    def ticks(self, contract, date, **kwargs):
+        self.calls.append(date)
+        if date in self.fail_dates:
+            self.fail_dates.discard(date)
+            raise ConnectionError(f"模擬的連線中斷: {date}")
+        df = generate_ticks(date, self.seed, self.ticks_per_minute)
+        if date in self.empty_dates:
+            df = df.iloc[:0]
+        if self.remaining_bytes is not None:
+            self.remaining_bytes -= len(df) * 64
+        price = df['price'].tolist()
+        return SimpleNamespace(
+            ts=df['ts'].to_numpy(dtype='datetime64[ns]').view(np.int64).tolist(),
+            close=price,
+            volume=df['volume'].tolist(),
+            bid_price=[p - 1 for p in price],
+            bid_volume=[1] * len(df),
+            ask_price=[p + 1 for p in price],
+            ask_volume=[1] * len(df),
+            tick_type=df['tick_type'].tolist(),
+        )
+
+    def usage(self):
+        return SimpleNamespace(remaining_bytes=self.remaining_bytes)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+import os
+import sys
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tool'))
+from profiling import profiled, stage
+import trade_log
+from bar_series import read_bar_series
+from Performance_Metrics import compute_metrics
+
+def running_total(values):
+    """
+    依陣列順序逐一累加，返回總和 (float)。
+    結果與原本逐筆相加的迴圈完全相同；np.sum 使用成對相加，最後幾位小數可能不同，使回測結果無法逐筆比對。
+    """
+    return float(np.cumsum(np.concatenate(([0.0], np.asarray(values, dtype=np.float64))))[-1])
+
+def find_trades(buy_candidates, sell_candidates):
+    """
+    依序配對買入和賣出信號：沒有持倉時取下一個買入信號，持倉時取其後的下一個賣出信號。
+    等同於在信號序列中只保留每段連續相同信號的第一個，並去掉開頭的賣出信號。
+    :return: 買入索引陣列和賣出索引陣列 (最後一筆可能只有買入)
+    """
+    events = np.flatnonzero(buy_candidates | sell_candidates)
+    is_buy = buy_candidates[events]
+    keep = np.empty(len(events), dtype=bool)
+    keep[:1] = True
+    keep[1:] = is_buy[1:] != is_buy[:-1]
+    trades, is_buy = events[keep], is_buy[keep]
+    if len(trades) > 0 and not is_buy[0]:
+        trades, is_buy = trades[1:], is_buy[1:]
+    return trades[is_buy], trades[~is_buy]
+
+def cost_totals(costs, transaction_fee):
+    """
+    依交易順序 (買、賣交錯) 累加 CostModel.costs 的總獲利金額、總手續費和總交易稅，與逐筆累加的結果一致。
+    :param costs: CostModel.costs 返回的 dict
+    :param transaction_fee: 每次交易的手續費
+    :return: 總獲利金額、總手續費、總交易稅和總交易次數
+    """
+    n_buys, n_sells = len(costs['buy_total']), len(costs['sell_total'])
+    total_trades = n_buys + n_sells
+    taxes = np.empty(total_trades)
+    taxes[0::2] = costs['buy_tax']
+    taxes[1::2] = costs['sell_tax']
+    total_transaction_tax = running_total(taxes)
+    total_transaction_fee = running_total(np.full(total_trades, float(transaction_fee)))
+    profits = costs['sell_total'] - costs['buy_total'][:n_sells]
+    total_profit_in_money = running_total(profits)
+    return total_profit_in_money, total_transaction_fee, total_transaction_tax, total_trades
+
+class CostModel:
+    """
+    共用的成本模型 (與 Euler_Strategy.generate_signals 相同)：
+    成交價金 = 成交點數 * 每點金額，交易稅 = 成交價金 * 稅率，每次交易收取固定手續費。
+    """
+
+    def __init__(self, profit_per_point, transaction_fee, transaction_tax_rate):
+        self.profit_per_point = profit_per_point
+        self.transaction_fee = transaction_fee
+        self.transaction_tax_rate = transaction_tax_rate
+
+    def costs(self, fill_prices, buys, sells):
+        """
+        計算每筆交易的成交價金、交易稅和淨收付。
+        :param fill_prices: 成交價格陣列
+        :param buys: 買入成交的索引陣列
+        :param sells: 賣出成交的索引陣列
+        :return: 包含各筆交易數值陣列的 dict
+        """
+        buy_price = fill_prices[buys]
+        buy_total = buy_price * self.profit_per_point
+        buy_tax = buy_total * self.transaction_tax_rate  # 計算買入時的交易稅
+        buy_net_cost = -(buy_total + self.transaction_fee + buy_tax)  # 買入的淨收付為負值
+        sell_price = fill_prices[sells]
+        sell_total = sell_price * self.profit_per_point
+        sell_tax = sell_total * self.transaction_tax_rate  # 計算賣出時的交易稅
+        sell_net_revenue = sell_total - (self.transaction_fee + sell_tax)  # 賣出的淨收付為正值
+        net_profit = sell_net_revenue + buy_net_cost[:len(sells)]  # 賣出淨收付減去買入淨收付
+        return {
+            'buy_price': buy_price, 'buy_total': buy_total, 'buy_tax': buy_tax, 'buy_net_cost': buy_net_cost,
+            'sell_price': sell_price, 'sell_total': sell_total, 'sell_tax': sell_tax,
+            'sell_net_revenue': sell_net_revenue, 'net_profit': net_profit,
+        }
+
+    def totals(self, costs):
+        """見 cost_totals"""
+        return cost_totals(costs, self.transaction_fee)
+
+    def trades(self, timestamps, costs, buys, sells):
+        """將成交時間和 costs 組成結構化的交易紀錄 (見 trade_log.TRADE_FIELDS)"""
+        return trade_log.make_trades(
+            {'ts': timestamps[buys], 'price': costs['buy_price'], 'total': costs['buy_total'],
+             'fee': self.transaction_fee, 'tax': costs['buy_tax'], 'net': costs['buy_net_cost']},
+            {'ts': timestamps[sells], 'price': costs['sell_price'], 'total': costs['sell_total'],
+             'fee': self.transaction_fee, 'tax': costs['sell_tax'], 'net': costs['sell_net_revenue'],
+             'profit': costs['net_profit']},
+        )
+
+class Strategy(ABC):
+    """
+    策略介面：signals 根據共用的K棒陣列返回買入和賣出的信號索引 (由引擎配對成交)。
+    fill_price 為成交使用的價格欄位，fill_delay 為信號到成交相隔的K棒數量。
+    """
+    name = 'strategy'
+    fill_price = 'close'
+    fill_delay = 0
+
+    @abstractmethod
+    def signals(self, bars):
+        """
+        :param bars: load_bars 返回的 BarSeries
+        :return: 買入信號索引陣列和賣出信號索引陣列 (買、賣交錯，最後一筆可能只有買入)
+        """
+
+@profiled('Backtest_Engine.load_bars')
+def load_bars(input_file):
+    """
+    讀取CSV檔案或 bar store 資料夾一次，返回所有策略共用的 BarSeries。
+    時間欄位 ('ts' 或 'date') 都可以用 bars['ts'] 取出 (datetime64[ns])。
+    """
+    return read_bar_series(input_file)
+
+@profiled('Backtest_Engine.run_backtest')
+def run_backtest(bars, strategies, cost_model, metrics=False, calendar=None):
+    """
+    在同一份K棒陣列上執行多個策略，使用同一個成本模型計算交易成本。
+    :param bars: load_bars 返回的 BarSeries (或 {欄位名稱: 陣列})
+    :param strategies: Strategy 物件列表 (名稱需不同)
+    :param cost_model: CostModel
+    :param metrics: 是否加入權益曲線的績效指標 (最大回撤、持倉比例、Sharpe 等，見 Performance_Metrics)
+    :param calendar: 同一份K棒的交易時段索引 (見 session_calendar.load_calendar)，計算績效指標時使用
+    :return: 每個策略一列的總結 DataFrame，以及 {策略名稱: 交易紀錄}
+    """
+    rows = []
+    trades = {}
+    for strategy in strategies:
+        with stage(f'Backtest_Engine.strategy.{strategy.name}') as s:
+            buys, sells = strategy.signals(bars)
+            buys = np.asarray(buys, dtype=np.int64) + strategy.fill_delay
+            sells = np.asarray(sells, dtype=np.int64) + strategy.fill_delay
+            fill_prices = np.asarray(bars[strategy.fill_price], dtype=np.float64)
+            costs = cost_model.costs(fill_prices, buys, sells)
+            profit, fee, tax, total_trades = cost_model.totals(costs)
+            points = fill_prices[sells] - fill_prices[buys[:len(sells)]]
+            trades[strategy.name] = cost_model.trades(bars['ts'], costs, buys, sells)
+            s.rows = total_trades
+        rows.append({
+            'strategy': strategy.name,
+            'trades': total_trades,
+            'profit_points': running_total(points),
+            'profit': profit,
+            'fee': fee,
+            'tax': tax,
+            'net_profit': profit - fee - tax,
+        })
+        if metrics:
+            values, _, _ = compute_metrics(bars['ts'], bars['close'], fill_prices, buys, sells, cost_model,
+                                           calendar=calendar)
+            rows[-1].update({name: values[name] for name in
+                             ('max_drawdown', 'exposure', 'win_rate', 'profit_factor', 'sharpe', 'sortino', 'calmar')})
+    return pd.DataFrame(rows), trades
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from Backtest_Engine import CostModel, load_bars, run_backtest
+from Euler_Strategy import EulerStrategy
+from Dual_Moving_Average_Turning_Point_Strategy import DualMovingAverageStrategy
+
+def run_strategy(input_file, costs, strategy):
+    """
+    以 Backtest_Engine 執行一個策略，成本由 CostModel 計算 (與 run_backtest 相同)。
+    :param costs: {'profit_per_point', 'transaction_fee', 'transaction_tax_rate'}
+    :return: K棒數量、總獲利金額、總手續費、總交易稅和總交易次數
+    """
+    bars = load_bars(input_file)
+    summary, _ = run_backtest(bars, [strategy], CostModel(**costs))
+    row = summary.iloc[0]
+    return len(bars['close']), float(row['profit']), float(row['fee']), float(row['tax']), int(row['trades'])
+
+def run_euler(input_file, costs, params):
+    """執行歐拉策略，返回K棒數量、總獲利金額、總手續費、總交易稅和總交易次數"""
+    return run_strategy(input_file, costs, EulerStrategy(params.get('variant', 'momentum')))
+
+def run_ma(input_file, costs, params):
+    """執行均線交叉策略 (以交叉當根K棒的收盤價成交)，返回與 run_euler 相同的欄位"""
+    strategy = DualMovingAverageStrategy(params.get('short_window', 1), params.get('long_window', 3))
+    return run_strategy(input_file, costs, strategy)
+
+# 策略名稱 -> 執行函數
+STRATEGIES = {
+    'euler': run_euler,
+    'ma': run_ma,
+}
+
+def run_contract(strategy, name, input_file, costs, params):
+    """在子行程中回測一個商品，失敗時記錄錯誤而不中斷其他商品"""
+    try:
+        bars, profit, fee, tax, trades = STRATEGIES[strategy](input_file, costs, params)
+        error = None
+    except Exception as e:
+        bars, profit, fee, tax, trades = 0, np.nan, np.nan, np.nan, 0
+        error = f"{type(e).__name__}: {e}"
+    return {
+        'contract': name,
+        'input_file': input_file,
+        'bars': bars,
+        'trades': trades,
+        'profit': profit,
+        'fee': fee,
+        'tax': tax,
+        'net_profit': profit - fee - tax,
+        'error': error,
+    }
+
+def data_size(input_file):
+    """估計數據大小 (CSV 檔案或 bar store 資料夾的總位元組數)，用於安排執行順序"""
+    if os.path.isdir(input_file):
+        return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(input_file) for f in files)
+    return os.path.getsize(input_file) if os.path.exists(input_file) else 0
+
+def batch_backtest(contracts, strategy, costs, params=None, processes=None):
+    """
+    以行程池同時回測多個商品，每個商品由一個子行程讀取數據並執行策略。
+    :param contracts: [(商品名稱, CSV 檔案或 bar store 資料夾), ...]，
+                      可加上第三個元素 {成本名稱: 值} 覆蓋該商品的成本設定 (例如小台的每點金額)
+    :param strategy: 'euler' 或 'ma'
+    :param costs: 共用的成本設定 {'profit_per_point', 'transaction_fee', 'transaction_tax_rate'}
+    :param params: 策略參數，例如 {'variant': 'momentum'} 或 {'short_window': 5, 'long_window': 20}
+    :param processes: 行程數，1 代表不使用行程池，None 代表使用所有核心
+    :return: 每個商品一列的總結 DataFrame，依輸入順序排列
+    """
+    params = params or {}
+    jobs = []
+    for contract in contracts:
+        name, input_file = contract[0], contract[1]
+        contract_costs = dict(costs, **(contract[2] if len(contract) > 2 else {}))
+        jobs.append((name, input_file, contract_costs))
+
+    # 大的數據先執行，避免最後只剩一個行程在處理大檔案
+    order = sorted(range(len(jobs)), key=lambda k: data_size(jobs[k][1]), reverse=True)
+    results = [None] * len(jobs)
+    if processes == 1:
+        for k in order:
+            results[k] = run_contract(strategy, *jobs[k], params)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = {k: executor.submit(run_contract, strategy, *jobs[k], params) for k in order}
+            for k, future in futures.items():
+                results[k] = future.result()
+    return pd.DataFrame(results)
+
+# 自訂商品列表和參數
+contracts = [
+    ('TXFR2', 'daily_report.csv'),
+    # ('MXFR1', 'bars/MXFR1/1min', {'profit_per_point': 50}),
+]
+strategy = 'euler'  # 'euler' 或 'ma'
+costs = {
+    'profit_per_point': 10,  # 每點的獲利金額
+    'transaction_fee': 18,  # 每次交易的手續費
+    'transaction_tax_rate': 0.00002,  # 每元的交易稅率
+}
+params = {}  # 策略參數，例如 {'variant': 'prediction'} 或 {'short_window': 5, 'long_window': 20}
+output_file = 'batch_output.csv'
+
+if __name__ == "__main__":
+    summary = batch_backtest(contracts, strategy, costs, params)
+    print(summary.to_string(index=False))
+    print(f"\n合計實際盈利: {summary['net_profit'].sum():.2f} 元")
+    summary.to_csv(output_file, index=False)
+    print(f"結果已儲存至 {output_file}")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from Dual_Moving_Average_Turning_Point_Strategy import load_data, find_crossovers, total_profit_points
+
+# 子行程共用的陣列 (由 init_worker 設定)
+_shared = {}
+
+def moving_average_matrix(close, windows):
+    """
+    一次計算所有窗口的移動平均線，與 calculate_moving_averages 的結果相同。
+    :param close: 收盤價陣列
+    :param windows: 窗口大小列表
+    :return: 形狀為 (窗口數, 數據長度) 的陣列
+    """
+    series = pd.Series(np.asarray(close, dtype=np.float64))
+    matrix = np.empty((len(windows), len(series)))
+    for k, window in enumerate(windows):
+        matrix[k] = series.rolling(window=window).mean().to_numpy()
+    return matrix
+
+def evaluate_pairs(close, ma_matrix, pairs):
+    """
+    計算每組 (短期索引, 長期索引) 的總獲利點數和交易次數。
+    :return: [(總獲利點數, 交易次數), ...]
+    """
+    results = []
+    for short_idx, long_idx in pairs:
+        buys, sells = find_crossovers(ma_matrix[short_idx], ma_matrix[long_idx])
+        results.append((total_profit_points(close, buys, sells), len(buys) + len(sells)))
+    return results
+
+def init_worker(close_name, matrix_name, n_windows, n_bars):
+    """在子行程中連接共享記憶體，不複製價格和均線陣列"""
+    close_shm = shared_memory.SharedMemory(name=close_name)
+    matrix_shm = shared_memory.SharedMemory(name=matrix_name)
+    _shared['shm'] = (close_shm, matrix_shm)
+    _shared['close'] = np.ndarray((n_bars,), dtype=np.float64, buffer=close_shm.buf)
+    _shared['matrix'] = np.ndarray((n_windows, n_bars), dtype=np.float64, buffer=matrix_shm.buf)
+
+def evaluate_shared(pairs):
+    """子行程中使用共享陣列計算一批參數組合"""
+    return evaluate_pairs(_shared['close'], _shared['matrix'], pairs)
+
+def sweep(df, window_pairs, processes=None, batch_size=256):
+    """
+    對多組 (短期窗口, 長期窗口) 參數進行回測，均線只計算一次並透過共享記憶體分給多個行程。
+    :param df: 包含 'close' 列的 DataFrame
+    :param window_pairs: [(短期窗口, 長期窗口), ...]
+    :param processes: 行程數，1 代表不使用行程池，None 代表使用所有核心
+    :param batch_size: 每次交給子行程的參數組合數量
+    :return: 依總獲利點數排序的 DataFrame (short_window, long_window, profit_points, trades)
+    """
+    window_pairs = [(int(short), int(long)) for short, long in window_pairs]
+    windows = sorted({w for pair in window_pairs for w in pair})
+    position = {window: k for k, window in enumerate(windows)}
+    close = np.asarray(df['close'], dtype=np.float64)
+    index_pairs = [(position[short], position[long]) for short, long in window_pairs]
+
+    if processes == 1:
+        results = evaluate_pairs(close, moving_average_matrix(close, windows), index_pairs)
+    else:
+        close_shm = shared_memory.SharedMemory(create=True, size=max(close.nbytes, 1))
+        matrix_shm = shared_memory.SharedMemory(create=True, size=max(close.nbytes * len(windows), 1))
+        try:
+            np.ndarray(close.shape, dtype=np.float64, buffer=close_shm.buf)[:] = close
+            matrix = np.ndarray((len(windows), len(close)), dtype=np.float64, buffer=matrix_shm.buf)
+            matrix[:] = moving_average_matrix(close, windows)
+            batches = [index_pairs[k:k + batch_size] for k in range(0, len(index_pairs), batch_size)]
+            with ProcessPoolExecutor(max_workers=processes, initializer=init_worker,
+                                     initargs=(close_shm.name, matrix_shm.name, len(windows), len(close))) as executor:
+                results = [result for batch in executor.map(evaluate_shared, batches) for result in batch]
+            del matrix
+        finally:
+            close_shm.close()
+            close_shm.unlink()
+            matrix_shm.close()
+            matrix_shm.unlink()
+
+    table = pd.DataFrame(window_pairs, columns=['short_window', 'long_window'])
+    table['profit_points'] = [result[0] for result in results]
+    table['trades'] = [result[1] for result in results]
+    return table.sort_values('profit_points', ascending=False, kind='stable').reset_index(drop=True)
+
+def window_grid(short_windows, long_windows):
+    """產生所有短期窗口小於長期窗口的參數組合"""
+    return [(short, long) for short in short_windows for long in long_windows if short < long]
+
+# 自訂CSV檔案名稱和參數範圍
+taiex_file = 'daily_report.csv'  # 加權指數的CSV檔案
+short_windows = range(1, 31)  # 短期均線窗口範圍
+long_windows = range(2, 121)  # 長期均線窗口範圍
+output_file = 'sweep_output.csv'  # 輸出的檔案名稱
+
+if __name__ == "__main__":
+    table = sweep(load_data(taiex_file), window_grid(short_windows, long_windows))
+    print(table.head(20).to_string(index=False))
+    table.to_csv(output_file, index=False)
+    print(f"結果已儲存至 {output_file}")
@@ -1,49 +1,206 @@
 #!/usr/bin/env python3
+import os
+import sys
+import numpy as np
 import pandas as pd
+from collections import deque
 
-def load_data(file_name):
-    """讀取CSV檔案，返回包含日期和收盤價的DataFrame"""
-    df = pd.read_csv(file_name, parse_dates=['date'], dayfirst=True)
-    df['date'] = pd.to_datetime(df['date'])  # 確保 'date' 列是 datetime64[ns] 類型
-    return df
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tool'))
+from profiling import profiled
+import trade_log
+from bar_series import BarSeries, read_bar_series
+from Backtest_Engine import Strategy, find_trades, running_total
+
+@profiled('Dual_Moving_Average_Turning_Point_Strategy.load_data')
+def load_data(file_name, price_dtype=np.float64):
+    """
+    讀取CSV檔案或 bar store 資料夾，返回包含日期和收盤價的 BarSeries (見 bar_series)。
+    :param price_dtype: 價格的型態，整數點數的期貨價格可使用 np.float32 減少記憶體
+    """
+    return read_bar_series(file_name, dayfirst=True, price_dtype=price_dtype)
 
+@profiled('Dual_Moving_Average_Turning_Point_Strategy.calculate_moving_averages')
 def calculate_moving_averages(df, short_window, long_window):
-    """計算短期和長期移動平均線"""
+    """計算短期和長期移動平均線 (BarSeries 會先轉換為時間列名稱為 'date' 的 DataFrame)"""
+    if isinstance(df, BarSeries):
+        df = df.to_frame().rename(columns={df.time_column: 'date'})
     df['Short_MA'] = df['close'].rolling(window=short_window).mean()
     df['Long_MA'] = df['close'].rolling(window=long_window).mean()
     return df
 
+def crossover_candidates(short_ma, long_ma):
+    """
+    計算每根K棒是否出現均線交叉 (需要前一根K棒，第一根K棒不會有信號)。
+    :return: 上穿 (買入信號) 和下穿 (賣出信號) 的布林陣列
+    """
+    short_ma = np.asarray(short_ma, dtype=np.float64)
+    long_ma = np.asarray(long_ma, dtype=np.float64)
+    cross_up = np.zeros(len(short_ma), dtype=bool)
+    cross_down = np.zeros(len(short_ma), dtype=bool)
+    # 短期均線上穿長期均線 -> 買入信號；短期均線下穿長期均線 -> 賣出信號
+    cross_up[1:] = (short_ma[1:] > long_ma[1:]) & (short_ma[:-1] <= long_ma[:-1])
+    cross_down[1:] = (short_ma[1:] < long_ma[1:]) & (short_ma[:-1] >= long_ma[:-1])
+    return cross_up, cross_down
+
+def find_crossovers(short_ma, long_ma):
+    """
+    找出均線交叉的買入和賣出索引：沒有持倉時取下一個上穿點買入，持倉時取其後的下一個下穿點賣出。
+    :param short_ma: 短期均線陣列
+    :param long_ma: 長期均線陣列
+    :return: 買入索引陣列和賣出索引陣列 (最後一筆可能只有買入)
+    """
+    return find_trades(*crossover_candidates(short_ma, long_ma))
+
+def total_profit_points(close, buys, sells):
+    """依交易順序累加每筆交易的獲利點數"""
+    profits = close[sells] - close[buys[:len(sells)]]
+    return running_total(profits)
+
+@profiled('Dual_Moving_Average_Turning_Point_Strategy.find_moving_average_trades')
+def find_moving_average_trades(df, short_window, long_window):
+    """
+    檢測均線交叉點並以結構化陣列記錄交易，不產生任何文字。
+    成交價金和淨收付以點數計算 (不含手續費和交易稅)，並額外記錄當時的短期和長期均線。
+    :return: 交易紀錄 (見 trade_log.TRADE_FIELDS) 和總獲利點數
+    """
+    short_ma = df['Short_MA'].to_numpy(dtype=np.float64)
+    long_ma = df['Long_MA'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    dates = df['date'].to_numpy(dtype='datetime64[ns]')
+    buys, sells = find_crossovers(short_ma, long_ma)
+    profit_points = total_profit_points(close, buys, sells)
+    trades = trade_log.make_trades(
+        {'ts': dates[buys], 'price': close[buys], 'total': close[buys], 'net': -close[buys],
+         'short_ma': short_ma[buys], 'long_ma': long_ma[buys]},
+        {'ts': dates[sells], 'price': close[sells], 'total': close[sells], 'net': close[sells],
+         'profit': close[sells] - close[buys[:len(sells)]],
+         'short_ma': short_ma[sells], 'long_ma': long_ma[sells]},
+        extra_fields=[('short_ma', 'f8'), ('long_ma', 'f8')],
+    )
+    return trades, profit_points
+
+@profiled('Dual_Moving_Average_Turning_Point_Strategy.render_signals')
+def render_signals(trades):
+    """將交易紀錄轉成買賣信號文字 (只在需要顯示或輸出文字時呼叫)"""
+    rows = zip(pd.DatetimeIndex(trades['ts']).tolist(), trades['side'].tolist(), trades['price'].tolist(),
+               trades['profit'].tolist(), trades['short_ma'].tolist(), trades['long_ma'].tolist())
+    signals = []
+    for date, side, price, profit, short_ma, long_ma in rows:
+        if side == trade_log.BUY:
+            signals.append(f"{date}: 買入，價格= {price:.2f} (短期均線= {short_ma:.2f}, 長期均線= {long_ma:.2f})")
+        else:
+            signals.append(f"{date}: 賣出，價格= {price:.2f}，獲利= {profit:.2f} (短期均線= {short_ma:.2f}, 長期均線= {long_ma:.2f})")
+    return signals
+
 def find_moving_average_signals(df, short_window, long_window):
     """檢測均線交叉點並返回買賣信號，顯示短期和長期均線的計算值"""
-    signals = []
-    holding = False
-    buy_price = None
-    profit_points = 0
-    
-    for i in range(1, len(df)):
-        short_ma = df['Short_MA'].iloc[i]
-        long_ma = df['Long_MA'].iloc[i]
-        
+    trades, profit_points = find_moving_average_trades(df, short_window, long_window)
+    return render_signals(trades), profit_points
+
+class DualMovingAverageStrategy(Strategy):
+    """均線交叉策略的 Backtest_Engine 介面：在交叉當根K棒以收盤價成交"""
+    fill_price = 'close'
+    fill_delay = 0
+
+    def __init__(self, short_window, long_window):
+        self.short_window = short_window
+        self.long_window = long_window
+        self.name = f"ma_{short_window}_{long_window}"
+
+    def signals(self, bars):
+        close = pd.Series(bars['close'], dtype=np.float64)
+        short_ma = close.rolling(window=self.short_window).mean().to_numpy()
+        long_ma = close.rolling(window=self.long_window).mean().to_numpy()
+        return find_crossovers(short_ma, long_ma)
+
+# 逐筆均線與批次均線 (pandas rolling) 的容許誤差 (相對於價格)
+MA_TOLERANCE = 1e-12
+
+class RollingMean:
+    """
+    逐筆更新的移動平均，狀態大小固定 (最近 window 筆數值和累計和)。
+    累計和只做一般的加減，結果與 pandas rolling().mean() 的差異為捨入誤差 (整數點數的價格完全相同)；
+    每 window 筆重新加總一次，誤差不會隨數據長度累積。
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.sum_x = 0.0
+        self.nan_count = 0
+        self.updates = 0
+
+    def update(self, value):
+        """加入一筆數值並返回目前的移動平均 (數據不足或窗口內有 NaN 時為 NaN)"""
+        value = float(value)
+        if len(self.values) == self.window:
+            old = self.values.popleft()
+            if old == old:
+                self.sum_x -= old
+            else:
+                self.nan_count -= 1
+        self.values.append(value)
+        if value == value:
+            self.sum_x += value
+        else:
+            self.nan_count += 1
+
+        self.updates += 1
+        if self.updates % self.window == 0:
+            self.sum_x = sum(x for x in self.values if x == x)
+        if len(self.values) < self.window or self.nan_count > 0:
+            return float('nan')
+        return self.sum_x / self.window
+
+def ma_difference(short_ma, long_ma):
+    """短期均線減長期均線，差距在 MA_TOLERANCE 內視為相等 (返回 0)"""
+    diff = short_ma - long_ma
+    if abs(diff) <= MA_TOLERANCE * max(abs(long_ma), 1.0):
+        return 0.0
+    return diff
+
+class StreamingDualMovingAverage:
+    """
+    逐根K棒執行的均線交叉策略，每根K棒的計算量固定。
+    以 ma_difference 判斷交叉，均線在 MA_TOLERANCE 內的差異不影響信號，結果與 find_moving_average_signals 相同。
+    """
+
+    def __init__(self, short_window, long_window):
+        self.short_ma = RollingMean(short_window)
+        self.long_ma = RollingMean(long_window)
+        self.prev_diff = None
+        self.holding = False
+        self.buy_price = None
+        self.profit_points = 0.0
+
+    def update(self, date, close):
+        """
+        加入一根K棒，出現買賣信號時立即返回信號文字，否則返回 None。
+        """
+        short_ma = self.short_ma.update(close)
+        long_ma = self.long_ma.update(close)
+        diff = ma_difference(short_ma, long_ma)
+        prev_diff, self.prev_diff = self.prev_diff, diff
+        if prev_diff is None:
+            return None
+
         # 短期均線上穿長期均線 -> 買入信號
-        if short_ma > long_ma and df['Short_MA'].iloc[i-1] <= df['Long_MA'].iloc[i-1]:
-            if not holding:  # 如果沒有持倉
-                holding = True
-                buy_price = df['close'].iloc[i]
-                buy_date = df['date'].iloc[i]
-                signals.append(f"{buy_date}: 買入，價格= {buy_price:.2f} (短期均線= {short_ma:.2f}, 長期均線= {long_ma:.2f})")
-        
+        if diff > 0 and prev_diff <= 0:
+            if not self.holding:
+                self.holding = True
+                self.buy_price = close
+                return f"{date}: 買入，價格= {close:.2f} (短期均線= {short_ma:.2f}, 長期均線= {long_ma:.2f})"
+
         # 短期均線下穿長期均線 -> 賣出信號
-        elif short_ma < long_ma and df['Short_MA'].iloc[i-1] >= df['Long_MA'].iloc[i-1]:
-            if holding:  # 如果持倉
-                holding = False
-                sell_price = df['close'].iloc[i]
-                sell_date = df['date'].iloc[i]
-                profit = sell_price - buy_price
-                profit_points += profit
-                signals.append(f"{sell_date}: 賣出，價格= {sell_price:.2f}，獲利= {profit:.2f} (短期均線= {short_ma:.2f}, 長期均線= {long_ma:.2f})")
-    
-    return signals, profit_points
+        elif diff < 0 and prev_diff >= 0:
+            if self.holding:
+                self.holding = False
+                profit = close - self.buy_price
+                self.profit_points += profit
+                return f"{date}: 賣出，價格= {close:.2f}，獲利= {profit:.2f} (短期均線= {short_ma:.2f}, 長期均線= {long_ma:.2f})"
+        return None
 
+@profiled('Dual_Moving_Average_Turning_Point_Strategy.save_output_to_file')
 def save_output_to_file(file_name, signals, profit_points):
     """將買賣信號和總獲利點數保存到檔案"""
     with open(file_name, 'w') as f:
@@ -54,33 +211,40 @@ def save_output_to_file(file_name, signals, profit_points):
         f.write("\n=== 總結 ===\n")
         f.write(f"總獲利點數: {profit_points:.2f}\n")
 
-def main(taiex_file, short_window, long_window, output_file):
+def main(taiex_file, short_window, long_window, output_file, quiet=False, trades_file=None):
     taiex_df = load_data(taiex_file)
     
     # 計算移動平均線
     taiex_df = calculate_moving_averages(taiex_df, short_window, long_window)
     
-    # 找到均線交叉點信號
-    signals, profit_points = find_moving_average_signals(taiex_df, short_window, long_window)
+    # 找到均線交叉點 (quiet 時不產生信號文字，只儲存交易紀錄)
+    trades, profit_points = find_moving_average_trades(taiex_df, short_window, long_window)
+    if trades_file is not None:
+        trade_log.save_trades(trades_file, trades)
     
-    # 輸出買賣信號到終端機
-    print("\n=== 買賣信號 ===")
-    for signal in signals:
-        print(signal)
+    if not quiet:
+        # 輸出買賣信號到終端機
+        signals = render_signals(trades)
+        print("\n=== 買賣信號 ===")
+        for signal in signals:
+            print(signal)
     
     # 輸出總獲利點數到終端機
     print("\n=== 總結 ===")
     print(f"總獲利點數: {profit_points:.2f}")
     
     # 保存結果到檔案
-    save_output_to_file(output_file, signals, profit_points)
+    if not quiet:
+        save_output_to_file(output_file, signals, profit_points)
 
 # 自訂CSV檔案名稱和參數
 taiex_file = 'daily_report.csv'  # 加權指數的CSV檔案
 short_window = 1  # 短期均線窗口 (可由使用者設定)
 long_window = 3  # 長期均線窗口 (可由使用者設定)
 output_file = 'signals_output.txt'  # 輸出的檔案名稱
+quiet = False  # True 時不輸出信號文字，只輸出總結 (並在設定 trades_file 時儲存交易紀錄)
+trades_file = None  # 交易紀錄的檔案 (例如 'trades_output.npz'，None 代表不儲存)
 
 # 執行程式
 if __name__ == "__main__":
-    main(taiex_file, short_window, long_window, output_file)
+    main(taiex_file, short_window, long_window, output_file, quiet, trades_file)
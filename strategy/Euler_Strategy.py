@@ -1,115 +1,309 @@
 #!/usr/bin/env python3
+import os
+import sys
+import numpy as np
 import pandas as pd
 
-def load_data(input_file):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tool'))
+from profiling import profiled
+import trade_log
+from bar_series import read_bar_series
+from session_calendar import load_calendar
+from Backtest_Engine import CostModel, Strategy, cost_totals, find_trades
+
+@profiled('Euler_Strategy.load_data')
+def load_data(input_file, price_dtype=np.float64):
     """
-    讀取 CSV 檔案，並返回包含日期和收盤價的 DataFrame。
-    自動處理時間列，支持 'date' 或 'ts'。
-    :param input_file: CSV 檔案名稱
-    :return: 包含日期和收盤價的 DataFrame
+    讀取 CSV 檔案或 bar store 資料夾，並返回 BarSeries (見 bar_series)。
+    自動處理時間列，支持 'date' 或 'ts'，兩個名稱都可以取出時間陣列。
+    :param input_file: CSV 檔案名稱或 bar store 資料夾
+    :param price_dtype: 價格的型態，整數點數的期貨價格可使用 np.float32 減少記憶體
+    :return: 包含時間、開盤價和收盤價等欄位的 BarSeries
     """
-    df = pd.read_csv(input_file)
+    return read_bar_series(input_file, time_format='%Y-%m-%d %H:%M:%S', errors='coerce', price_dtype=price_dtype)
 
-    # 自動檢測是 'ts' 還是 'date' 作為時間列
-    if 'ts' in df.columns:
-        df['ts'] = pd.to_datetime(df['ts'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-    elif 'date' in df.columns:
-        df['ts'] = pd.to_datetime(df['date'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-    else:
-        raise ValueError("CSV 檔案中沒有找到 'ts' 或 'date' 列。")
+def to_datetime64(timestamps):
+    """將時間戳列表或陣列轉換為 datetime64[ns] 陣列"""
+    return np.asarray(pd.to_datetime(timestamps), dtype='datetime64[ns]')
 
-    return df
+def diff_minutes(timestamps):
+    """
+    計算相鄰時間戳的間隔（以分鐘為單位），NaT 的間隔為 NaN。
+    秒數的計算方式與 pandas Timedelta.total_seconds() 相同 (取到微秒)。
+    時間戳必須嚴格遞增：間隔為零或負數 (重複或未排序的K棒) 會使變化率變成 inf/NaN，直接拋出 ValueError。
+    """
+    ts = to_datetime64(timestamps)
+    diff_us = np.diff(ts.view('i8')) // 1000
+    seconds = (diff_us // 10**6) + (diff_us % 10**6) / 1e6
+    valid = ~(np.isnat(ts[1:]) | np.isnat(ts[:-1]))
+    bad = np.flatnonzero(valid & (diff_us <= 0))
+    if len(bad):
+        raise ValueError(f"時間戳必須嚴格遞增，第 {bad[0]} 和 {bad[0] + 1} 個時間戳的間隔為 {diff_us[bad[0]]} 微秒")
+    seconds[~valid] = np.nan
+    return seconds / 60.0
 
 def euler_predict(timestamps, prices):
     """
     使用歐拉法進行股價預測，考慮實際的時間間隔。
-    :param timestamps: 包含時間戳的列表
-    :param prices: 包含股價的列表
-    :return: 預測的股價列表
-    """
-
-    predicted_prices = prices[:2].copy()  # 複製前兩個元素作為初始值
-    for i in range(0, len(prices) - 3):  # 最後一個不用預測
-        # 計算時間間隔（以分鐘為單位）
-        # i+1 代表現在，i 代表前一個，i+2 代表未來
-        time_diff = (timestamps[i + 1] - timestamps[i]).total_seconds() / 60.0
-        rate_of_change = (prices[i + 1] - prices[i]) / time_diff  # 計算每分鐘的價格變化率
-        # 計算到目標時間點的時間間隔（分鐘）
-        target_diff = (timestamps[i + 2] - timestamps[i + 1]).total_seconds() / 60.0
-        
-        # 根據時間間隔預測目標時間點的價格
-        next_price = prices[i + 1] + rate_of_change * target_diff
-        predicted_prices.append(next_price)
+    :param timestamps: 包含時間戳的列表或 datetime64 陣列 (或 SessionCalendar.trading_clock 的交易時間，跳過休市時間)
+    :param prices: 包含股價的列表或陣列
+    :return: 預測的股價陣列
+    時間戳必須嚴格遞增，否則拋出 ValueError (見 diff_minutes)；逐筆計算的舊版本會接受負的間隔並算出反向的變化率。
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    if len(prices) < 3:
+        return prices[:2].copy()
 
+    # i+1 代表現在，i 代表前一個，i+2 代表未來；最後一個不用預測
+    minutes = diff_minutes(timestamps)
+    time_diff = minutes[:-2]
+    target_diff = minutes[1:-1]
+    rate_of_change = (prices[1:-2] - prices[:-3]) / time_diff  # 計算每分鐘的價格變化率
+
+    # 根據時間間隔預測目標時間點的價格
+    predicted_prices = np.empty(len(prices) - 1)
+    predicted_prices[:2] = prices[:2]  # 前兩個元素作為初始值
+    predicted_prices[2:] = prices[1:-2] + rate_of_change * target_diff
     return predicted_prices
 
+@profiled('Euler_Strategy.process_data')
 def process_data(df):
     """
-    處理 DataFrame，提取收盤價和時間戳。
-    :param df: 包含收盤價和日期的 DataFrame
-    :return: 收盤價列表和時間戳列表
+    處理 BarSeries 或 DataFrame，提取收盤價和時間戳 (BarSeries 不會複製數據)。
+    :param df: 包含收盤價和日期的 BarSeries 或 DataFrame
+    :return: 時間戳陣列 (datetime64[ns])、開盤價陣列和收盤價陣列
     """
-    timestamps = df['ts'].tolist()  # 提取時間戳列
-    prices_open = df['open'].tolist()  # 提取開盤價列
-    prices = df['close'].tolist()  # 提取收盤價列
+    timestamps = to_datetime64(df['ts'])  # 提取時間戳列
+    prices_open = np.asarray(df['open'])  # 提取開盤價列
+    prices = np.asarray(df['close'])  # 提取收盤價列
     return timestamps, prices_open, prices
 
-def generate_signals(timestamps, prices, open_prices, profit_per_point, transaction_tax_rate, transaction_fee):
+def signal_candidates(prices, predicted_prices, variant='momentum'):
+    """
+    計算每根K棒是否出現買入或賣出信號 (成交在下一根K棒)。
+    :param prices: 收盤價陣列
+    :param predicted_prices: euler_predict 的預測價格陣列
+    :param variant: 'momentum' 需要收盤價上漲/下跌且高於/低於預測價；'prediction' 只比較預測價
+    :return: 買入信號和賣出信號的布林陣列 (長度為預測價格數量減一)
+    """
+    n = len(predicted_prices) - 1
+    current, previous, predicted = prices[2:n], prices[1:n - 1], predicted_prices[2:n]
+    buy_candidates = np.zeros(max(n, 0), dtype=bool)
+    sell_candidates = np.zeros(max(n, 0), dtype=bool)
+    if variant == 'momentum':
+        buy_candidates[2:] = (current > previous) & (current > predicted)
+        sell_candidates[2:] = (current < previous) & (current < predicted)
+    elif variant == 'prediction':
+        buy_candidates[2:] = current > predicted
+        sell_candidates[2:] = current < predicted
+    else:
+        raise ValueError(f"未知的信號類型: {variant}")
+    return buy_candidates, sell_candidates
+
+def trade_costs(open_prices, buys, sells, profit_per_point, transaction_tax_rate, transaction_fee):
+    """
+    計算每筆交易的成交價金、交易稅和淨收付 (使用下一根K棒的開盤價成交，見 CostModel.costs)。
+    :return: 包含各筆交易數值陣列的 dict
+    """
+    return CostModel(profit_per_point, transaction_fee, transaction_tax_rate).costs(open_prices, buys + 1, sells + 1)
+
+def trade_totals(costs, transaction_fee):
     """
-    根據預測結果生成買賣信號，並計算總交易費用和獲利。
-    :param df: 包含收盤價和日期的DataFrame
+    依交易順序累加總獲利金額、總手續費和總交易稅 (見 Backtest_Engine.cost_totals)。
+    :return: 總獲利金額、總手續費、總交易稅和總交易次數
+    """
+    return cost_totals(costs, transaction_fee)
+
+@profiled('Euler_Strategy.generate_trades')
+def generate_trades(timestamps, prices, open_prices, profit_per_point, transaction_tax_rate, transaction_fee, variant='momentum', calendar=None):
+    """
+    根據預測結果找出所有交易，以結構化陣列記錄，不產生任何文字。
+    :param timestamps: 時間戳列表或 datetime64 陣列
+    :param prices: 收盤價列表或陣列
+    :param open_prices: 開盤價列表或陣列
     :param profit_per_point: 每點獲利金額（元）
     :param transaction_tax_rate: 交易稅率
     :param transaction_fee: 每次交易的手續費（元）
-    :return: 包含買賣信號、總獲利金額、總手續費、總交易稅和總交易次數的tuple
+    :param variant: 信號類型 (見 signal_candidates)
+    :param calendar: 這些K棒 (或包含它們的完整數據) 的交易時段索引，指定時以交易時間計算K棒間隔，避免午休和週末的間隔扭曲預測
+    :return: 包含交易紀錄 (見 trade_log.TRADE_FIELDS)、總獲利金額、總手續費、總交易稅和總交易次數的tuple
     """
-    signals = []
-    total_profit_in_money = 0.0  # 總獲利金額
-    total_transaction_fee = 0.0
-    total_transaction_tax = 0.0
-    
     if len(prices) < 3:
-        return signals, total_profit_in_money, total_transaction_fee, total_transaction_tax, 0
+        return trade_log.make_trades({'ts': []}, {'ts': []}), 0.0, 0.0, 0.0, 0
 
-    predicted_prices = euler_predict(timestamps, prices)
-    
-    in_position = False  # 是否持有倉位
-    buy_price = 0.0  # 買入價格
-    buy_net_cost = 0.0  # 買入時的淨收付
-    total_trades = 0  # 總交易次數
-
-    for i in range(2, len(predicted_prices) - 1):
-        if not in_position:
-            # 買入信號
-            if prices[i] > prices[i - 1] and prices[i] > predicted_prices[i]:
-            #if prices[i] > predicted_prices[i]:
-                buy_price = open_prices[i + 1]  # 使用下一分鐘的開盤價買入
-                buy_total = buy_price * profit_per_point
-                transaction_tax = buy_total * transaction_tax_rate  # 計算買入時的交易稅
-                buy_net_cost = - (buy_total + transaction_fee + transaction_tax)  # 買入的淨收付為負值
-                signals.append(f"買入於 {timestamps[i + 1].strftime('%Y-%m-%d %H:%M:%S')}: 成交點數 = {buy_price:.2f}, 成交價金 = {buy_total:.2f}, 手續費 = {transaction_fee:.2f}, 交易稅 = {transaction_tax:.2f}, 淨收付 = {buy_net_cost:.2f}")
-                total_transaction_fee += transaction_fee
-                total_transaction_tax += transaction_tax  # 累計買入時的交易稅
-                in_position = True
-                total_trades += 1
+    timestamps = to_datetime64(timestamps)
+    prices = np.asarray(prices, dtype=np.float64)
+    open_prices = np.asarray(open_prices, dtype=np.float64)
+    clock = timestamps if calendar is None else calendar.trading_clock_at(timestamps).view('datetime64[ns]')
+    predicted_prices = euler_predict(clock, prices)
+
+    buy_candidates, sell_candidates = signal_candidates(prices, predicted_prices, variant)
+    buys, sells = find_trades(buy_candidates, sell_candidates)
+    cost_model = CostModel(profit_per_point, transaction_fee, transaction_tax_rate)
+    costs = cost_model.costs(open_prices, buys + 1, sells + 1)
+    total_profit_in_money, total_transaction_fee, total_transaction_tax, total_trades = cost_model.totals(costs)
+    trades = cost_model.trades(timestamps, costs, buys + 1, sells + 1)
+    return trades, total_profit_in_money, total_transaction_fee, total_transaction_tax, total_trades
+
+@profiled('Euler_Strategy.render_signals')
+def render_signals(trades):
+    """
+    將交易紀錄轉成買賣信號文字 (只在需要顯示或輸出文字時呼叫)。
+    :param trades: generate_trades 返回的交易紀錄
+    :return: 買賣信號文字列表
+    """
+    # 轉成 Python 數值後再格式化，比逐一格式化 NumPy 純量快
+    times = pd.DatetimeIndex(trades['ts']).strftime('%Y-%m-%d %H:%M:%S').tolist()
+    rows = zip(times, trades['side'].tolist(), trades['price'].tolist(), trades['total'].tolist(),
+               trades['fee'].tolist(), trades['tax'].tolist(), trades['net'].tolist(), trades['profit'].tolist())
+    signals = []
+    for time_str, side, price, total, fee, tax, net, profit in rows:
+        if side == trade_log.BUY:
+            signals.append(f"買入於 {time_str}: 成交點數 = {price:.2f}, 成交價金 = {total:.2f}, 手續費 = {fee:.2f}, 交易稅 = {tax:.2f}, 淨收付 = {net:.2f}")
         else:
-            # 賣出信號
-            if prices[i] < prices[i - 1] and prices[i] < predicted_prices[i]:
-            #if prices[i] < predicted_prices[i]:
-                sell_price = open_prices[i + 1]  # 使用下一分鐘的開盤價賣出
-                sell_total = sell_price * profit_per_point
-                transaction_tax = sell_total * transaction_tax_rate  # 計算賣出時的交易稅
-                sell_net_revenue = sell_total - (transaction_fee + transaction_tax)  # 賣出的淨收付為正值
-                net_profit = sell_net_revenue + buy_net_cost  # 修正為賣出淨收付減去買入淨收付
-                signals.append(f"賣出於 {timestamps[i + 1].strftime('%Y-%m-%d %H:%M:%S')}: 成交點數 = {sell_price:.2f}, 成交價金 = {sell_total:.2f}, 手續費 = {transaction_fee:.2f}, 交易稅 = {transaction_tax:.2f}, 淨收付 = {sell_net_revenue:.2f}, 淨獲利 = {net_profit:.2f}")
-                total_profit_in_money += sell_total - buy_total
-                total_transaction_fee += transaction_fee
-                total_transaction_tax += transaction_tax  # 累計賣出時的交易稅
-                in_position = False
-                total_trades += 1
-    
-    return signals, total_profit_in_money, total_transaction_fee, total_transaction_tax, total_trades
+            signals.append(f"賣出於 {time_str}: 成交點數 = {price:.2f}, 成交價金 = {total:.2f}, 手續費 = {fee:.2f}, 交易稅 = {tax:.2f}, 淨收付 = {net:.2f}, 淨獲利 = {profit:.2f}")
+    return signals
+
+def generate_signals(timestamps, prices, open_prices, profit_per_point, transaction_tax_rate, transaction_fee, variant='momentum'):
+    """
+    根據預測結果生成買賣信號文字，並計算總交易費用和獲利 (generate_trades + render_signals)。
+    :return: 包含買賣信號、總獲利金額、總手續費、總交易稅和總交易次數的tuple
+    """
+    trades, *totals = generate_trades(timestamps, prices, open_prices, profit_per_point, transaction_tax_rate, transaction_fee, variant)
+    return (render_signals(trades), *totals)
+
+class EulerStrategy(Strategy):
+    """
+    歐拉策略的 Backtest_Engine 介面：在信號的下一根K棒以開盤價成交。
+    指定 calendar (K棒或包含它們的完整數據的交易時段索引) 時以交易時間計算K棒間隔。
+    """
+    fill_price = 'open'
+    fill_delay = 1
+
+    def __init__(self, variant='momentum', calendar=None):
+        self.variant = variant
+        self.calendar = calendar
+        self.name = f"euler_{variant}" if calendar is None else f"euler_{variant}_session"
+
+    def signals(self, bars):
+        if len(bars['close']) < 3:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        close = np.asarray(bars['close'], dtype=np.float64)
+        clock = bars['ts'] if self.calendar is None else self.calendar.trading_clock_at(bars['ts']).view('datetime64[ns]')
+        predicted_prices = euler_predict(clock, close)
+        return find_trades(*signal_candidates(close, predicted_prices, self.variant))
+
+def to_nanoseconds(timestamp):
+    """將單一時間戳轉換為 int64 奈秒 (NaT 返回 None)"""
+    timestamp = pd.Timestamp(timestamp)
+    return None if timestamp is pd.NaT else timestamp.value
+
+def minutes_between(start_ns, end_ns):
+    """計算兩個奈秒時間戳的間隔（分鐘），計算方式與 diff_minutes 相同"""
+    if start_ns is None or end_ns is None:
+        return float('nan')
+    diff_us = (end_ns - start_ns) // 1000
+    return ((diff_us // 10**6) + (diff_us % 10**6) / 1e6) / 60.0
 
+class StreamingEuler:
+    """
+    逐根K棒執行的歐拉策略，只保存最近兩根K棒的價格和時間、持倉及累計金額。
+    在第 i 根K棒出現信號時，於第 i+1 根K棒的開盤價成交並立即返回信號文字。
+    批次的 generate_signals 不會在最後一根K棒成交，因此重播完整數據時需忽略最後一根K棒的成交
+    (見 run_streaming)。
+    """
+
+    def __init__(self, profit_per_point, transaction_tax_rate, transaction_fee, variant='momentum'):
+        self.profit_per_point = profit_per_point
+        self.transaction_tax_rate = transaction_tax_rate
+        self.transaction_fee = transaction_fee
+        self.variant = variant
+        self.prices = []  # 最近兩根K棒的收盤價
+        self.times = []  # 最近兩根K棒的時間 (奈秒)
+        self.pending = None  # 上一根K棒的信號 ('buy' / 'sell')，在這根K棒開盤成交
+        self.in_position = False
+        self.buy_total = 0.0
+        self.buy_net_cost = 0.0
+        self.total_profit_in_money = 0.0
+        self.total_transaction_fee = 0.0
+        self.total_transaction_tax = 0.0
+        self.total_trades = 0
+
+    def update(self, timestamp, open_price, close_price):
+        """
+        加入一根K棒，先以開盤價執行上一根K棒的信號，再用收盤價判斷新的信號。
+        :return: 這根K棒成交的信號文字，沒有成交時返回 None
+        """
+        signal = None
+        if self.pending is not None:
+            signal = self._execute(self.pending, timestamp, open_price)
+            self.pending = None
+
+        ts_ns = to_nanoseconds(timestamp)
+        close_price = float(close_price)
+        if len(self.prices) == 2:
+            # 以前兩根K棒的變化率預測這根K棒的價格
+            time_diff = minutes_between(self.times[0], self.times[1])
+            target_diff = minutes_between(self.times[1], ts_ns)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rate_of_change = np.float64(self.prices[1] - self.prices[0]) / time_diff
+                predicted = float(self.prices[1] + rate_of_change * target_diff)
+            previous = self.prices[1]
+            if self.variant == 'momentum':
+                buy = close_price > previous and close_price > predicted
+                sell = close_price < previous and close_price < predicted
+            else:
+                buy = close_price > predicted
+                sell = close_price < predicted
+            if not self.in_position and buy:
+                self.pending = 'buy'
+            elif self.in_position and sell:
+                self.pending = 'sell'
+            self.prices.pop(0)
+            self.times.pop(0)
+        self.prices.append(close_price)
+        self.times.append(ts_ns)
+        return signal
+
+    def _execute(self, side, timestamp, price):
+        time_str = pd.Timestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+        price = float(price)
+        total = price * self.profit_per_point
+        transaction_tax = total * self.transaction_tax_rate
+        fee = self.transaction_fee
+        self.total_transaction_fee += fee
+        self.total_transaction_tax += transaction_tax
+        self.total_trades += 1
+        if side == 'buy':
+            self.buy_total = total
+            self.buy_net_cost = -(total + fee + transaction_tax)
+            self.in_position = True
+            return f"買入於 {time_str}: 成交點數 = {price:.2f}, 成交價金 = {total:.2f}, 手續費 = {fee:.2f}, 交易稅 = {transaction_tax:.2f}, 淨收付 = {self.buy_net_cost:.2f}"
+        sell_net_revenue = total - (fee + transaction_tax)
+        net_profit = sell_net_revenue + self.buy_net_cost
+        self.total_profit_in_money += total - self.buy_total
+        self.in_position = False
+        return f"賣出於 {time_str}: 成交點數 = {price:.2f}, 成交價金 = {total:.2f}, 手續費 = {fee:.2f}, 交易稅 = {transaction_tax:.2f}, 淨收付 = {sell_net_revenue:.2f}, 淨獲利 = {net_profit:.2f}"
+
+    def summary(self):
+        """返回總獲利金額、總手續費、總交易稅和總交易次數"""
+        return self.total_profit_in_money, self.total_transaction_fee, self.total_transaction_tax, self.total_trades
+
+def run_streaming(timestamps, prices, open_prices, profit_per_point, transaction_tax_rate, transaction_fee, variant='momentum'):
+    """
+    以 StreamingEuler 逐根重播數據，返回與 generate_signals 相同格式的結果。
+    與批次計算一致，最後一根K棒不成交。
+    """
+    strategy = StreamingEuler(profit_per_point, transaction_tax_rate, transaction_fee, variant)
+    signals = []
+    n = len(prices)
+    for i in range(n - 1):
+        signal = strategy.update(timestamps[i], open_prices[i], prices[i])
+        if signal is not None:
+            signals.append(signal)
+    return (signals, *strategy.summary())
+
+@profiled('Euler_Strategy.save_output_to_file')
 def save_output_to_file(file_name, signals, total_profit_in_money, total_transaction_fee, total_transaction_tax, total_trades, profit_per_point):
     """
     將買賣信號和總獲利金額保存到檔案。
@@ -137,7 +331,7 @@ def save_output_to_file(file_name, signals, total_profit_in_money, total_transac
         f.write(f"每點獲利金額: {profit_per_point:.2f} 元\n")
         f.write(f"實際盈利: {actual_profit:.2f} 元\n")
 
-def main(input_file, output_file, profit_per_point, transaction_fee, transaction_tax_rate):
+def main(input_file, output_file, profit_per_point, transaction_fee, transaction_tax_rate, quiet=False, trades_file=None, session_gaps=False):
     """
     主函數，執行完整的流程，包括數據加載、信號生成和結果保存。
     :param input_file: 加權指數的CSV檔案路徑
@@ -145,18 +339,26 @@ def main(input_file, output_file, profit_per_point, transaction_fee, transaction
     :param profit_per_point: 每點獲利金額
     :param transaction_fee: 每次交易的手續費
     :param transaction_tax_rate: 每元的交易稅率
+    :param quiet: True 時不產生信號文字，只輸出總結並將交易紀錄寫入 trades_file
+    :param trades_file: 交易紀錄的 .npz 檔案，None 代表不儲存
+    :param session_gaps: True 時以交易時間計算K棒間隔 (使用與數據一起儲存的交易時段索引，適用於分鐘K棒)
     """
     # 讀取數據
     df = load_data(input_file)
     
     # 處理數據
     timestamps, open_prices, prices = process_data(df)
+    calendar = load_calendar(input_file, timestamps) if session_gaps else None
     
-    signals, total_profit_in_money, total_transaction_fee, total_transaction_tax, total_trades = generate_signals(timestamps, prices, open_prices, profit_per_point, transaction_tax_rate, transaction_fee)
+    trades, total_profit_in_money, total_transaction_fee, total_transaction_tax, total_trades = generate_trades(timestamps, prices, open_prices, profit_per_point, transaction_tax_rate, transaction_fee, calendar=calendar)
+    if trades_file is not None:
+        trade_log.save_trades(trades_file, trades)
     
-    print("\n=== 買賣信號 ===")
-    for signal in signals:
-        print(signal)
+    if not quiet:
+        signals = render_signals(trades)
+        print("\n=== 買賣信號 ===")
+        for signal in signals:
+            print(signal)
     
     print("\n=== 總結 ===")
     print(f"總獲利金額: {total_profit_in_money:.2f} 元")
@@ -165,7 +367,8 @@ def main(input_file, output_file, profit_per_point, transaction_fee, transaction
     print(f"總交易次數: {total_trades}")
     print(f"實際盈利: {total_profit_in_money - total_transaction_fee - total_transaction_tax:.2f} 元")
     
-    save_output_to_file(output_file, signals, total_profit_in_money, total_transaction_fee, total_transaction_tax, total_trades, profit_per_point)
+    if not quiet:
+        save_output_to_file(output_file, signals, total_profit_in_money, total_transaction_fee, total_transaction_tax, total_trades, profit_per_point)
 
 # 自訂CSV檔案名稱和參數
 input_file = 'daily_report.csv'
@@ -173,6 +376,9 @@ output_file = 'signals_output.txt'  # 輸出的結果檔案
 profit_per_point = 10  # 每點的獲利金額
 transaction_fee = 18  # 每次交易的手續費
 transaction_tax_rate = 0.00002  # 每元的交易稅率
+quiet = False  # True 時不輸出信號文字，只輸出總結 (並在設定 trades_file 時儲存交易紀錄)
+trades_file = None  # 交易紀錄的檔案 (例如 'trades_output.npz'，None 代表不儲存)
+session_gaps = False  # True 時以交易時間計算K棒間隔，跳過午休、夜盤結束後和週末的休市時間
 
 if __name__ == "__main__":
-    main(input_file, output_file, profit_per_point, transaction_fee, transaction_tax_rate)
+    main(input_file, output_file, profit_per_point, transaction_fee, transaction_tax_rate, quiet, trades_file, session_gaps)
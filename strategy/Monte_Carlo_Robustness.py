@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+import os
+import sys
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import Euler_Strategy as euler
+import Dual_Moving_Average_Turning_Point_Strategy as dual_ma
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tool'))
+import trade_log
+
+# 子行程共用的交易數據 (由 init_worker 設定)
+_shared = {}
+
+def round_trips(trades):
+    """
+    將交易紀錄 (trade_log 格式，買賣交錯) 配對成完整的來回交易，最後未平倉的買入不計。
+    :return: 買入價格、賣出價格和賣出時間的陣列
+    """
+    buys = trades[trades['side'] == trade_log.BUY]
+    sells = trades[trades['side'] == trade_log.SELL]
+    buys = buys[:len(sells)]
+    return (buys['price'].astype(np.float64), sells['price'].astype(np.float64),
+            sells['ts'].astype('datetime64[ns]'))
+
+def trade_blocks(sell_times, block='day'):
+    """
+    將來回交易分組作為重抽樣的單位。
+    :param block: 'day' 以平倉日期分組 (重抽樣後交易次數會改變)；'trade' 每筆交易各自一組
+    :return: 每組第一筆交易的索引和交易數量
+    """
+    if block == 'trade':
+        return np.arange(len(sell_times)), np.ones(len(sell_times), dtype=np.int64)
+    if block != 'day':
+        raise ValueError(f"未知的分組方式: {block}")
+    days = sell_times.astype('datetime64[D]')
+    starts = np.flatnonzero(np.concatenate(([True], days[1:] != days[:-1])))
+    lengths = np.diff(np.append(starts, len(days)))
+    return starts, lengths
+
+def simulate_batch(base_pnl, starts, lengths, n_blocks, n_samples, rng,
+                   profit_per_point, fee_range, slippage_range):
+    """
+    以 NumPy 一次計算一批重抽樣：每組樣本重抽 n_blocks 個交易分組 (可重複)，
+    並隨機抽取手續費和滑價 (每邊的點數，一律對自己不利)。
+    :param base_pnl: 每筆來回交易不含手續費和滑價的損益 (已扣交易稅)
+    :return: 淨獲利、最大回撤、交易次數、手續費和滑價陣列 (長度為 n_samples)
+    """
+    fee = rng.uniform(*fee_range, n_samples)
+    slippage = rng.uniform(*slippage_range, n_samples)
+    cost = 2 * (fee + slippage * profit_per_point)  # 每筆來回交易的額外成本
+
+    picks = rng.integers(0, len(starts), (n_samples, n_blocks))
+    block_lengths = lengths[picks].ravel()
+    counts = lengths[picks].sum(axis=1)
+    total = int(counts.sum())
+    # 將抽中的分組展開成交易索引 (每組內保持原本的順序)
+    offsets = np.cumsum(block_lengths) - block_lengths
+    index = np.arange(total) - np.repeat(offsets - starts[picks].ravel(), block_lengths)
+    row = np.repeat(np.arange(n_samples), counts)
+    pnl = base_pnl[index] - cost[row]
+
+    # 各樣本的累計損益和最大回撤 (起始資金為 0)
+    row_starts = np.cumsum(counts) - counts
+    cumulative = np.concatenate(([0.0], np.cumsum(pnl)))
+    before = cumulative[row_starts]
+    net_profit = cumulative[row_starts + counts] - before
+    equity = cumulative[1:] - np.repeat(before, counts)
+    max_drawdown = np.zeros(n_samples)
+    has = counts > 0
+    if total:
+        # 每個樣本加上足夠大的位移後，整體的累計最大值就等於各樣本內的累計最大值
+        spread = max(np.abs(equity).max() * 4, 1.0)
+        shifted = equity + row * spread
+        peak = np.maximum(np.maximum.accumulate(shifted), row * spread)  # 包含起始的 0
+        max_drawdown[has] = np.maximum.reduceat(peak - shifted, row_starts[has])
+    return net_profit, max_drawdown, counts, fee, slippage
+
+def init_worker(base_pnl, starts, lengths, settings):
+    _shared.update(base_pnl=base_pnl, starts=starts, lengths=lengths, settings=settings)
+
+def run_batch(seed, n_samples):
+    """子行程中以指定的種子計算一批樣本"""
+    settings = _shared['settings']
+    return simulate_batch(_shared['base_pnl'], _shared['starts'], _shared['lengths'],
+                          settings['n_blocks'], n_samples, np.random.default_rng(seed),
+                          settings['profit_per_point'], settings['fee_range'], settings['slippage_range'])
+
+def bootstrap(trades, profit_per_point, transaction_tax_rate, fee_range, slippage_range=(0.0, 0.0),
+              n_samples=20000, block='day', seed=0, batch_size=None, processes=None):
+    """
+    對交易紀錄進行重抽樣和隨機成本情境分析。
+    :param trades: Euler_Strategy.generate_trades 或 find_moving_average_trades 返回的交易紀錄
+    :param profit_per_point: 每點獲利金額
+    :param transaction_tax_rate: 交易稅率
+    :param fee_range: 每次交易手續費的範圍 (最小, 最大)
+    :param slippage_range: 每次成交滑價點數的範圍 (最小, 最大)
+    :param n_samples: 樣本數量
+    :param block: 重抽樣單位 (見 trade_blocks)
+    :param seed: 隨機種子，相同種子的結果與行程數無關
+    :param batch_size: 每批交給子行程的樣本數量，None 代表依交易數量決定 (每批約四百萬筆交易)
+    :param processes: 行程數，1 代表不使用行程池，None 代表使用所有核心
+    :return: 每個樣本一列的 DataFrame (net_profit, max_drawdown, trades, fee, slippage)
+    """
+    buy_price, sell_price, sell_times = round_trips(trades)
+    if len(buy_price) == 0:
+        raise ValueError("沒有完整的來回交易可以分析")
+    # 交易稅以成交價計算；滑價只影響損益 (買入加價、賣出減價相抵後不改變稅額的總和)
+    base_pnl = ((sell_price - buy_price) * profit_per_point
+                - (buy_price + sell_price) * profit_per_point * transaction_tax_rate)
+    starts, lengths = trade_blocks(sell_times, block)
+    settings = {
+        'n_blocks': len(starts),
+        'profit_per_point': profit_per_point,
+        'fee_range': tuple(fee_range),
+        'slippage_range': tuple(slippage_range),
+    }
+
+    batch_size = batch_size or max(1, 4_000_000 // len(base_pnl))
+    sizes = [min(batch_size, n_samples - k) for k in range(0, n_samples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if processes == 1:
+        init_worker(base_pnl, starts, lengths, settings)
+        results = [run_batch(s, size) for s, size in zip(seeds, sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=init_worker,
+                                 initargs=(base_pnl, starts, lengths, settings)) as executor:
+            results = list(executor.map(run_batch, seeds, sizes))
+
+    columns = ['net_profit', 'max_drawdown', 'trades', 'fee', 'slippage']
+    return pd.DataFrame({name: np.concatenate([result[k] for result in results]) for k, name in enumerate(columns)})
+
+def summarize(samples, percentiles=(1, 5, 25, 50, 75, 95, 99)):
+    """各欄位的平均值、標準差和百分位數，以及虧損的機率"""
+    table = pd.DataFrame({
+        name: [samples[name].mean(), samples[name].std()] + list(np.percentile(samples[name], percentiles))
+        for name in ('net_profit', 'max_drawdown', 'trades')
+    }, index=['mean', 'std'] + [f"p{p}" for p in percentiles])
+    return table, float((samples['net_profit'] < 0).mean())
+
+# 自訂CSV檔案名稱和參數
+input_file = 'daily_report.csv'
+strategy = 'euler'  # 'euler' 或 'ma'
+short_window = 1  # 均線策略的短期窗口
+long_window = 3  # 均線策略的長期窗口
+profit_per_point = 10  # 每點的獲利金額
+transaction_fee_range = (18, 25)  # 每次交易的手續費範圍
+slippage_range = (0, 2)  # 每次成交的滑價點數範圍
+transaction_tax_rate = 0.00002  # 每元的交易稅率
+n_samples = 20000  # 重抽樣次數
+
+if __name__ == "__main__":
+    if strategy == 'euler':
+        timestamps, open_prices, prices = euler.process_data(euler.load_data(input_file))
+        trades = euler.generate_trades(timestamps, prices, open_prices, profit_per_point,
+                                       transaction_tax_rate, transaction_fee_range[0])[0]
+    else:
+        df = dual_ma.calculate_moving_averages(dual_ma.load_data(input_file), short_window, long_window)
+        trades = dual_ma.find_moving_average_trades(df, short_window, long_window)[0]
+    samples = bootstrap(trades, profit_per_point, transaction_tax_rate, transaction_fee_range,
+                        slippage_range, n_samples=n_samples)
+    table, loss_probability = summarize(samples)
+    print(table.to_string(float_format=lambda x: f"{x:.2f}"))
+    print(f"\n虧損機率: {loss_probability:.2%}")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tool'))
+from session_calendar import load_calendar, session_bounds
+
+NS_PER_DAY = 24 * 60 * 60 * 10**9
+NS_PER_YEAR = 365.25 * NS_PER_DAY
+
+def holding(n_bars, buys, sells):
+    """
+    每根K棒收盤時是否持倉 (買入成交的K棒到賣出成交的前一根K棒為 1)。
+    :param buys: 買入成交的K棒索引 (與賣出交錯，最後一筆可能只有買入)
+    :param sells: 賣出成交的K棒索引
+    """
+    change = np.zeros(n_bars + 1, dtype=np.int64)
+    np.add.at(change, buys, 1)
+    np.add.at(change, sells, -1)
+    return np.cumsum(change[:-1]).astype(np.int8)
+
+def bar_pnl(close, fill_prices, buys, sells, cost_model):
+    """
+    以收盤價逐根計算持倉的損益 (mark-to-market)，並在成交的K棒扣除手續費和交易稅。
+    進場K棒的損益為收盤價減成交價，出場K棒為成交價減前一根收盤價，合計等於成交價差。
+    :param close: 收盤價陣列 (計算持倉市值)
+    :param fill_prices: 成交價格陣列 (例如下一根K棒成交的策略使用開盤價)
+    :param cost_model: Backtest_Engine.CostModel
+    :return: 每根K棒的損益金額陣列和持倉陣列
+    """
+    close = np.asarray(close, dtype=np.float64)
+    fill_prices = np.asarray(fill_prices, dtype=np.float64)
+    position = holding(len(close), buys, sells)
+    points = np.zeros(len(close))
+    points[1:] = position[:-1] * np.diff(close)
+    np.add.at(points, buys, close[buys] - fill_prices[buys])
+    np.add.at(points, sells, fill_prices[sells] - close[sells])
+
+    costs = np.zeros(len(close))
+    fills = np.concatenate((buys, sells))
+    fill_totals = fill_prices[fills] * cost_model.profit_per_point
+    np.add.at(costs, fills, cost_model.transaction_fee + fill_totals * cost_model.transaction_tax_rate)
+    return points * cost_model.profit_per_point - costs, position
+
+def drawdown(equity):
+    """返回回撤陣列 (相對於包含起始 0 的歷史最高點)"""
+    peak = np.maximum.accumulate(np.maximum(equity, 0.0))
+    return peak - equity
+
+def period_pnl(ts_ns, pnl, period='session', calendar=None):
+    """
+    依交易時段或日期加總損益。
+    :param period: 'session' 依交易時段 (session_calendar.TXF_SESSIONS，夜盤歸入開盤的日期)；'day' 依日曆日期
+    :param calendar: 同一份數據的交易時段索引，None 代表重新計算交易時段
+    :return: 以時段結束時間 (或日期) 為索引的 Series
+    """
+    if period == 'session':
+        session_id, _, end = session_bounds(ts_ns) if calendar is None else calendar.bounds()
+        labels = np.where(session_id >= 0, end, ts_ns - ts_ns % NS_PER_DAY)
+    elif period == 'day':
+        labels = ts_ns - ts_ns % NS_PER_DAY
+    else:
+        raise ValueError(f"未知的期間: {period}")
+    if len(labels) == 0:
+        return pd.Series([], dtype=np.float64)
+    starts = np.flatnonzero(np.concatenate(([True], labels[1:] != labels[:-1])))
+    return pd.Series(np.add.reduceat(pnl, starts), index=labels[starts].view('datetime64[ns]'))
+
+def risk_ratios(returns, periods_per_year):
+    """以期間損益計算年化的 Sharpe 和 Sortino 比率 (無風險利率為 0)"""
+    returns = np.asarray(returns, dtype=np.float64)
+    if len(returns) < 2:
+        return np.nan, np.nan
+    scale = np.sqrt(periods_per_year)
+    std = returns.std(ddof=1)
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = returns.mean() / std * scale if std > 0 else np.nan
+        sortino = returns.mean() / downside * scale if downside > 0 else np.nan
+    return sharpe, sortino
+
+def compute_metrics(ts, close, fill_prices, buys, sells, cost_model, period='session', periods_per_year=None,
+                    calendar=None):
+    """
+    由成交索引計算逐根K棒的權益曲線和績效指標，全部以陣列運算完成。
+    :param ts: 時間陣列 (datetime64 或 int64 奈秒)
+    :param close: 收盤價陣列
+    :param fill_prices: 成交價格陣列
+    :param buys: 買入成交的K棒索引
+    :param sells: 賣出成交的K棒索引
+    :param cost_model: Backtest_Engine.CostModel
+    :param period: 期間損益的分組方式 (見 period_pnl)
+    :param periods_per_year: 年化使用的每年期間數，None 代表依數據的時間長度估計
+    :param calendar: 同一份數據的交易時段索引 (見 session_calendar.load_calendar)
+    :return: (指標 dict, 包含 equity/drawdown/position 的 DataFrame, 期間損益 Series)
+    """
+    ts_ns = np.asarray(ts).astype('datetime64[ns]').view(np.int64)
+    buys = np.asarray(buys, dtype=np.int64)
+    sells = np.asarray(sells, dtype=np.int64)
+    pnl, position = bar_pnl(close, fill_prices, buys, sells, cost_model)
+    equity = np.cumsum(pnl)
+    dd = drawdown(equity)
+    periods = period_pnl(ts_ns, pnl, period, calendar)
+
+    if periods_per_year is None:
+        years = (ts_ns[-1] - ts_ns[0]) / NS_PER_YEAR if len(ts_ns) > 1 else 0.0
+        periods_per_year = len(periods) / years if years > 0 else np.nan
+    sharpe, sortino = risk_ratios(periods.to_numpy(), periods_per_year)
+
+    fill_prices = np.asarray(fill_prices, dtype=np.float64)
+    trade_points = fill_prices[sells] - fill_prices[buys[:len(sells)]]
+    wins = trade_points[trade_points > 0].sum()
+    losses = -trade_points[trade_points < 0].sum()
+    net_profit = float(equity[-1]) if len(equity) else 0.0
+    max_drawdown = float(dd.max()) if len(dd) else 0.0
+    years = len(periods) / periods_per_year if periods_per_year else np.nan
+    metrics = {
+        'net_profit': net_profit,
+        'max_drawdown': max_drawdown,
+        'exposure': float(position.mean()) if len(position) else 0.0,
+        'trades': len(buys) + len(sells),
+        'win_rate': float((trade_points > 0).mean()) if len(trade_points) else np.nan,
+        'profit_factor': float(wins / losses) if losses > 0 else np.nan,
+        'sharpe': float(sharpe),
+        'sortino': float(sortino),
+        'calmar': float(net_profit / years / max_drawdown) if max_drawdown > 0 and years > 0 else np.nan,
+        'best_period': float(periods.max()) if len(periods) else np.nan,
+        'worst_period': float(periods.min()) if len(periods) else np.nan,
+    }
+    curve = pd.DataFrame({
+        'ts': ts_ns.view('datetime64[ns]'),
+        'pnl': pnl,
+        'equity': equity,
+        'drawdown': dd,
+        'position': position,
+    })
+    return metrics, curve, periods
+
+def strategy_metrics(bars, strategy, cost_model, period='session', periods_per_year=None, calendar=None):
+    """以 Backtest_Engine 的 Strategy 介面計算績效指標 (見 compute_metrics)"""
+    buys, sells = strategy.signals(bars)
+    buys = np.asarray(buys, dtype=np.int64) + strategy.fill_delay
+    sells = np.asarray(sells, dtype=np.int64) + strategy.fill_delay
+    return compute_metrics(bars['ts'], bars['close'], bars[strategy.fill_price], buys, sells,
+                           cost_model, period, periods_per_year, calendar)
+
+# 自訂CSV檔案名稱和參數
+input_file = 'daily_report.csv'
+profit_per_point = 10  # 每點的獲利金額
+transaction_fee = 18  # 每次交易的手續費
+transaction_tax_rate = 0.00002  # 每元的交易稅率
+period = 'session'  # 期間損益的分組方式：'session' 或 'day'
+output_file = 'equity_curve.csv'
+
+if __name__ == "__main__":
+    from Backtest_Engine import CostModel, load_bars
+    from Euler_Strategy import EulerStrategy
+    bars = load_bars(input_file)
+    calendar = load_calendar(input_file, bars['ts'])
+    metrics, curve, periods = strategy_metrics(
+        bars, EulerStrategy('momentum'), CostModel(profit_per_point, transaction_fee, transaction_tax_rate), period,
+        calendar=calendar)
+    for name, value in metrics.items():
+        print(f"{name:>14}: {value:.4f}" if isinstance(value, float) else f"{name:>14}: {value}")
+    curve.to_csv(output_file, index=False)
+    print(f"權益曲線已儲存至 {output_file}")
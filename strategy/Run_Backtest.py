@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+from Backtest_Engine import CostModel, load_bars, run_backtest
+from Euler_Strategy import EulerStrategy
+from Dual_Moving_Average_Turning_Point_Strategy import DualMovingAverageStrategy
+
+# 自訂CSV檔案名稱和參數
+input_file = 'daily_report.csv'
+profit_per_point = 10  # 每點的獲利金額
+transaction_fee = 18  # 每次交易的手續費
+transaction_tax_rate = 0.00002  # 每元的交易稅率
+
+if __name__ == "__main__":
+    # 在同一份K棒上比較多個策略 (見 Backtest_Engine.run_backtest)
+    strategies = [
+        EulerStrategy('momentum'),
+        EulerStrategy('prediction'),
+        DualMovingAverageStrategy(1, 3),
+        DualMovingAverageStrategy(5, 20),
+    ]
+    summary, _ = run_backtest(load_bars(input_file), strategies,
+                              CostModel(profit_per_point, transaction_fee, transaction_tax_rate))
+    print(summary.to_string(index=False))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import Euler_Strategy as euler
+import Dual_Moving_Average_Turning_Point_Strategy as dual_ma
+from Dual_Moving_Average_Parameter_Sweep import moving_average_matrix
+from Backtest_Engine import CostModel
+
+# 子行程共用的預先計算指標 (由 init_worker 設定)
+_shared = {}
+
+def walk_forward_windows(n_bars, train_size, test_size, step=None):
+    """
+    產生滾動的訓練/測試區間 (以K棒數量為單位)。
+    :param n_bars: 數據長度
+    :param train_size: 訓練區間長度
+    :param test_size: 測試區間長度
+    :param step: 每次向前移動的K棒數量，None 代表等於測試區間長度
+    :return: [(訓練開始, 測試開始, 測試結束), ...]，訓練區間為 [訓練開始, 測試開始)
+    """
+    step = step or test_size
+    windows = []
+    start = 0
+    while start + train_size + test_size <= n_bars:
+        windows.append((start, start + train_size, start + train_size + test_size))
+        start += step
+    return windows
+
+def prepare_ma(df, grid):
+    """預先計算所有窗口的移動平均線，所有區間共用"""
+    windows = sorted({w for params in grid for w in params[:2]})
+    close = np.asarray(df['close'], dtype=np.float64)
+    return {
+        'close': close,
+        'ma_matrix': moving_average_matrix(close, windows),
+        'position': {window: k for k, window in enumerate(windows)},
+    }
+
+def evaluate_ma(data, params, start, end):
+    """
+    計算均線策略在 [start, end) 區間的實際盈利 (以收盤價成交，扣除手續費和交易稅，與 evaluate_euler 相同單位) 和交易次數。
+    交叉信號以完整數據計算 (區間第一根K棒與前一根K棒比較)，再只保留區間內的信號。
+    """
+    short_window, long_window, profit_per_point, transaction_fee, transaction_tax_rate = params
+    lookback = max(start - 1, 0)
+    short_ma = data['ma_matrix'][data['position'][short_window], lookback:end]
+    long_ma = data['ma_matrix'][data['position'][long_window], lookback:end]
+    cross_up, cross_down = dual_ma.crossover_candidates(short_ma, long_ma)
+    buys, sells = dual_ma.find_trades(cross_up[start - lookback:], cross_down[start - lookback:])
+    cost_model = CostModel(profit_per_point, transaction_fee, transaction_tax_rate)
+    costs = cost_model.costs(data['close'], buys + start, sells + start)
+    profit, fee, tax, trades = cost_model.totals(costs)
+    return profit - fee - tax, trades
+
+def prepare_euler(df, grid):
+    """預先計算歐拉預測和各信號類型的買賣信號，所有區間共用"""
+    timestamps, open_prices, prices = euler.process_data(df)
+    prices = prices.astype(np.float64)
+    predicted_prices = euler.euler_predict(timestamps, prices)
+    variants = sorted({params[0] for params in grid})
+    return {
+        'open': open_prices.astype(np.float64),
+        'candidates': {variant: euler.signal_candidates(prices, predicted_prices, variant) for variant in variants},
+    }
+
+def evaluate_euler(data, params, start, end):
+    """
+    計算歐拉策略在 [start, end) 區間的實際盈利 (扣除手續費和交易稅) 和交易次數。
+    信號在下一根K棒成交，因此只使用成交點仍在區間內的信號。
+    """
+    variant, profit_per_point, transaction_fee, transaction_tax_rate = params
+    buy_candidates, sell_candidates = data['candidates'][variant]
+    stop = min(end - 1, len(buy_candidates))
+    if stop <= start:
+        return 0.0, 0
+    buys, sells = euler.find_trades(buy_candidates[start:stop], sell_candidates[start:stop])
+    costs = euler.trade_costs(data['open'], buys + start, sells + start,
+                              profit_per_point, transaction_tax_rate, transaction_fee)
+    profit, fee, tax, trades = euler.trade_totals(costs, transaction_fee)
+    return profit - fee - tax, trades
+
+# 策略名稱 -> (預先計算函數, 區間評估函數)
+STRATEGIES = {
+    'ma': (prepare_ma, evaluate_ma),
+    'euler': (prepare_euler, evaluate_euler),
+}
+
+def ma_grid(short_windows, long_windows, profit_per_points, transaction_fees, transaction_tax_rates):
+    """均線策略的參數組合 (短期窗口, 長期窗口, 每點獲利金額, 手續費, 交易稅率)"""
+    return [(short, long, *costs) for short in short_windows for long in long_windows if short < long
+            for costs in itertools.product(profit_per_points, transaction_fees, transaction_tax_rates)]
+
+def euler_grid(variants, profit_per_points, transaction_fees, transaction_tax_rates):
+    """歐拉策略的參數組合 (信號類型, 每點獲利金額, 手續費, 交易稅率)"""
+    return list(itertools.product(variants, profit_per_points, transaction_fees, transaction_tax_rates))
+
+def init_worker(strategy, data):
+    _shared['evaluate'] = STRATEGIES[strategy][1]
+    _shared['data'] = data
+
+def optimize_window(grid, window):
+    """在訓練區間中找出最佳參數，並套用到接下來的測試區間"""
+    evaluate, data = _shared['evaluate'], _shared['data']
+    train_start, test_start, test_end = window
+    best_params, best_score = None, None
+    for params in grid:
+        score, _ = evaluate(data, params, train_start, test_start)
+        if best_score is None or score > best_score:
+            best_params, best_score = params, score
+    test_score, test_trades = evaluate(data, best_params, test_start, test_end)
+    return best_params, best_score, test_score, test_trades
+
+def walk_forward(df, strategy, grid, train_size, test_size, step=None, processes=None):
+    """
+    滾動前進最佳化：在每個訓練區間搜尋最佳參數，再以樣本外的測試區間評估。
+    指標只在完整數據上計算一次，各區間共用；各區間分配到多個行程並行計算。
+    :param df: 策略 load_data 返回的 DataFrame
+    :param strategy: 'ma' 或 'euler'
+    :param grid: 參數組合列表 (見 ma_grid / euler_grid)
+    :param train_size: 訓練區間的K棒數量
+    :param test_size: 測試區間的K棒數量
+    :param step: 每次向前移動的K棒數量，None 代表等於測試區間長度
+    :param processes: 行程數，1 代表不使用行程池，None 代表使用所有核心
+    :return: 每個區間的最佳參數、訓練分數和測試分數的 DataFrame
+    """
+    prepare, _ = STRATEGIES[strategy]
+    data = prepare(df, grid)
+    windows = walk_forward_windows(len(df), train_size, test_size, step)
+
+    if processes == 1:
+        init_worker(strategy, data)
+        results = [optimize_window(grid, window) for window in windows]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=init_worker,
+                                 initargs=(strategy, data)) as executor:
+            results = list(executor.map(optimize_window, itertools.repeat(grid), windows))
+
+    time_col = 'ts' if 'ts' in df.columns else 'date'
+    times = np.asarray(df[time_col])
+    rows = []
+    for (train_start, test_start, test_end), (params, train_score, test_score, test_trades) in zip(windows, results):
+        rows.append({
+            'train_start': times[train_start],
+            'test_start': times[test_start],
+            'test_end': times[test_end - 1],
+            'params': params,
+            'train_score': train_score,
+            'test_score': test_score,
+            'test_trades': test_trades,
+        })
+    return pd.DataFrame(rows)
+
+# 自訂CSV檔案名稱和參數
+input_file = 'daily_report.csv'
+strategy = 'ma'  # 'ma' 或 'euler'
+train_size = 250  # 訓練區間的K棒數量
+test_size = 60  # 測試區間的K棒數量
+step = 60  # 每次向前移動的K棒數量
+output_file = 'walk_forward_output.csv'
+
+if __name__ == "__main__":
+    if strategy == 'ma':
+        df = dual_ma.load_data(input_file)
+        grid = ma_grid(range(1, 21), range(2, 61), [10], [18], [0.00002])
+    else:
+        df = euler.load_data(input_file)
+        grid = euler_grid(['momentum', 'prediction'], [10], [18], [0.00002])
+    result = walk_forward(df, strategy, grid, train_size, test_size, step)
+    print(result.to_string(index=False))
+    print(f"\n樣本外總分數: {result['test_score'].sum():.2f}")
+    result.to_csv(output_file, index=False)
+    print(f"結果已儲存至 {output_file}")
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, '..', 'tool'))
+sys.path.append(os.path.join(BASE_DIR, '..', 'benchmark'))
+
+import bar_store
+from synthetic_bars import generate_bars
+
+
+def test_write_and_read_round_trip(tmp_path):
+    path = str(tmp_path / 'bars')
+    df = generate_bars(40)
+    bar_store.write_bars(df.iloc[:5000], path)
+    bar_store.write_bars(df.iloc[4000:], path)  # 重疊的K棒以新數據為準
+    got = bar_store.read_bars(path)
+    assert np.array_equal(got['ts'].to_numpy(dtype='datetime64[ns]'), df['ts'].to_numpy(dtype='datetime64[ns]'))
+    for name in ('open', 'high', 'low', 'close', 'volume'):
+        assert np.array_equal(got[name].to_numpy(), df[name].to_numpy()), name
+
+
+@pytest.mark.parametrize('values', [
+    np.array(['a', 'b'], dtype=object),
+    pd.array(['a', 'b'], dtype='string'),
+    pd.Series(['a', 'b']).astype(str),
+])
+def test_rejects_text_columns(tmp_path, values):
+    df = pd.DataFrame({'ts': pd.to_datetime(['2024-01-02 08:46', '2024-01-02 08:47']), 'close': [1.0, 2.0],
+                       'note': values})
+    with pytest.raises(ValueError):
+        bar_store.write_bars(df, str(tmp_path / 'bars'))
+    assert bar_store.read_bars(str(tmp_path / 'bars')).empty
+
+
+def test_interrupted_replace_keeps_the_month(tmp_path):
+    path = str(tmp_path / 'bars')
+    df = generate_bars(20)
+    bar_store.write_bars(df, path)
+    month = sorted(os.listdir(path))[0]
+    # 舊分區已移到 .old，新分區尚未改名時中斷
+    os.rename(os.path.join(path, month), os.path.join(path, month + '.old'))
+    got = bar_store.read_bars(path)
+    assert len(got) == len(df)
+    assert not os.path.exists(os.path.join(path, month + '.old'))
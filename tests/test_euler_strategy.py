@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, '..', 'tool'))
+sys.path.append(os.path.join(BASE_DIR, '..', 'strategy'))
+sys.path.append(os.path.join(BASE_DIR, '..', 'benchmark'))
+
+import Euler_Strategy
+from raw_to_reading import aggregate_data
+from synthetic_bars import generate_bars
+
+
+def baseline_euler_predict(timestamps, prices):
+    """向量化之前逐筆計算的 euler_predict (測試用的正確答案)"""
+    predicted_prices = prices[:2].copy()
+    for i in range(0, len(prices) - 3):
+        time_diff = (timestamps[i + 1] - timestamps[i]).total_seconds() / 60.0
+        rate_of_change = (prices[i + 1] - prices[i]) / time_diff
+        target_diff = (timestamps[i + 2] - timestamps[i + 1]).total_seconds() / 60.0
+        next_price = prices[i + 1] + rate_of_change * target_diff
+        predicted_prices.append(next_price)
+    return predicted_prices
+
+
+@pytest.fixture(scope='module')
+def minute_bars():
+    return generate_bars(20, start_date='2024-01-01', gap_rate=0.05)
+
+
+@pytest.fixture(scope='module')
+def daily_bars(minute_bars):
+    daily = aggregate_data(minute_bars.copy(), '13:45')
+    daily['ts'] = daily['date']
+    return daily
+
+
+@pytest.mark.parametrize('data', ['minute_bars', 'daily_bars'])
+def test_euler_predict_matches_baseline(data, request):
+    df = request.getfixturevalue(data)
+    timestamps, _, prices = Euler_Strategy.process_data(df)
+    expected = baseline_euler_predict(pd.to_datetime(df['ts']).tolist(), df['close'].tolist())
+    assert np.array_equal(Euler_Strategy.euler_predict(timestamps, prices), np.array(expected))
+    # 列表輸入與陣列輸入的結果相同
+    assert np.array_equal(Euler_Strategy.euler_predict(df['ts'].tolist(), df['close'].tolist()), np.array(expected))
+
+
+@pytest.mark.parametrize('data', ['minute_bars', 'daily_bars'])
+def test_diff_minutes_matches_total_seconds(data, request):
+    ts = pd.to_datetime(request.getfixturevalue(data)['ts']).tolist()
+    expected = [(later - earlier).total_seconds() / 60.0 for earlier, later in zip(ts, ts[1:])]
+    assert np.array_equal(Euler_Strategy.diff_minutes(ts), np.array(expected))
+
+
+def test_diff_minutes_keeps_nat_gaps_as_nan():
+    ts = pd.to_datetime(['2024-01-02 08:46', None, '2024-01-02 08:48', '2024-01-02 08:50'])
+    minutes = Euler_Strategy.diff_minutes(ts)
+    assert np.isnan(minutes[:2]).all()
+    assert minutes[2] == 2.0
+
+
+@pytest.mark.parametrize('ts', [
+    ['2024-01-02 08:46', '2024-01-02 08:47', '2024-01-02 08:47', '2024-01-02 08:48'],
+    ['2024-01-02 08:46', '2024-01-02 08:48', '2024-01-02 08:47', '2024-01-02 08:49'],
+])
+def test_non_increasing_timestamps_are_rejected(ts):
+    # 逐筆計算的版本會產生 inf 或負的間隔，現在直接拋出 ValueError
+    ts = pd.to_datetime(ts)
+    with pytest.raises(ValueError):
+        Euler_Strategy.diff_minutes(ts)
+    with pytest.raises(ValueError):
+        Euler_Strategy.euler_predict(ts, [1.0, 2.0, 3.0, 4.0])
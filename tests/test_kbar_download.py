@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, '..', 'tool'))
+sys.path.append(os.path.join(BASE_DIR, '..', 'benchmark'))
+
+import bar_store
+import get_raw_data_from_shioaji as downloader
+from kbar_cache import KbarCache
+from synthetic_bars import FakeKbarsAPI
+
+START, END = '2024-01-01', '2024-03-10'
+TODAY = '2024-06-03'
+
+
+def fetch(api, tmp_path, **kwargs):
+    kwargs.setdefault('today', TODAY)
+    kwargs.setdefault('progress_file', str(tmp_path / 'store' / '_progress.json'))
+    kwargs.setdefault('max_workers', 3)
+    return downloader.fetch_kbars_chunked(api, 'TXFR2', START, END, str(tmp_path / 'store'), chunk_days=7, **kwargs)
+
+
+def assert_store_matches(api, tmp_path, start=START, end=END):
+    """bar store 的內容與一次下載整個區間完全相同"""
+    got = bar_store.read_bars(str(tmp_path / 'store'))
+    expected = api.expected(start, end)
+    assert np.array_equal(got['ts'].to_numpy(dtype='datetime64[ns]'), expected['ts'].to_numpy(dtype='datetime64[ns]'))
+    for name in ('open', 'high', 'low', 'close', 'volume'):
+        assert np.array_equal(got[name].to_numpy(), expected[name].to_numpy()), name
+
+
+def test_download_does_not_import_shioaji():
+    assert 'shioaji' not in sys.modules
+
+
+def test_failed_chunks_are_resumed(tmp_path):
+    chunks = downloader.date_chunks(START, END, 7)
+    api = FakeKbarsAPI(fail_ranges={chunks[1][0], chunks[5][0]})
+    with pytest.raises(RuntimeError):
+        fetch(api, tmp_path)
+    first_calls = len(api.calls)
+    assert first_calls == len(chunks)
+
+    fetch(api, tmp_path)
+    assert sorted(call[:2] for call in api.calls[first_calls:]) == [chunks[1], chunks[5]]
+    assert_store_matches(api, tmp_path)
+
+    # 全部完成後不再呼叫API
+    calls = len(api.calls)
+    assert fetch(api, tmp_path) == 0
+    assert len(api.calls) == calls
+
+
+def test_stops_when_quota_runs_out(tmp_path):
+    per_chunk = len(FakeKbarsAPI().expected(*downloader.date_chunks(START, END, 7)[1])) * 48
+    api = FakeKbarsAPI(remaining_bytes=per_chunk * 2)
+    fetch(api, tmp_path, max_workers=1, min_remaining_bytes=per_chunk)
+    assert 2 <= len(api.calls) < len(downloader.date_chunks(START, END, 7))
+
+    api.remaining_bytes = None
+    fetch(api, tmp_path, min_remaining_bytes=per_chunk)
+    assert len(api.calls) == len(downloader.date_chunks(START, END, 7))
+    assert_store_matches(api, tmp_path)
+
+
+def test_throttle_is_shared_between_workers(tmp_path):
+    api = FakeKbarsAPI()
+    throttle = downloader.Throttle(max_calls=2, period=0.2)
+    fetch(api, tmp_path, max_workers=4, throttle=throttle)
+    times = sorted(call[2] for call in api.calls)
+    # 每個 period 最多兩次呼叫：四個執行緒共用時，總時間至少是 (呼叫次數 / 2 - 1) 個 period
+    # (API 記錄的時間可能比取得許可晚，因此不檢查相鄰的呼叫)
+    assert times[-1] - times[0] >= (-(-len(times) // 2) - 1) * 0.2 * 0.95
+    assert_store_matches(api, tmp_path)
+
+
+def test_each_chunk_is_written_when_done(tmp_path, monkeypatch):
+    written = []
+    write_bars = bar_store.write_bars
+
+    def record(df, path):
+        written.append(len(df))
+        write_bars(df, path)
+
+    monkeypatch.setattr(bar_store, 'write_bars', record)
+    api = FakeKbarsAPI()
+    rows = fetch(api, tmp_path)
+    chunks = downloader.date_chunks(START, END, 7)
+    assert len(written) == len(chunks)
+    assert rows == sum(written) == len(api.expected(START, END))
+
+
+def test_recent_chunks_are_downloaded_again(tmp_path):
+    api = FakeKbarsAPI()
+    fetch(api, tmp_path, today='2024-03-08', refresh_days=3)
+    calls = len(api.calls)
+    fetch(api, tmp_path, today='2024-03-08', refresh_days=3)
+    # 結束日期在 2024-03-05 (含) 之後的區段沒有記錄為已完成
+    recent = [chunk for chunk in downloader.date_chunks(START, END, 7) if chunk[1] >= '2024-03-05']
+    assert [call[:2] for call in api.calls[calls:]] == recent
+
+
+def test_cache_refreshes_recent_days(tmp_path):
+    api = FakeKbarsAPI()
+    cache = KbarCache(str(tmp_path / 'cache'))
+    fetch(api, tmp_path, progress_file=None, cache=cache, today='2024-03-08', refresh_days=2)
+    calls = len(api.calls)
+    fetch(api, tmp_path, progress_file=None, cache=cache, today='2024-03-08', refresh_days=2)
+    # 只重新下載 2024-03-06 之後 (今天之前兩天、今天和之後) 的日期
+    assert [call[:2] for call in api.calls[calls:]] == [('2024-03-06', '2024-03-10')]
+    assert_store_matches(api, tmp_path)
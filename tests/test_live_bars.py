@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, '..', 'tool'))
+
+import bar_store
+import live_bars
+
+NS_PER_MINUTE = live_bars.NS_PER_MINUTE
+
+
+def random_ticks(seed=1, n=20000):
+    """兩個日盤 (08:45 ~ 13:45) 內的隨機成交，同一秒可能有多筆"""
+    rng = np.random.default_rng(seed)
+    days = pd.to_datetime(['2024-01-02', '2024-01-03'])
+    ts = np.concatenate([np.sort(rng.integers(0, 300 * 60 * 10**3, n)) * 10**6 + day.value + (8 * 60 + 45) * 60 * 10**9
+                         for day in days])
+    return pd.DataFrame({
+        'ts': ts.view('datetime64[ns]'),
+        'price': 17000.0 + np.cumsum(rng.integers(-2, 3, len(ts))),
+        'volume': rng.integers(1, 5, len(ts)),
+    })
+
+
+def reference_bars(ticks):
+    """以 groupby 計算的一分鐘K棒 (測試用的正確答案)"""
+    ts = ticks['ts'].to_numpy(dtype='datetime64[ns]').view('i8')
+    end = (ts // NS_PER_MINUTE + 1) * NS_PER_MINUTE
+    bars = ticks.groupby(end).agg(open=('price', 'first'), high=('price', 'max'), low=('price', 'min'),
+                                  close=('price', 'last'), volume=('volume', 'sum'))
+    return bars.rename_axis('ts').reset_index()
+
+
+def replay(ticks, store_path=None, **kwargs):
+    """以 TickReplay 執行 LiveBarService，返回服務和訂閱者收到的K棒"""
+    service = live_bars.LiveBarService(live_bars.TickReplay(ticks), store_path, **kwargs)
+    received = []
+
+    async def consume(queue):
+        while (bar := await queue.get()) is not None:
+            received.append(bar)
+
+    async def run():
+        consumer = asyncio.create_task(consume(service.subscribe(100000)))
+        await service.run()
+        await consumer
+
+    asyncio.run(run())
+    return service, pd.DataFrame(received, columns=live_bars.BAR_COLUMNS)
+
+
+def assert_bars_equal(got, expected):
+    assert np.array_equal(got['ts'].to_numpy(dtype=np.int64), expected['ts'].to_numpy(dtype=np.int64))
+    for name in ('open', 'high', 'low', 'close', 'volume'):
+        assert np.array_equal(got[name].to_numpy(), expected[name].to_numpy()), name
+
+
+def test_replay_matches_groupby(tmp_path):
+    ticks = random_ticks()
+    service, got = replay(ticks, str(tmp_path / 'bars'), capacity=128, queue_size=50, flush_size=100)
+    expected = reference_bars(ticks)
+    assert service.ticks == len(ticks)
+    assert service.builder.late_ticks == 0
+    assert_bars_equal(got, expected)
+
+    stored = bar_store.read_bars(str(tmp_path / 'bars'))
+    stored['ts'] = stored['ts'].to_numpy(dtype='datetime64[ns]').view('i8')
+    assert_bars_equal(stored, expected)
+
+
+def test_bar_boundaries():
+    # 08:45:00 ~ 08:45:59.999 屬於 08:46 的K棒，08:46:00 開始下一根
+    ticks = pd.DataFrame({
+        'ts': pd.to_datetime(['2024-01-02 08:45:00', '2024-01-02 08:45:59.999', '2024-01-02 08:46:00',
+                              '2024-01-02 08:47:30'], format='ISO8601'),
+        'price': [1.0, 3.0, 2.0, 4.0],
+        'volume': [1, 1, 1, 1],
+    })
+    _, got = replay(ticks)
+    assert got['ts'].tolist() == [pd.Timestamp(t).value for t in ('2024-01-02 08:46', '2024-01-02 08:47', '2024-01-02 08:48')]
+    assert got['close'].tolist() == [3.0, 2.0, 4.0]
+
+
+def test_late_ticks_are_dropped():
+    ticks = random_ticks(seed=2, n=3000)
+    ts = ticks['ts'].to_numpy(dtype='datetime64[ns]').view('i8')
+    # 在每根K棒完成後 (下一分鐘的第一筆成交之後) 插入屬於已完成K棒的成交
+    late = np.flatnonzero(np.diff(ts // NS_PER_MINUTE) > 0)[10:60:10] + 1
+    late_rows = ticks.iloc[late - 1].assign(price=1.0, volume=1000)
+    order = np.concatenate([np.arange(len(ticks)) * 2, late * 2 + 1])
+    with_late = pd.concat([ticks, late_rows], ignore_index=True).iloc[np.argsort(order, kind='stable')]
+
+    service, got = replay(with_late)
+    assert service.builder.late_ticks == len(late)
+    assert_bars_equal(got, reference_bars(ticks))
+
+
+def test_builder_merges_slightly_earlier_ticks_into_the_open_bar():
+    builder = live_bars.BarBuilder()
+    minute = pd.Timestamp('2024-01-02 08:45').value
+    assert builder.update(minute + 30 * 10**9, 10.0, 1) is None
+    assert builder.update(minute + 20 * 10**9, 12.0, 1) is None  # 同一分鐘內時間稍微倒退
+    bar = builder.update(minute + 60 * 10**9, 11.0, 1)
+    assert bar == (minute + NS_PER_MINUTE, 10.0, 12.0, 10.0, 12.0, 2)
+    assert builder.update(minute + 59 * 10**9, 9.0, 1) is None
+    assert builder.late_ticks == 1
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, '..', 'tool'))
+sys.path.append(os.path.join(BASE_DIR, '..', 'benchmark'))
+
+import raw_to_reading
+from session_calendar import build_calendar
+from synthetic_bars import generate_bars
+
+CLOSE_TIME = '13:45'
+
+
+def baseline_aggregate(df, close_time_str):
+    """向量化之前逐日計算的 aggregate_data (測試用的正確答案)"""
+    close_time = datetime.strptime(close_time_str, "%H:%M").time()
+    df['ts'] = pd.to_datetime(df['ts'])
+    df['date'] = df['ts'].dt.date
+    df['time'] = df['ts'].dt.time
+    result = []
+    all_dates = sorted(df['date'].unique())
+
+    for i in range(1, len(all_dates)):
+        current_date = all_dates[i]
+        previous_date = all_dates[i - 1]
+        prev_day_end_time = datetime.combine(previous_date, close_time)
+        current_day_start_time = prev_day_end_time + timedelta(seconds=1)
+        current_day_end_time = datetime.combine(current_date, close_time)
+        relevant_data = df[
+            ((df['ts'] >= current_day_start_time) & (df['ts'] <= current_day_end_time))
+        ]
+        if relevant_data.empty:
+            continue
+
+        next_open_data = df[(df['date'] == previous_date) & (df['time'] > close_time)]
+        if not next_open_data.empty:
+            next_open = next_open_data.iloc[0]['open']
+        else:
+            for j in range(i - 1, -1, -1):
+                fallback_date = all_dates[j]
+                fallback_data = df[df['date'] == fallback_date]
+                next_open_data = fallback_data[fallback_data['time'] > close_time]
+                if not next_open_data.empty:
+                    next_open = next_open_data.iloc[0]['open']
+                    break
+            else:
+                continue
+
+        day_high = relevant_data['high'].max()
+        day_low = relevant_data['low'].min()
+        day_volume = relevant_data['volume'].sum()
+        close_time_data = df[(df['date'] == current_date) & (df['time'] == close_time)]
+        if not close_time_data.empty:
+            current_day_close = close_time_data.iloc[0]['close']
+        else:
+            continue
+
+        result.append({
+            'date': current_date,
+            'open': next_open,
+            'high': day_high,
+            'low': day_low,
+            'close': current_day_close,
+            'volume': day_volume
+        })
+
+    df_resampled = pd.DataFrame(result)
+    df_resampled['date'] = pd.to_datetime(df_resampled['date'])
+    return df_resampled[['date', 'open', 'high', 'low', 'close', 'volume']]
+
+
+def drop_between(df, start, end):
+    """刪除 [start, end] 之間的K棒"""
+    ts = pd.to_datetime(df['ts'])
+    return df[(ts < pd.Timestamp(start)) | (ts > pd.Timestamp(end))].reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def bars():
+    df = generate_bars(40, start_date='2024-01-01')
+    # 2024-01-09 前一晚沒有夜盤：開盤價要向前找到 2024-01-05 的夜盤
+    df = drop_between(df, '2024-01-08 13:46', '2024-01-08 23:59')
+    # 2024-01-12 沒有 13:45 的K棒：跳過
+    df = drop_between(df, '2024-01-12 13:45', '2024-01-12 13:45')
+    # 2024-01-17 沒有任何屬於該交易日的K棒，只有當天的夜盤：跳過
+    df = drop_between(df, '2024-01-16 13:46', '2024-01-17 13:45')
+    return df
+
+
+def test_aggregate_matches_baseline(bars):
+    expected = baseline_aggregate(bars.copy(), CLOSE_TIME)
+    got = raw_to_reading.aggregate_data(bars.copy(), CLOSE_TIME)
+    pd.testing.assert_frame_equal(got, expected)
+
+    dates = set(got['date'].dt.strftime('%Y-%m-%d'))
+    assert '2024-01-09' in dates
+    assert '2024-01-12' not in dates
+    assert '2024-01-17' not in dates
+
+
+def test_aggregate_with_calendar_matches_baseline(bars):
+    expected = baseline_aggregate(bars.copy(), CLOSE_TIME)
+    ts = pd.to_datetime(bars['ts'])
+    calendar = build_calendar(ts, close_time=CLOSE_TIME)
+    got = raw_to_reading.aggregate_data(bars.copy(), CLOSE_TIME, calendar)
+    pd.testing.assert_frame_equal(got, expected)
+
+
+def test_aggregate_accepts_csv_timestamps(bars):
+    df = bars.copy()
+    df['ts'] = pd.to_datetime(df['ts']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    expected = baseline_aggregate(df.copy(), CLOSE_TIME)
+    got = raw_to_reading.aggregate_data(df.copy(), CLOSE_TIME)
+    pd.testing.assert_frame_equal(got, expected)
+
+
+def raw_csv(df):
+    """原始數據CSV的內容 (時間格式與 get_raw_data_from_shioaji 輸出相同)"""
+    df = df.copy()
+    df['ts'] = pd.to_datetime(df['ts']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df.to_csv(index=False).encode()
+
+
+def run_incremental(tmp_path):
+    raw_to_reading.aggregate_incremental(str(tmp_path / 'raw.csv'), str(tmp_path / 'daily.csv'),
+                                         CLOSE_TIME, str(tmp_path / 'daily.state.json'))
+    return (tmp_path / 'daily.csv').read_bytes()
+
+
+def full_aggregate(tmp_path):
+    df = raw_to_reading.read_csv(str(tmp_path / 'raw.csv'))
+    return raw_to_reading.aggregate_data(df, CLOSE_TIME).to_csv(index=False).encode()
+
+
+def test_incremental_appends_match_full_run(tmp_path, bars):
+    data = raw_csv(bars)
+    # 每次附加的位置不在換行處，最後一行不完整的資料列留到下次讀取
+    cuts = [len(data) * k // 7 + 5 for k in range(1, 7)] + [len(data)]
+    start = 0
+    for cut in cuts:
+        with open(tmp_path / 'raw.csv', 'ab') as f:
+            f.write(data[start:cut])
+        start = cut
+        run_incremental(tmp_path)
+    assert run_incremental(tmp_path) == full_aggregate(tmp_path)
+
+
+def test_incremental_rebuilds_when_read_rows_are_rewritten(tmp_path, bars):
+    data = raw_csv(bars)
+    cut = data.index(b'\n2024-01-22 11:00:00') + 1
+    (tmp_path / 'raw.csv').write_bytes(data[:cut])
+    run_incremental(tmp_path)
+
+    # 改寫已讀取 (但交易日尚未完成) 的最後一列，檔案長度不變
+    head, last = data[:cut - 1].rsplit(b'\n', 1)
+    fields = last.split(b',')
+    fields[2] = b'9' * len(fields[2].split(b'.')[0]) + b'.' + fields[2].split(b'.')[1]
+    revised = head + b'\n' + b','.join(fields) + b'\n'
+    assert len(revised) == cut and revised != data[:cut]
+    (tmp_path / 'raw.csv').write_bytes(revised + data[cut:])
+
+    got = run_incremental(tmp_path)
+    assert got == full_aggregate(tmp_path)
+    assert got != raw_to_reading.aggregate_data(bars.copy(), CLOSE_TIME).to_csv(index=False).encode()
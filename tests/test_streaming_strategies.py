@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, '..', 'tool'))
+sys.path.append(os.path.join(BASE_DIR, '..', 'strategy'))
+
+import Dual_Moving_Average_Turning_Point_Strategy as dual_ma
+import Euler_Strategy as euler
+
+
+def random_bars(seed, n=3000, integer_prices=True):
+    """隨機漫步的K棒：整數點數的價格常有相同的均線 (測試相等時的信號)，小數價格測試捨入誤差"""
+    rng = np.random.default_rng(seed)
+    steps = rng.integers(-3, 4, n) if integer_prices else rng.normal(0, 1.3, n)
+    close = 10000 + np.cumsum(steps).astype(np.float64)
+    if not integer_prices:
+        close = close + rng.random(n) / 7
+    open_ = close + rng.integers(-2, 3, n)
+    # 一分鐘K棒，偶爾缺漏幾分鐘
+    minutes = np.cumsum(rng.choice([1, 1, 1, 2, 5], n))
+    ts = pd.Timestamp('2024-01-02 08:46') + pd.to_timedelta(minutes, unit='min')
+    return pd.DataFrame({'date': ts, 'ts': ts, 'open': open_, 'close': close})
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('integer_prices', [True, False])
+@pytest.mark.parametrize('windows', [(1, 3), (5, 20), (7, 8)])
+def test_streaming_moving_average_matches_batch(seed, integer_prices, windows):
+    df = random_bars(seed, integer_prices=integer_prices)
+    expected, expected_points = dual_ma.find_moving_average_signals(
+        dual_ma.calculate_moving_averages(df.copy(), *windows), *windows)
+
+    strategy = dual_ma.StreamingDualMovingAverage(*windows)
+    signals = [strategy.update(date, close) for date, close in zip(df['date'], df['close'])]
+    assert [signal for signal in signals if signal is not None] == expected
+    assert strategy.profit_points == pytest.approx(expected_points)
+    assert len(expected) > 10
+
+
+def test_rolling_mean_stays_within_tolerance():
+    values = random_bars(0, n=20000, integer_prices=False)['close']
+    expected = values.rolling(window=20).mean().to_numpy()
+    rolling = dual_ma.RollingMean(20)
+    got = np.array([rolling.update(value) for value in values])
+    assert np.array_equal(np.isnan(got), np.isnan(expected))
+    valid = ~np.isnan(expected)
+    assert np.all(np.abs(got[valid] - expected[valid]) <= dual_ma.MA_TOLERANCE * np.abs(expected[valid]))
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('integer_prices', [True, False])
+@pytest.mark.parametrize('variant', ['momentum', 'prediction'])
+def test_streaming_euler_matches_batch(seed, integer_prices, variant):
+    df = random_bars(seed, integer_prices=integer_prices)
+    timestamps, open_prices, prices = euler.process_data(df)
+    expected = euler.generate_signals(timestamps, prices, open_prices, 10, 0.00002, 18, variant)
+    got = euler.run_streaming(df['ts'].tolist(), df['close'].tolist(), df['open'].tolist(), 10, 0.00002, 18, variant)
+    assert got[0] == expected[0]
+    assert got[1:] == pytest.approx(expected[1:])
+    assert expected[4] > 10
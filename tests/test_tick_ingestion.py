@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, '..', 'tool'))
+sys.path.append(os.path.join(BASE_DIR, '..', 'benchmark'))
+
+import tick_archive
+import get_ticks_from_shioaji as ticks_fetcher
+from synthetic_ticks import FakeTickAPI, generate_ticks
+
+START, END = '2024-01-01', '2024-01-31'
+TODAY = '2024-06-03'
+
+
+def fetch(api, path, **kwargs):
+    kwargs.setdefault('today', TODAY)
+    return ticks_fetcher.fetch_ticks_batched(api, 'TXFR1', START, END, path, batch_days=5, max_workers=2, **kwargs)
+
+
+def assert_day_matches(path, day, seed=0):
+    """檔案庫中的交易日與 FakeTickAPI 產生的逐筆成交完全相同"""
+    expected = generate_ticks(day, seed)
+    got = tick_archive.read_day(path, day)
+    assert np.array_equal(got['ts'], expected['ts'].to_numpy(dtype='datetime64[ns]').view(np.int64))
+    assert np.array_equal(got['price'], expected['price'].to_numpy())
+    assert np.array_equal(got['volume'], expected['volume'].to_numpy())
+    assert np.array_equal(got['tick_type'], expected['tick_type'].to_numpy())
+
+
+def test_download_does_not_import_shioaji():
+    assert 'shioaji' not in sys.modules
+
+
+def test_encoding_keeps_session_gaps_out_of_the_deltas():
+    df = generate_ticks('2024-01-03')
+    data = tick_archive.encode_ticks(df)
+    assert int(data['ts_unit']) == 10**6
+    assert data['ts_delta'].dtype == np.int16
+    assert len(data['ts_jump']) >= 1  # 夜盤結束到日盤開始的休市
+    decoded = tick_archive.decode_ticks(data)
+    assert np.array_equal(decoded['ts'], df['ts'].to_numpy(dtype='datetime64[ns]').view(np.int64))
+
+
+def test_failed_days_are_resumed(tmp_path):
+    path = str(tmp_path / 'TXFR1')
+    api = FakeTickAPI(fail_dates={'2024-01-03', '2024-01-17'})
+    with pytest.raises(RuntimeError):
+        fetch(api, path)
+    assert not tick_archive.has_day(path, '2024-01-03')
+    first_calls = len(api.calls)
+
+    fetch(api, path)
+    assert sorted(api.calls[first_calls:]) == ['2024-01-03', '2024-01-17']
+    days = tick_archive.archived_days(path)
+    assert days == ticks_fetcher.trading_dates(START, END)
+    for day in days:
+        assert_day_matches(path, day)
+
+    # 全部完成後不再呼叫API
+    calls = len(api.calls)
+    assert fetch(api, path) == 0
+    assert len(api.calls) == calls
+
+
+def test_stops_when_quota_runs_out(tmp_path):
+    path = str(tmp_path / 'TXFR1')
+    per_day = len(generate_ticks('2024-01-02')) * 64
+    api = FakeTickAPI(remaining_bytes=per_day * 3)
+    fetch(api, path, min_remaining_bytes=per_day)
+    assert len(api.calls) == 5  # 只送出第一批
+    assert len(tick_archive.archived_days(path)) == 5
+
+    api.remaining_bytes = None
+    fetch(api, path, min_remaining_bytes=per_day)
+    assert tick_archive.archived_days(path) == ticks_fetcher.trading_dates(START, END)
+    assert len(api.calls) == len(ticks_fetcher.trading_dates(START, END))
+
+
+def test_days_from_today_are_skipped(tmp_path):
+    path = str(tmp_path / 'TXFR1')
+    api = FakeTickAPI()
+    fetch(api, path, today='2024-01-29')
+    assert max(api.calls) == '2024-01-26'
+    assert tick_archive.archived_days(path)[-1] == '2024-01-26'
+
+
+def test_recent_empty_days_are_retried(tmp_path):
+    path = str(tmp_path / 'TXFR1')
+    api = FakeTickAPI(empty_dates=ticks_fetcher.trading_dates(START, END))
+    fetch(api, path, today='2024-01-29', empty_retry_days=7)
+    # 2024-01-22 之後沒有成交的交易日不寫入，下次執行時重新下載
+    days = tick_archive.archived_days(path)
+    assert days == [day for day in ticks_fetcher.trading_dates(START, END) if day < '2024-01-22']
+    calls = len(api.calls)
+    fetch(api, path, today='2024-01-29', empty_retry_days=7)
+    assert sorted(api.calls[calls:]) == ['2024-01-22', '2024-01-23', '2024-01-24', '2024-01-25', '2024-01-26']
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+import bar_store
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+
+
+def _convert(values, dtype, name):
+    """轉換為指定型態 (已是目標型態時不複製)，轉換後數值改變時拋出 ValueError"""
+    values = np.asarray(values)
+    converted = np.asarray(values, dtype=dtype)
+    if converted.dtype != values.dtype and not np.array_equal(converted, values, equal_nan=converted.dtype.kind == 'f'):
+        raise ValueError(f"{name} 無法以 {np.dtype(dtype).name} 精確表示，請使用 float64/int64")
+    return converted
+
+
+class BarSeries:
+    """
+    以陣列儲存的K棒序列：時間為 int64 奈秒，價格預設為 float64，成交量預設為 int64。
+    可以像 DataFrame 一樣用 series['close']、series['ts'] (或 'date') 取出欄位陣列，
+    切片 (位置或時間區間) 共用原本的陣列，不會複製數據。
+    只有整數點數的期貨價格可指定 price_dtype=np.float32、volume_dtype=np.int32 減少一半記憶體，
+    無法精確轉換的數值 (例如含小數的指數或超過 int32 的成交量) 會拋出 ValueError。
+    """
+    __slots__ = ('ts', 'open', 'high', 'low', 'close', 'volume', 'time_column')
+
+    def __init__(self, ts, open, high, low, close, volume=None, time_column='ts'):
+        self.ts = ts
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.time_column = time_column
+
+    @classmethod
+    def from_arrays(cls, ts, open, high, low, close, volume=None, time_column='ts',
+                    price_dtype=np.float64, volume_dtype=np.int64):
+        """將任意時間和價格陣列轉換為指定的型態 (已是目標型態時不複製，數值改變時拋出 ValueError)"""
+        ts = np.asarray(ts)
+        if ts.dtype.kind == 'M':
+            ts = ts.astype('datetime64[ns]', copy=False).view(np.int64)
+        prices = [None if values is None else _convert(values, price_dtype, name)
+                  for name, values in zip(PRICE_COLUMNS, (open, high, low, close))]
+        volume = None if volume is None else _convert(volume, volume_dtype, 'volume')
+        return cls(np.asarray(ts, dtype=np.int64), *prices, volume, time_column)
+
+    @classmethod
+    def from_frame(cls, df, time_column=None, price_dtype=np.float64, volume_dtype=np.int64):
+        """從包含 'ts' 或 'date' 列的 DataFrame 建立 (缺少的價格欄位為 None)"""
+        time_column = time_column or bar_store._time_column(df.columns)
+        columns = [df[name].to_numpy() if name in df.columns else None for name in PRICE_COLUMNS + ('volume',)]
+        return cls.from_arrays(pd.to_datetime(df[time_column]).to_numpy(dtype='datetime64[ns]'), *columns,
+                               time_column=time_column, price_dtype=price_dtype, volume_dtype=volume_dtype)
+
+    @property
+    def columns(self):
+        names = [self.time_column] + [name for name in PRICE_COLUMNS if getattr(self, name) is not None]
+        return tuple(names + (['volume'] if self.volume is not None else []))
+
+    @property
+    def times(self):
+        """時間欄位的 datetime64[ns] 視圖 (不複製)"""
+        return self.ts.view('datetime64[ns]')
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ('ts',) + PRICE_COLUMNS + ('volume',)
+                   if getattr(self, name) is not None)
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key in ('ts', 'date', self.time_column):
+                return self.times
+            values = getattr(self, key) if key in PRICE_COLUMNS + ('volume',) else None
+            if values is None:
+                raise KeyError(key)
+            return values
+        if isinstance(key, slice):
+            return BarSeries(*(None if values is None else values[key] for values in
+                               (self.ts, self.open, self.high, self.low, self.close, self.volume)), self.time_column)
+        raise TypeError(f"不支援的索引: {key!r}")
+
+    def between(self, start=None, end=None):
+        """返回時間在 [start, end] 之間的K棒 (依時間排序的數據，不複製)"""
+        lo = 0 if start is None else np.searchsorted(self.ts, pd.Timestamp(start).value, side='left')
+        hi = len(self.ts) if end is None else np.searchsorted(self.ts, pd.Timestamp(end).value, side='right')
+        return self[lo:hi]
+
+    def to_frame(self):
+        """轉換為 pandas DataFrame (需要逐列加入欄位的函數使用，例如計算均線)"""
+        return pd.DataFrame({name: self[name] for name in self.columns})
+
+
+def read_bar_series(path, time_format=None, errors='raise', dayfirst=False,
+                    price_dtype=np.float64, volume_dtype=np.int64):
+    """
+    從CSV檔案或 bar store 資料夾直接讀取 BarSeries，只讀入需要的欄位。
+    :param path: CSV 檔案名稱或 bar store 資料夾
+    :param time_format: 時間字串的格式 (傳給 pd.to_datetime)
+    :param errors: 時間解析失敗時的處理方式 (傳給 pd.to_datetime，'coerce' 代表設為 NaT)
+    :param dayfirst: 日期是否以日在前 (只在未指定 time_format 時使用，傳給 pd.read_csv)
+    :param price_dtype: 價格的型態，np.float32 只適用於整數點數的價格 (見 BarSeries)
+    :param volume_dtype: 成交量的型態
+    """
+    if bar_store.is_bar_store(path):
+        df = bar_store.read_bars(path)
+        return BarSeries.from_frame(df, price_dtype=price_dtype, volume_dtype=volume_dtype)
+
+    header = pd.read_csv(path, nrows=0).columns
+    time_column = bar_store._time_column(header)
+    columns = [time_column] + [name for name in PRICE_COLUMNS + ('volume',) if name in header]
+    # 先以 float64 讀取，轉換為較小的型態時才能檢查數值是否改變
+    dtypes = {name: np.float64 for name in PRICE_COLUMNS if name in header}
+    if time_format is None:
+        # 與原本的 read_csv(parse_dates=...) 相同的解析方式
+        df = pd.read_csv(path, usecols=columns, dtype=dtypes, parse_dates=[time_column], dayfirst=dayfirst)
+        ts = pd.to_datetime(df[time_column], errors=errors)
+    else:
+        df = pd.read_csv(path, usecols=columns, dtype=dtypes)
+        ts = pd.to_datetime(df[time_column], format=time_format, errors=errors)
+    volume = df['volume'].to_numpy() if 'volume' in df.columns else None
+    return BarSeries.from_arrays(ts.to_numpy(dtype='datetime64[ns]'),
+                                 *(df[name].to_numpy() if name in df.columns else None for name in PRICE_COLUMNS),
+                                 volume, time_column=time_column, price_dtype=price_dtype, volume_dtype=volume_dtype)
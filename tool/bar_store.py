@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+import os
+import shutil
+
+# 資料夾結構: {root}/{contract}/{freq}/{YYYY-MM}/{column}.npy
+# 每個欄位存成獨立的 .npy 檔，讀取時可用 memory map 只載入需要的欄位和時間區間。
+TIME_COLUMNS = ('ts', 'date')
+BAR_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def dataset_path(root, contract, freq):
+    """返回指定合約和週期的資料夾路徑，例如 bars/TXFR2/1min"""
+    return os.path.join(root, contract, freq)
+
+
+def is_bar_store(path):
+    """判斷路徑是否為 bar store 的資料夾"""
+    return os.path.isdir(path)
+
+
+def _time_column(columns):
+    """找出時間欄位名稱 ('ts' 或 'date')"""
+    for name in TIME_COLUMNS:
+        if name in columns:
+            return name
+    raise ValueError("數據中沒有找到 'ts' 或 'date' 列。")
+
+
+def _partition_columns(partition_dir):
+    """返回分區內所有欄位名稱 (依寫入順序)"""
+    with open(os.path.join(partition_dir, '_columns'), 'r') as f:
+        return f.read().split()
+
+
+def _read_partition(partition_dir, columns):
+    """讀取單一分區，返回 {欄位: 陣列}"""
+    return {name: np.load(os.path.join(partition_dir, f"{name}.npy"), mmap_mode='r') for name in columns}
+
+
+def _is_partition(path, name):
+    """分區資料夾 (排除寫入中的 .tmp 和替換中的 .old)"""
+    return os.path.isdir(os.path.join(path, name)) and not name.endswith(('.tmp', '.old'))
+
+
+def _recover_partitions(path):
+    """
+    上次替換分區時中斷 (舊分區已移到 .old 但新分區還沒改名) 時，將舊分區移回原位；
+    新分區已就位時刪除留下的 .old。
+    """
+    if not os.path.isdir(path):
+        return
+    for name in os.listdir(path):
+        if not name.endswith('.old'):
+            continue
+        old_dir = os.path.join(path, name)
+        partition_dir = old_dir[:-len('.old')]
+        if os.path.exists(partition_dir):
+            shutil.rmtree(old_dir)
+        else:
+            os.rename(old_dir, partition_dir)
+
+
+def _write_partition(partition_dir, data):
+    """
+    先寫入暫存資料夾再替換，避免寫到一半的分區被讀到。
+    替換時先把舊分區移到 .old，新分區改名後才刪除，任何時候中斷都不會遺失整個月份 (見 _recover_partitions)。
+    """
+    tmp_dir = partition_dir + '.tmp'
+    old_dir = partition_dir + '.old'
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    for name, values in data.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), values)
+    with open(os.path.join(tmp_dir, '_columns'), 'w') as f:
+        f.write('\n'.join(data.keys()))
+    if os.path.exists(partition_dir):
+        os.rename(partition_dir, old_dir)
+    os.rename(tmp_dir, partition_dir)
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+
+
+def write_bars(df, path):
+    """
+    將K棒數據依月份分區寫入 bar store，與既有分區合併，重複的時間以新數據為準。
+    :param df: 包含 'ts' 或 'date' 時間列的 DataFrame
+    :param path: 資料夾路徑 (見 dataset_path)
+    """
+    time_col = _time_column(df.columns)
+    times = pd.to_datetime(df[time_col]).to_numpy(dtype='datetime64[ns]')
+    columns = [time_col] + [c for c in df.columns if c != time_col]
+    for name in columns[1:]:
+        if pd.api.types.is_object_dtype(df[name]) or pd.api.types.is_string_dtype(df[name]):
+            raise ValueError(f"欄位 '{name}' 不是數值型態，無法寫入 bar store。")
+
+    _recover_partitions(path)
+    months = times.astype('datetime64[M]')
+    for month in np.unique(months):
+        mask = months == month
+        data = {time_col: times[mask]}
+        for name in columns[1:]:
+            data[name] = df[name].to_numpy()[mask]
+
+        partition_dir = os.path.join(path, str(month))
+        if os.path.exists(partition_dir):
+            old = _read_partition(partition_dir, columns)
+            data = {name: np.concatenate([old[name], data[name]]) for name in columns}
+
+        # 依時間排序並去除重複 (保留最後寫入的數據)
+        order = np.argsort(data[time_col], kind='stable')
+        sorted_times = data[time_col][order]
+        last = np.append(sorted_times[1:] != sorted_times[:-1], True)
+        data = {name: values[order][last] for name, values in data.items()}
+        _write_partition(partition_dir, data)
+
+
+def clear_bars(path):
+    """刪除資料夾中的所有分區 (保留其他檔案)，用於整批重寫"""
+    if not os.path.isdir(path):
+        return
+    for partition in os.listdir(path):
+        if os.path.isdir(os.path.join(path, partition)):
+            shutil.rmtree(os.path.join(path, partition))
+
+
+def _empty_bars(columns):
+    """沒有任何分區時返回的空 DataFrame：包含 'ts' 時間列和要求的欄位 (None 代表 OHLCV)"""
+    columns = [c for c in (BAR_COLUMNS if columns is None else columns) if c not in TIME_COLUMNS]
+    df = pd.DataFrame({name: np.array([], dtype=np.int64 if name == 'volume' else np.float64) for name in columns})
+    df.insert(0, 'ts', np.array([], dtype='datetime64[ns]'))
+    return df
+
+
+def read_bars(path, start=None, end=None, columns=None):
+    """
+    從 bar store 讀取K棒數據。
+    :param path: 資料夾路徑 (見 dataset_path)
+    :param start: 開始時間 (含)，None 代表不限制
+    :param end: 結束時間 (含)，None 代表不限制
+    :param columns: 要讀取的欄位，None 代表全部欄位，空列表代表只讀取時間列；時間列一定會讀取
+    :return: 依時間排序的 DataFrame (資料夾不存在或沒有數據時為只有欄位名稱的空 DataFrame)
+    """
+    if not os.path.isdir(path):
+        return _empty_bars(columns)
+    _recover_partitions(path)
+    start = None if start is None else np.datetime64(pd.Timestamp(start).value, 'ns')
+    end = None if end is None else np.datetime64(pd.Timestamp(end).value, 'ns')
+    partitions = sorted(p for p in os.listdir(path) if _is_partition(path, p))
+
+    # 只讀取與時間區間重疊的月份分區
+    if start is not None:
+        partitions = [p for p in partitions if np.datetime64(p, 'M') >= start.astype('datetime64[M]')]
+    if end is not None:
+        partitions = [p for p in partitions if np.datetime64(p, 'M') <= end.astype('datetime64[M]')]
+
+    names = None
+    chunks = []
+    for partition in partitions:
+        partition_dir = os.path.join(path, partition)
+        if names is None:
+            all_columns = _partition_columns(partition_dir)
+            time_col = all_columns[0]
+            names = [time_col] + [c for c in (all_columns[1:] if columns is None else columns) if c != time_col]
+        data = _read_partition(partition_dir, names)
+        times = data[time_col]
+        lo = 0 if start is None else np.searchsorted(times, start, side='left')
+        hi = len(times) if end is None else np.searchsorted(times, end, side='right')
+        chunks.append({name: values[lo:hi] for name, values in data.items()})
+
+    if names is None:
+        return _empty_bars(columns)
+    return pd.DataFrame({name: np.concatenate([chunk[name] for chunk in chunks]) for name in names})
@@ -1,9 +1,24 @@
 #!/usr/bin/env python3
 
-import shioaji as sj
+from __future__ import annotations
+
 import pandas as pd
 import configparser
-from datetime import datetime
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+import bar_store
+from profiling import profiled
+from kbar_cache import KbarCache, contract_key
+
+if TYPE_CHECKING:
+    # 只用於型別標註；shioaji 在登入時才匯入，下載函數可以搭配假的 API 在沒有安裝 shioaji 的環境執行
+    import shioaji as sj
 
 
 def load_config(file_path: str, key_name: str) -> dict:
@@ -15,11 +30,13 @@ def load_config(file_path: str, key_name: str) -> dict:
 
 def login_to_shioaji(api_key: str, secret_key: str) -> sj.Shioaji:
     """登錄Shioaji API."""
+    import shioaji as sj
     api = sj.Shioaji()
     api.login(api_key=api_key, secret_key=secret_key,
               contracts_cb=lambda security_type: print(f"{repr(security_type)} fetch done."))
     return api
 
+@profiled('get_raw_data_from_shioaji.fetch_kbars')
 def fetch_kbars(api: sj.Shioaji, contract, start_date: str, end_date: str) -> pd.DataFrame:
     """獲取指定合約的歷史數據，並轉換為Pandas DataFrame."""
     kbars = api.kbars(contract, start=start_date, end=end_date)
@@ -34,6 +51,154 @@ def fetch_kbars(api: sj.Shioaji, contract, start_date: str, end_date: str) -> pd
     return df
 
 
+@profiled('get_raw_data_from_shioaji.fetch_kbars_cached')
+def fetch_kbars_cached(api: sj.Shioaji, contract, start_date: str, end_date: str, cache: KbarCache,
+                       refresh_days: int = 0) -> pd.DataFrame:
+    """透過本地快取獲取歷史數據，只向API請求尚未快取或需要重新下載的日期."""
+    return cache.get(contract_key(contract),
+                     lambda start, end: fetch_kbars(api, contract, start, end),
+                     start_date, end_date, refresh_days=refresh_days)
+
+
+def date_chunks(start_date: str, end_date: str, chunk_days: int) -> list:
+    """將日期區間切成多段，每段最多 chunk_days 天 (頭尾皆包含)."""
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    chunks = []
+    while start <= end:
+        chunk_end = min(start + timedelta(days=chunk_days - 1), end)
+        chunks.append((start.strftime("%Y-%m-%d"), chunk_end.strftime("%Y-%m-%d")))
+        start = chunk_end + timedelta(days=1)
+    return chunks
+
+
+class Throttle:
+    """限制在 period 秒內最多呼叫 max_calls 次API，可在多個執行緒間共用."""
+
+    def __init__(self, max_calls: int, period: float):
+        self.max_calls = max_calls
+        self.period = period
+        self.calls = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.calls and now - self.calls[0] >= self.period:
+                    self.calls.popleft()
+                if len(self.calls) < self.max_calls:
+                    self.calls.append(now)
+                    return
+                wait_time = self.period - (now - self.calls[0])
+            time.sleep(wait_time)
+
+
+def has_quota(api: sj.Shioaji, min_remaining_bytes: int) -> bool:
+    """檢查API剩餘流量是否足夠繼續下載."""
+    if min_remaining_bytes <= 0:
+        return True
+    remaining = getattr(api.usage(), 'remaining_bytes', None)
+    return remaining is None or remaining >= min_remaining_bytes
+
+
+def load_progress(progress_file: str) -> set:
+    """讀取已完成的日期區段."""
+    if progress_file is None or not os.path.exists(progress_file):
+        return set()
+    with open(progress_file, 'r') as f:
+        return {tuple(chunk) for chunk in json.load(f)}
+
+
+def save_progress(progress_file: str, done: set):
+    """保存已完成的日期區段，先寫暫存檔再替換，避免中斷時檔案損毀."""
+    if progress_file is None:
+        return
+    os.makedirs(os.path.dirname(progress_file) or '.', exist_ok=True)
+    tmp_file = progress_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(sorted(done), f)
+    os.replace(tmp_file, progress_file)
+
+
+@profiled('get_raw_data_from_shioaji.fetch_kbars_chunked')
+def fetch_kbars_chunked(api: sj.Shioaji, contract, start_date: str, end_date: str, store_path: str,
+                        chunk_days: int = 30, max_workers: int = 4, progress_file: str = None,
+                        min_remaining_bytes: int = 0, throttle: Throttle = None,
+                        cache: KbarCache = None, refresh_days: int = 0, today: str = None) -> int:
+    """
+    分段並行下載歷史K棒，每段完成後立即寫入 bar store 並記錄進度，中斷後可從未完成的區段繼續。
+    結束日期在最近 refresh_days 天內或今天之後的區段可能還不完整，不記錄為已完成，下次執行時重新下載。
+    :param api: 已登入的Shioaji API (或具有相同 kbars/usage 介面的物件)
+    :param store_path: bar store 資料夾路徑
+    :param chunk_days: 每段的天數
+    :param max_workers: 同時下載的區段數
+    :param progress_file: 進度檔案路徑，None 代表不記錄進度
+    :param min_remaining_bytes: API剩餘流量低於此值時停止送出新的區段
+    :param throttle: 限制API呼叫頻率的 Throttle，None 代表不限制
+    :param cache: 本地K棒快取，已快取的日期不再向API請求，None 代表不使用快取
+    :param refresh_days: 最近幾天的數據仍重新下載 (快取和進度檔案都適用)
+    :param today: 計算最近幾天的基準日期 (YYYY-MM-DD)，None 代表今天
+    :return: 本次寫入的K棒數量
+    """
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    # 結束日期早於此日期的區段才是完整的
+    final_before = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=refresh_days)).strftime("%Y-%m-%d")
+    done = {chunk for chunk in load_progress(progress_file) if chunk[1] < final_before}
+    chunks = iter([chunk for chunk in date_chunks(start_date, end_date, chunk_days) if chunk not in done])
+
+    def fetch(chunk):
+        def fetch_range(start, end):
+            if throttle is not None:
+                throttle.acquire()
+            return fetch_kbars(api, contract, start, end)
+        if cache is not None:
+            return cache.get(contract_key(contract), fetch_range, chunk[0], chunk[1],
+                             refresh_days=refresh_days, today=today)
+        return fetch_range(chunk[0], chunk[1])
+
+    total_rows = 0
+    failed = []
+    out_of_quota = False
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        while True:
+            # 保持最多 max_workers 個區段在下載中，避免所有結果同時佔用記憶體
+            while len(futures) < max_workers and not out_of_quota:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                if not has_quota(api, min_remaining_bytes):
+                    out_of_quota = True
+                    break
+                futures[executor.submit(fetch, chunk)] = chunk
+            if not futures:
+                break
+
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                chunk = futures.pop(future)
+                try:
+                    df = future.result()
+                except Exception as e:
+                    print(f"下載 {chunk[0]} ~ {chunk[1]} 失敗: {e}")
+                    failed.append(chunk)
+                    continue
+                bar_store.write_bars(df, store_path)
+                total_rows += len(df)
+                if chunk[1] < final_before:
+                    done.add(chunk)
+                    save_progress(progress_file, done)
+                print(f"已完成 {chunk[0]} ~ {chunk[1]}，共 {len(df)} 筆")
+
+    if out_of_quota:
+        print("API剩餘流量不足，已停止下載，下次執行會從未完成的區段繼續")
+    if failed:
+        raise RuntimeError(f"{len(failed)} 個區段下載失敗，重新執行即可從未完成的區段繼續")
+    return total_rows
+
+
+@profiled('get_raw_data_from_shioaji.save_to_csv')
 def save_to_csv(df: pd.DataFrame, file_path: str):
     """將DataFrame保存為CSV文件."""
     df.to_csv(file_path, index=False)
@@ -55,29 +220,37 @@ def main():
     
     # 登錄API
     api = login_to_shioaji(credentials['api_key'], credentials['secret_key'])
-    
-    # 檢查API使用情況
-    usage = api.usage()
-    print(usage)
-    
-    # 獲取合約
-    contract = api.Contracts.Futures.TXF.TXFR2
-    print(contract)
-    
-    # 設定開始和結束日期
-    start_date = "2020-03-02"
-    end_date = "2024-09-17"
-    
-    # 獲取歷史數據
-    df = fetch_kbars(api, contract, start_date, end_date)
-    
-    # 保存為CSV
-    csv_file = "TXFR2_yearly_report.csv"
-    save_to_csv(df, csv_file)
-    
-    # 登出API
-    logout(api)
+    try:
+        # 檢查API使用情況
+        usage = api.usage()
+        print(usage)
+
+        # 獲取合約
+        contract = api.Contracts.Futures.TXF.TXFR2
+        print(contract)
+
+        # 設定開始和結束日期
+        start_date = "2020-03-02"
+        end_date = "2024-09-17"
+
+        # 分段下載歷史數據，每段完成後立即保存到 bar store (依月份分區的欄位檔)
+        store_path = bar_store.dataset_path("bars", "TXFR2", "1min")
+        fetch_kbars_chunked(api, contract, start_date, end_date, store_path,
+                            chunk_days=30, max_workers=4,
+                            progress_file=os.path.join(store_path, "_progress.json"),
+                            min_remaining_bytes=50 * 1024 * 1024,
+                            throttle=Throttle(max_calls=50, period=5.0),
+                            cache=KbarCache("cache/kbars", max_bytes=2 * 1024 ** 3),
+                            refresh_days=3)
+        print(f"數據已保存到 {store_path}")
 
+        # 保存為CSV
+        df = bar_store.read_bars(store_path, start_date, end_date + " 23:59:59")
+        csv_file = "TXFR2_yearly_report.csv"
+        save_to_csv(df, csv_file)
+    finally:
+        # 登出API (下載失敗時也要登出)
+        logout(api)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from typing import TYPE_CHECKING
+import tick_archive
+from profiling import profiled
+from get_raw_data_from_shioaji import Throttle, has_quota, load_config, login_to_shioaji, logout
+
+if TYPE_CHECKING:
+    # 只用於型別標註；下載函數可以搭配 synthetic_ticks.FakeTickAPI 在沒有安裝 shioaji 的環境執行
+    import shioaji as sj
+
+
+@profiled('get_ticks_from_shioaji.fetch_ticks')
+def fetch_ticks(api: sj.Shioaji, contract, date: str) -> pd.DataFrame:
+    """獲取指定合約一個交易日的逐筆成交，並轉換為Pandas DataFrame."""
+    ticks = api.ticks(contract=contract, date=date)
+    return pd.DataFrame({
+        "ts": pd.to_datetime(ticks.ts),
+        "price": ticks.close,
+        "volume": ticks.volume,
+        "tick_type": ticks.tick_type,
+    })
+
+
+def trading_dates(start_date: str, end_date: str) -> list:
+    """返回區間內的週一到週五 (假日由API返回空的逐筆成交，同樣會被記錄為已下載，見 fetch_ticks_batched)."""
+    days = pd.date_range(start_date, end_date, freq='D')
+    return [day.strftime('%Y-%m-%d') for day in days if day.dayofweek < 5]
+
+
+@profiled('get_ticks_from_shioaji.fetch_ticks_batched')
+def fetch_ticks_batched(api: sj.Shioaji, contract, start_date: str, end_date: str, path: str,
+                        batch_days: int = 20, max_workers: int = 4, min_remaining_bytes: int = 0,
+                        throttle: Throttle = None, price_scale: int = 1,
+                        today: str = None, empty_retry_days: int = 7) -> int:
+    """
+    依交易日分批並行下載逐筆成交，每個交易日完成後立即寫入逐筆成交檔案庫 (見 tick_archive)。
+    檔案庫中已存在的交易日不再下載，中斷後重新執行即可從未完成的交易日繼續。
+    檔案寫入後不再修改，因此今天 (及之後) 尚未收盤的交易日不下載；
+    最近幾天沒有成交的結果可能只是資料尚未就緒，不寫入檔案，下次執行時重新下載。
+    :param api: 已登入的Shioaji API (或具有相同 ticks/usage 介面的物件，例如 synthetic_ticks.FakeTickAPI)
+    :param path: 逐筆成交資料夾 (見 tick_archive.archive_path)
+    :param batch_days: 每批的交易日數量，每批開始前檢查API剩餘流量
+    :param max_workers: 同時下載的交易日數量
+    :param min_remaining_bytes: API剩餘流量低於此值時停止送出新的一批
+    :param throttle: 限制API呼叫頻率的 Throttle，None 代表不限制
+    :param price_scale: 價格乘上此數值後為整數 (見 tick_archive.encode_ticks)
+    :param today: 今天的日期 (YYYY-MM-DD)，None 代表系統日期
+    :param empty_retry_days: 今天之前幾天內沒有成交的交易日不視為已完成 (假日會在超過天數後才記錄)
+    :return: 本次寫入的逐筆成交數量
+    """
+    today = today or date.today().isoformat()
+    retry_from = (date.fromisoformat(today) - timedelta(days=empty_retry_days)).isoformat()
+    dates = trading_dates(start_date, end_date)
+    if dates and dates[-1] >= today:
+        print(f"{today} 及之後的交易日尚未結束，不下載")
+    pending = [day for day in dates if day < today and not tick_archive.has_day(path, day)]
+
+    def fetch(day):
+        if throttle is not None:
+            throttle.acquire()
+        return fetch_ticks(api, contract, day)
+
+    total_rows = 0
+    failed = []
+    out_of_quota = False
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for k in range(0, len(pending), batch_days):
+            if not has_quota(api, min_remaining_bytes):
+                out_of_quota = True
+                break
+            futures = {executor.submit(fetch, day): day for day in pending[k:k + batch_days]}
+            for future in as_completed(futures):
+                day = futures[future]
+                try:
+                    df = future.result()
+                except Exception as e:
+                    print(f"下載 {day} 失敗: {e}")
+                    failed.append(day)
+                    continue
+                if len(df) == 0 and day >= retry_from:
+                    print(f"{day} 沒有成交，可能是資料尚未就緒，下次執行時重新下載")
+                    continue
+                size = tick_archive.write_day(path, day, df, price_scale)
+                total_rows += len(df)
+                print(f"已完成 {day}，共 {len(df)} 筆 (壓縮後 {size / 1024:.0f} KiB)")
+
+    if out_of_quota:
+        print("API剩餘流量不足，已停止下載，下次執行會從未完成的交易日繼續")
+    if failed:
+        raise RuntimeError(f"{len(failed)} 個交易日下載失敗，重新執行即可從未完成的交易日繼續")
+    return total_rows
+
+
+def main():
+    config_file = 'shioaji_api_config.ini'
+    key_name = 'key'
+
+    # 加載配置並登錄API
+    credentials = load_config(config_file, key_name)
+    api = login_to_shioaji(credentials['api_key'], credentials['secret_key'])
+
+    # 獲取合約
+    contract = api.Contracts.Futures.TXF.TXFR1
+    print(contract)
+
+    # 設定開始和結束日期
+    start_date = "2024-06-03"
+    end_date = "2024-09-17"
+
+    try:
+        # 依交易日分批下載逐筆成交，每天完成後立即保存
+        path = tick_archive.archive_path("ticks", "TXFR1")
+        fetch_ticks_batched(api, contract, start_date, end_date, path,
+                            batch_days=20, max_workers=4,
+                            min_remaining_bytes=50 * 1024 * 1024,
+                            throttle=Throttle(max_calls=50, period=5.0))
+        print(f"逐筆成交已保存到 {path}，可用 tick_bars.py 產生時間、成交量或成交筆數K棒")
+    finally:
+        # 登出API
+        logout(api)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from session_calendar import parse_close_time
+
+# 資料夾結構: {cache_dir}/{contract_key}/{YYYY-MM-DD}.npz，以及記錄已下載日期的 _index.json
+# 每根K棒依所屬的交易日存放 (與 api.kbars 的日期區間相同，交易日 D 包含 D 前一個交易日 15:00 開始的夜盤)；
+# _index.json 只記錄曾經向API請求過、且已經結束的交易日。
+COLUMNS = ('ts', 'open', 'high', 'low', 'close', 'volume')
+SECONDS_PER_DAY = 86400
+DAY_OPEN = '08:45'  # 日盤開始時間
+DAY_CLOSE = '13:45'  # 日盤收盤時間，之後的夜盤屬於下一個交易日
+
+
+def contract_key(contract) -> str:
+    """返回合約的快取鍵，例如 TXF.TXFR2"""
+    category = getattr(contract, 'category', None)
+    code = getattr(contract, 'code', str(contract))
+    return f"{category}.{code}" if category else code
+
+
+def day_range(start_date: str, end_date: str) -> list:
+    """返回區間內所有日期字串 (頭尾皆包含)"""
+    days = pd.date_range(start_date, end_date, freq='D')
+    return [day.strftime('%Y-%m-%d') for day in days]
+
+
+def trading_days_of(ts) -> np.ndarray:
+    """
+    返回每根K棒所屬的交易日 (datetime64[D])：日盤收盤之後的夜盤 (含跨過午夜的部分) 屬於下一個交易日。
+    下一個交易日為數據中下一個有日盤K棒的日期，數據中沒有時使用下一個平日。
+    """
+    ts = pd.to_datetime(ts).to_numpy(dtype='datetime64[ns]')
+    days = ts.astype('datetime64[D]')
+    time_ns = (ts - days).astype(np.int64)
+    in_day = (time_ns > parse_close_time(DAY_OPEN)) & (time_ns <= parse_close_time(DAY_CLOSE))
+    candidate = days + (time_ns > parse_close_time(DAY_CLOSE)).astype('timedelta64[D]')
+    fallback = np.busday_offset(candidate, 0, roll='forward')
+    session_days = np.unique(days[in_day])
+    if len(session_days) == 0:
+        return fallback
+    idx = np.searchsorted(session_days, candidate, side='left')
+    return np.where(idx < len(session_days), session_days[np.minimum(idx, len(session_days) - 1)], fallback)
+
+
+def group_ranges(days: list) -> list:
+    """將排序後的日期合併成連續區間 [(開始, 結束), ...]"""
+    ranges = []
+    for day in days:
+        current = datetime.strptime(day, '%Y-%m-%d')
+        if ranges and datetime.strptime(ranges[-1][1], '%Y-%m-%d') + timedelta(days=1) == current:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+class KbarCache:
+    """
+    以合約和日期為鍵的本地K棒快取。過去日期的K棒不會改變，重複請求時只下載尚未快取的日期。
+    :param cache_dir: 快取資料夾
+    :param max_bytes: 快取總大小上限，超過時先移除最久未讀取的日期，None 代表不限制
+    :param max_age_days: 下載超過此天數的日期會被移除，None 代表不限制
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = None, max_age_days: float = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.indexes = {}
+        self.lock = threading.RLock()
+
+    def _key_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _day_file(self, key, day):
+        return os.path.join(self._key_dir(key), f"{day}.npz")
+
+    def _index(self, key):
+        """讀取合約的索引 {日期: {'fetched_at': 秒, 'accessed_at': 秒}}"""
+        if key not in self.indexes:
+            index_file = os.path.join(self._key_dir(key), '_index.json')
+            if os.path.exists(index_file):
+                with open(index_file, 'r') as f:
+                    self.indexes[key] = json.load(f)
+            else:
+                self.indexes[key] = {}
+        return self.indexes[key]
+
+    def _save_index(self, key):
+        os.makedirs(self._key_dir(key), exist_ok=True)
+        index_file = os.path.join(self._key_dir(key), '_index.json')
+        with open(index_file + '.tmp', 'w') as f:
+            json.dump(self._index(key), f)
+        os.replace(index_file + '.tmp', index_file)
+
+    def _read_day(self, key, day):
+        with np.load(self._day_file(key, day)) as data:
+            return {name: data[name] for name in COLUMNS}
+
+    def _split_days(self, df):
+        """將K棒依交易日分組並依時間排序 (重複的時間保留最後一筆)，返回 {交易日: {欄位: 陣列}}"""
+        ts = pd.to_datetime(df['ts']).to_numpy(dtype='datetime64[ns]')
+        days = trading_days_of(ts)
+        result = {}
+        for day in np.unique(days):
+            mask = days == day
+            data = {'ts': ts[mask]}
+            for name in COLUMNS[1:]:
+                data[name] = df[name].to_numpy()[mask]
+            order = np.argsort(data['ts'], kind='stable')
+            sorted_ts = data['ts'][order]
+            last = np.append(sorted_ts[1:] != sorted_ts[:-1], True)
+            result[str(day)] = {name: values[order][last] for name, values in data.items()}
+        return result
+
+    def _write_day(self, key, day, data):
+        """以新下載的數據取代整個交易日 (沒有數據時刪除舊檔案)，返回檔案大小"""
+        os.makedirs(self._key_dir(key), exist_ok=True)
+        path = self._day_file(key, day)
+        if data is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return 0
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **data)
+        os.replace(path + '.tmp', path)
+        return os.path.getsize(path)
+
+    def missing_ranges(self, key, start_date, end_date, refresh_days=0, today=None):
+        """
+        返回需要向API請求的連續日期區間。今天 (及之後) 的交易日尚未結束，一律重新下載。
+        :param refresh_days: 今天之前幾天的數據即使已快取也重新下載 (可能被修正)，例如 1 代表重新下載昨天
+        :param today: 計算最近幾天的基準日期，None 代表今天
+        """
+        with self.lock:
+            index = self._index(key)
+            today = datetime.strptime(today, '%Y-%m-%d') if today else datetime.now()
+            refresh_from = (today - timedelta(days=refresh_days)).strftime('%Y-%m-%d')
+            missing = [day for day in day_range(start_date, end_date)
+                       if day not in index or day >= refresh_from]
+        return group_ranges(missing)
+
+    def get(self, key, fetch, start_date, end_date, refresh_days=0, today=None) -> pd.DataFrame:
+        """
+        返回區間內 (依交易日) 的K棒，只對尚未快取的交易日呼叫 fetch。
+        今天 (及之後) 的交易日可能還不完整，只返回不寫入快取。
+        :param key: 合約的快取鍵 (見 contract_key)
+        :param fetch: fetch(start_date, end_date) -> DataFrame，欄位與 fetch_kbars 相同
+        :param refresh_days: 最近幾天的數據即使已快取也重新下載
+        :return: 依時間排序的 DataFrame
+        """
+        today_str = today or datetime.now().strftime('%Y-%m-%d')
+        fresh = {}
+        wrote = False
+        for start, end in self.missing_ranges(key, start_date, end_date, refresh_days, today):
+            by_day = self._split_days(fetch(start, end))
+            now = time.time()
+            with self.lock:
+                index = self._index(key)
+                # 不在請求區間內的交易日 (例如結束日期收盤後的夜盤) 不完整，不保存
+                for day in day_range(start, end):
+                    if day >= today_str:
+                        if day in by_day:
+                            fresh[day] = by_day[day]
+                        continue
+                    size = self._write_day(key, day, by_day.get(day))
+                    index[day] = {'fetched_at': now, 'accessed_at': now, 'bytes': size}
+                    wrote = True
+                self._save_index(key)
+
+        with self.lock:
+            index = self._index(key)
+            now = time.time()
+            chunks = []
+            for day in day_range(start_date, end_date):
+                if day in fresh:
+                    chunks.append(fresh[day])
+                elif os.path.exists(self._day_file(key, day)):
+                    chunks.append(self._read_day(key, day))
+                if day in index:
+                    index[day]['accessed_at'] = now
+            self._save_index(key)
+            if wrote:
+                self.evict()
+
+        if not chunks:
+            return pd.DataFrame({name: [] for name in COLUMNS}).astype({'ts': 'datetime64[ns]'})
+        return pd.DataFrame({name: np.concatenate([chunk[name] for chunk in chunks]) for name in COLUMNS})
+
+    def evict(self):
+        """
+        依下載時間和總大小上限移除快取的交易日 (get 寫入新數據後呼叫)。
+        使用索引中記錄的檔案大小，不需要逐一讀取每個檔案。
+        """
+        if self.max_bytes is None and self.max_age_days is None:
+            return
+        with self.lock:
+            now = time.time()
+            keys = os.listdir(self.cache_dir) if os.path.isdir(self.cache_dir) else []
+            entries = []
+            for key in keys:
+                if not os.path.isdir(self._key_dir(key)):
+                    continue
+                for day, info in self._index(key).items():
+                    size = info.get('bytes')
+                    if size is None:
+                        path = self._day_file(key, day)
+                        size = info['bytes'] = os.path.getsize(path) if os.path.exists(path) else 0
+                    entries.append((info['accessed_at'], info['fetched_at'], key, day, size))
+
+            total = sum(entry[4] for entry in entries)
+            changed = set()
+            for accessed_at, fetched_at, key, day, size in sorted(entries):
+                expired = self._expired({'fetched_at': fetched_at}, now)
+                # 沒有K棒的交易日 (例如假日) 不佔空間，只依下載時間移除
+                if not expired and (size == 0 or self.max_bytes is None or total <= self.max_bytes):
+                    continue
+                if os.path.exists(self._day_file(key, day)):
+                    os.remove(self._day_file(key, day))
+                self._index(key).pop(day, None)
+                total -= size
+                changed.add(key)
+            for key in changed:
+                self._save_index(key)
+
+    def _expired(self, info, now):
+        return self.max_age_days is not None and now - info['fetched_at'] > self.max_age_days * SECONDS_PER_DAY
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+
+import asyncio
+import threading
+import time
+import numpy as np
+import pandas as pd
+import bar_store
+
+NS_PER_MINUTE = 60 * 10**9
+SLOT_POLL_SECONDS = 0.1  # 佇列已滿時回呼執行緒檢查服務是否結束的間隔
+YIELD_EVERY = 256  # 連續取出多少筆佇列中的成交後讓出事件迴圈，讓消費者和其他協程執行
+
+# K棒欄位與 fetch_kbars 相同，ts 為該分鐘的結束時間 (08:45:00 ~ 08:45:59 的成交屬於 08:46 的K棒)
+BAR_COLUMNS = ('ts', 'open', 'high', 'low', 'close', 'volume')
+
+
+def bar_end(ts_ns):
+    """返回成交時間所屬一分鐘K棒的結束時間 (奈秒)"""
+    return (ts_ns // NS_PER_MINUTE + 1) * NS_PER_MINUTE
+
+
+class BarBuilder:
+    """將逐筆成交合併成一分鐘K棒，只保存目前這根K棒"""
+
+    def __init__(self):
+        self.current = None  # [ts, open, high, low, close, volume]
+        self.last_end = None  # 最後完成的K棒結束時間
+        self.late_ticks = 0  # 因所屬K棒已完成而丟棄的成交數量
+
+    def update(self, ts_ns, price, volume):
+        """
+        加入一筆成交。
+        所屬K棒已經完成 (已輸出並可能已寫入) 的延遲成交會被丟棄並計入 late_ticks，
+        不會改變已完成的K棒，也不會產生相同時間的第二根K棒。
+        :return: 因進入下一分鐘而完成的K棒 (tuple)，沒有完成時返回 None
+        """
+        end = bar_end(ts_ns)
+        bar = self.current
+        if self.last_end is not None and end <= self.last_end:
+            self.late_ticks += 1
+            return None
+        if bar is not None and end <= bar[0]:
+            # 同一分鐘 (或時間稍微倒退、但所屬K棒尚未完成的成交) 併入目前的K棒
+            bar[2] = max(bar[2], price)
+            bar[3] = min(bar[3], price)
+            bar[4] = price
+            bar[5] += volume
+            return None
+        self.current = [end, price, price, price, price, volume]
+        if bar is None:
+            return None
+        self.last_end = bar[0]
+        return tuple(bar)
+
+    def close_until(self, now_ns):
+        """K棒的結束時間已過時直接完成 (沒有下一筆成交也能輸出)，返回完成的K棒或 None"""
+        bar = self.current
+        if bar is not None and bar[0] <= now_ns:
+            self.current = None
+            self.last_end = bar[0]
+            return tuple(bar)
+        return None
+
+
+class BarRingBuffer:
+    """
+    固定大小的K棒環形緩衝區，保存最近 capacity 根K棒，記憶體用量不隨執行時間增加。
+    同時記錄尚未寫入硬碟的K棒數量。
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.open = np.zeros(capacity)
+        self.high = np.zeros(capacity)
+        self.low = np.zeros(capacity)
+        self.close = np.zeros(capacity)
+        self.volume = np.zeros(capacity, dtype=np.int64)
+        self.count = 0  # 累計加入的K棒數量
+        self.flushed = 0  # 已寫入硬碟的K棒數量
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def unflushed(self):
+        return self.count - self.flushed
+
+    def append(self, bar):
+        if self.unflushed >= self.capacity:
+            raise OverflowError("環形緩衝區已滿，尚未寫入的K棒會被覆蓋")
+        k = self.count % self.capacity
+        self.ts[k], self.open[k], self.high[k], self.low[k], self.close[k], self.volume[k] = bar
+        self.count += 1
+
+    def _frame(self, start, stop):
+        """返回累計編號 [start, stop) 的K棒 DataFrame"""
+        idx = np.arange(start, stop) % self.capacity
+        return pd.DataFrame({
+            'ts': self.ts[idx].view('datetime64[ns]'),
+            'open': self.open[idx],
+            'high': self.high[idx],
+            'low': self.low[idx],
+            'close': self.close[idx],
+            'volume': self.volume[idx],
+        })
+
+    def latest(self, n=None):
+        """返回最近 n 根K棒 (預設為緩衝區內全部)"""
+        n = len(self) if n is None else min(n, len(self))
+        return self._frame(self.count - n, self.count)
+
+    def take_unflushed(self):
+        """取出尚未寫入的K棒並標記為已寫入"""
+        frame = self._frame(self.flushed, self.count)
+        self.flushed = self.count
+        return frame
+
+
+class TickReplay:
+    """
+    本地的逐筆成交重播，用於取代即時 API 進行測試。
+    在背景執行緒中依序呼叫 callback(ts_ns, price, volume)，結束時呼叫 callback(None)。
+    """
+
+    def __init__(self, ticks, speed=None):
+        """
+        :param ticks: 包含 ts/price/volume 列的 DataFrame
+        :param speed: 重播速度倍數 (依成交時間間隔等待)，None 代表不等待
+        """
+        self.ts = pd.to_datetime(ticks['ts']).to_numpy(dtype='datetime64[ns]').view('i8')
+        self.price = ticks['price'].to_numpy(dtype=np.float64)
+        self.volume = ticks['volume'].to_numpy(dtype=np.int64)
+        self.speed = speed
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self, callback):
+        def replay():
+            for k in range(len(self.ts)):
+                if self.stopped.is_set():
+                    break
+                if self.speed and k > 0:
+                    time.sleep((self.ts[k] - self.ts[k - 1]) / 1e9 / self.speed)
+                callback(int(self.ts[k]), float(self.price[k]), int(self.volume[k]))
+            callback(None)
+        self.thread = threading.Thread(target=replay, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+
+class ShioajiTickSource:
+    """訂閱 Shioaji 期貨逐筆成交，介面與 TickReplay 相同"""
+
+    def __init__(self, api, contract):
+        self.api = api
+        self.contract = contract
+
+    def start(self, callback):
+        import shioaji as sj
+
+        def on_tick(exchange, tick):
+            callback(pd.Timestamp(tick.datetime).value, float(tick.close), int(tick.volume))
+
+        self.api.quote.set_on_tick_fop_v1_callback(on_tick)
+        self.api.quote.subscribe(self.contract, quote_type=sj.constant.QuoteType.Tick,
+                                 version=sj.constant.QuoteVersion.v1)
+
+    def stop(self):
+        import shioaji as sj
+        self.api.quote.unsubscribe(self.contract, quote_type=sj.constant.QuoteType.Tick,
+                                   version=sj.constant.QuoteVersion.v1)
+
+
+class LiveBarService:
+    """
+    即時將逐筆成交轉成一分鐘K棒：
+    API 回呼執行緒 -> 有上限的 asyncio.Queue (滿時回呼執行緒會等待，形成背壓)
+    -> BarBuilder -> BarRingBuffer -> 分批寫入 bar store，並推送給訂閱的策略。
+    """
+
+    def __init__(self, source, store_path=None, capacity=4096, queue_size=10000,
+                 flush_size=60, flush_interval=30.0, idle_timeout=1.0):
+        """
+        :param source: TickReplay 或 ShioajiTickSource
+        :param store_path: 寫入的 bar store 資料夾，None 代表不寫入
+        :param capacity: 環形緩衝區保存的K棒數量
+        :param queue_size: 逐筆成交佇列的上限
+        :param flush_size: 累積多少根K棒寫入一次
+        :param flush_interval: 最長多少秒寫入一次 (有未寫入的K棒時)
+        :param idle_timeout: 沒有成交時每隔多少秒檢查K棒是否已結束
+        """
+        if flush_size > capacity:
+            raise ValueError("flush_size 不能大於 capacity")
+        self.source = source
+        self.store_path = store_path
+        self.buffer = BarRingBuffer(capacity)
+        self.builder = BarBuilder()
+        self.queue_size = queue_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.idle_timeout = idle_timeout
+        self.subscribers = []
+        self.ticks = 0
+        self.queue = None
+        self.slots = threading.Semaphore(queue_size)  # 佇列剩餘空間，回呼執行緒在佇列滿時等待
+        self.loop = None
+        self.closed = False
+        self.last_tick = None  # (最後一筆成交時間, 收到時的 time.monotonic())
+
+    def subscribe(self, maxsize=1000):
+        """
+        返回一個會收到每根完成K棒 (tuple: ts, open, high, low, close, volume) 的 asyncio.Queue。
+        串流結束時收到 None。消費者來不及處理時丟棄最舊的K棒，不影響接收成交。
+        """
+        queue = asyncio.Queue(maxsize)
+        self.subscribers.append(queue)
+        return queue
+
+    def _on_tick(self, ts_ns, price=None, volume=None):
+        """
+        在 API 的回呼執行緒中執行：放入佇列，佇列已滿時等待。
+        等待時定期檢查服務是否已結束，結束後等待中的回呼執行緒會直接返回而不會永遠卡住。
+        結束信號 (ts_ns 為 None) 不佔用佇列空間。
+        """
+        if ts_ns is not None:
+            while not self.slots.acquire(timeout=SLOT_POLL_SECONDS):
+                if self.closed:
+                    return
+            if self.closed:
+                self.slots.release()
+                return
+        item = None if ts_ns is None else (ts_ns, price, volume)
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+        except RuntimeError:
+            pass  # 事件迴圈已關閉
+
+    def _publish(self, bar):
+        self.buffer.append(bar)
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(bar)
+
+    async def _flush(self):
+        if self.buffer.unflushed == 0:
+            return
+        frame = self.buffer.take_unflushed()
+        if self.store_path is not None:
+            await self.loop.run_in_executor(None, bar_store.write_bars, frame, self.store_path)
+
+    async def run(self):
+        """執行到資料來源結束 (TickReplay) 或呼叫 stop 為止"""
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()  # 上限由 self.slots 控制
+        self.source.start(self._on_tick)
+        last_flush = time.monotonic()
+        drained = 0
+        try:
+            while True:
+                if not self.queue.empty():
+                    # 佇列中已有成交時直接取出，不必每筆都建立等待的計時器，但定期讓出事件迴圈
+                    drained += 1
+                    if drained % YIELD_EVERY == 0:
+                        await asyncio.sleep(0)
+                    item = self.queue.get_nowait()
+                else:
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), self.idle_timeout)
+                    except asyncio.TimeoutError:
+                        # 即時模式下沒有新成交時，以現在時間完成已結束的K棒
+                        item = False
+                if item is None:
+                    break
+                if item is not False:
+                    self.slots.release()
+                if item is False:
+                    if self.last_tick is None:
+                        continue
+                    # 以成交時間推算現在的時間，重播和即時行情都適用
+                    last_ts, arrived = self.last_tick
+                    bar = self.builder.close_until(last_ts + int((time.monotonic() - arrived) * 1e9))
+                else:
+                    self.ticks += 1
+                    self.last_tick = (item[0], time.monotonic())
+                    bar = self.builder.update(*item)  # 延遲的成交只計入 builder.late_ticks
+                if bar is not None:
+                    self._publish(bar)
+                if (self.buffer.unflushed >= self.flush_size
+                        or (self.buffer.unflushed and time.monotonic() - last_flush >= self.flush_interval)):
+                    await self._flush()
+                    last_flush = time.monotonic()
+        finally:
+            self.closed = True
+            self.source.stop()
+            # 歸還佇列中剩餘成交佔用的空間 (等待中的回呼執行緒看到 closed 後返回)
+            while not self.queue.empty():
+                if self.queue.get_nowait() is not None:
+                    self.slots.release()
+            bar = self.builder.close_until(np.iinfo(np.int64).max)
+            if bar is not None:
+                self._publish(bar)
+            await self._flush()
+            for queue in self.subscribers:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+            if self.builder.late_ticks:
+                print(f"共丟棄 {self.builder.late_ticks} 筆延遲的成交 (所屬的K棒已經完成)")
+
+    def stop(self):
+        """從其他執行緒或協程結束服務"""
+        self.closed = True
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+
+async def print_bars(queue):
+    """範例消費者：列印每根完成的K棒"""
+    while True:
+        bar = await queue.get()
+        if bar is None:
+            break
+        ts, open_, high, low, close, volume = bar
+        print(f"{pd.Timestamp(ts)}  開 {open_:.0f}  高 {high:.0f}  低 {low:.0f}  收 {close:.0f}  量 {volume}")
+
+
+async def run_service(service):
+    consumer = asyncio.create_task(print_bars(service.subscribe()))
+    await service.run()
+    await consumer
+
+
+def main():
+    from get_raw_data_from_shioaji import load_config, login_to_shioaji, logout
+    credentials = load_config('shioaji_api_config.ini', 'key')
+    api = login_to_shioaji(credentials['api_key'], credentials['secret_key'])
+    contract = api.Contracts.Futures.TXF.TXFR1
+    service = LiveBarService(ShioajiTickSource(api, contract), bar_store.dataset_path("bars", "TXFR1", "1min"))
+    try:
+        asyncio.run(run_service(service))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logout(api)
+
+
+if __name__ == "__main__":
+    main()
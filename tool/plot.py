@@ -1,91 +1,256 @@
 #!/usr/bin/env python3
 
 import plotly.graph_objects as go
+import numpy as np
 import pandas as pd
+from profiling import profiled
+from bar_series import BarSeries, read_bar_series
+from session_calendar import NS_PER_DAY, SESSION_START, load_calendar
 
-# 從 CSV 文件讀取數據
-csv_file = 'daily_report.csv'  # 替換為你的 CSV 檔案名稱
-data = pd.read_csv(csv_file)
-
-# 確保 'ts' 列是日期時間格式
-data['ts'] = pd.to_datetime(data['ts'])
-
-# 計算移動平均線 (例如 5 日、20 日移動平均線)
-data['MA_5'] = data['close'].rolling(window=5).mean()   # 5 日移動平均
-data['MA_20'] = data['close'].rolling(window=20).mean()  # 20 日移動平均
-
-# 將日期設為字符串，用於忽略日期跳躍的問題
-data['ts_str'] = data['ts'].dt.strftime('%Y-%m-%d %H:%M:%S')
-
-# 繪製 K 線圖 (Candle chart)
-fig = go.Figure(data=[go.Candlestick(
-    x=data['ts_str'],
-    open=data['open'],
-    high=data['high'],
-    low=data['low'],
-    close=data['close'],
-    name="K Line",
-    increasing_line_color='limegreen',  # 陽線顏色
-    decreasing_line_color='red'         # 陰線顏色
-)])
-
-# 添加 5 日移動平均線
-fig.add_trace(go.Scatter(
-    x=data['ts_str'],
-    y=data['MA_5'],
-    mode='lines',
-    line=dict(color='yellow', width=2),
-    name='5 Day MA'
-))
-
-# 添加 20 日移動平均線
-fig.add_trace(go.Scatter(
-    x=data['ts_str'],
-    y=data['MA_20'],
-    mode='lines',
-    line=dict(color='cyan', width=2),
-    name='20 Day MA'
-))
-
-# 添加交易量
-fig.add_trace(go.Bar(
-    x=data['ts_str'],
-    y=data['volume'],
-    marker_color='dodgerblue',
-    name='Volume',
-    yaxis='y2'
-))
-
-# 設定圖表布局，包含滑鼠十字準線 (crosshair)
-fig.update_layout(
-    title='Stock Price with Moving Averages',
-    xaxis_title='Date',
-    yaxis_title='Price',
-    yaxis2=dict(
-        title='Volume',
-        overlaying='y',
-        side='right',
-        showgrid=False
-    ),
-    xaxis_rangeslider_visible=False,
-    width=900,
-    height=600,
-    hovermode='x unified',  # 啟用十字準線
-    legend=dict(x=0, y=1),
+@profiled('plot.load_data')
+def load_data(csv_file):
+    """從 CSV 文件或 bar store 資料夾讀取數據，返回 BarSeries (見 bar_series)"""
+    return read_bar_series(csv_file)
+
+def to_frame(data):
+    """BarSeries 轉換為 DataFrame，並將時間欄位命名為 'ts'"""
+    if isinstance(data, BarSeries):
+        data = data.to_frame().rename(columns={data.time_column: 'ts'})
+    return data
+
+def apply_layout(fig):
+    """設定圖表布局，包含滑鼠十字準線 (crosshair) 和深色模式"""
+    fig.update_layout(
+        title='Stock Price with Moving Averages',
+        xaxis_title='Date',
+        yaxis_title='Price',
+        yaxis2=dict(
+            title='Volume',
+            overlaying='y',
+            side='right',
+            showgrid=False
+        ),
+        xaxis_rangeslider_visible=False,
+        width=900,
+        height=600,
+        hovermode='x unified',  # 啟用十字準線
+        legend=dict(x=0, y=1),
     
-    # 深色模式設置
-    plot_bgcolor='#1e1e1e',  # 深色背景
-    paper_bgcolor='#1e1e1e',  # 深色背景
-    font_color='white',  # 字體顏色
-    xaxis=dict(
-        showgrid=False,
-        color='white'  # x 軸標籤顏色
-    ),
-    yaxis=dict(
-        showgrid=False,
-        color='white'  # y 軸標籤顏色
+        # 深色模式設置
+        plot_bgcolor='#1e1e1e',  # 深色背景
+        paper_bgcolor='#1e1e1e',  # 深色背景
+        font_color='white',  # 字體顏色
+        xaxis=dict(
+            showgrid=False,
+            color='white'  # x 軸標籤顏色
+        ),
+        yaxis=dict(
+            showgrid=False,
+            color='white'  # y 軸標籤顏色
+        )
     )
-)
 
-# 顯示圖表
-fig.show(renderer='browser')
\ No newline at end of file
+@profiled('plot.build_figure')
+def build_figure(data):
+    """計算移動平均線並繪製包含成交量的 K 線圖"""
+    data = to_frame(data)
+
+    # 計算移動平均線 (例如 5 日、20 日移動平均線)
+    data['MA_5'] = data['close'].rolling(window=5).mean()   # 5 日移動平均
+    data['MA_20'] = data['close'].rolling(window=20).mean()  # 20 日移動平均
+
+    # 將日期設為字符串，用於忽略日期跳躍的問題
+    data['ts_str'] = data['ts'].dt.strftime('%Y-%m-%d %H:%M:%S')
+
+    # 繪製 K 線圖 (Candle chart)
+    fig = go.Figure(data=[go.Candlestick(
+        x=data['ts_str'],
+        open=data['open'],
+        high=data['high'],
+        low=data['low'],
+        close=data['close'],
+        name="K Line",
+        increasing_line_color='limegreen',  # 陽線顏色
+        decreasing_line_color='red'         # 陰線顏色
+    )])
+
+    # 添加 5 日移動平均線
+    fig.add_trace(go.Scatter(
+        x=data['ts_str'],
+        y=data['MA_5'],
+        mode='lines',
+        line=dict(color='yellow', width=2),
+        name='5 Day MA'
+    ))
+
+    # 添加 20 日移動平均線
+    fig.add_trace(go.Scatter(
+        x=data['ts_str'],
+        y=data['MA_20'],
+        mode='lines',
+        line=dict(color='cyan', width=2),
+        name='20 Day MA'
+    ))
+
+    # 添加交易量
+    fig.add_trace(go.Bar(
+        x=data['ts_str'],
+        y=data['volume'],
+        marker_color='dodgerblue',
+        name='Volume',
+        yaxis='y2'
+    ))
+
+    apply_layout(fig)
+    return fig
+
+def bucket_ohlcv(data, start, stop, max_buckets):
+    """
+    將 [start, stop) 區間的K棒依位置平均分成最多 max_buckets 組，每組合併成一根K棒。
+    :return: 包含位置 x、OHLCV 和每組第一根K棒時間的 dict
+    """
+    start, stop = max(int(start), 0), min(int(stop), len(data))
+    size = max(1, -(-(stop - start) // max_buckets))
+    starts = np.arange(start, stop, size)
+    ends = np.append(starts[1:], stop)
+    high = data['high'].to_numpy()[start:stop]
+    low = data['low'].to_numpy()[start:stop]
+    volume = data['volume'].to_numpy()[start:stop]
+    return {
+        'x': starts,
+        'ts': data['ts'].to_numpy()[starts],
+        'open': data['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(high, starts - start),
+        'low': np.minimum.reduceat(low, starts - start),
+        'close': data['close'].to_numpy()[ends - 1],
+        'volume': np.add.reduceat(volume, starts - start),
+    }
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets 降採樣，保留折線的形狀 (忽略 NaN)。
+    :return: 保留的點在輸入陣列中的索引
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= n_out or n_out < 3:
+        return valid
+    x, y = x[valid].astype(np.float64), y[valid]
+    edges = np.linspace(1, len(x) - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, len(x) - 1
+    a = 0
+    for k in range(n_out - 2):
+        lo, hi = edges[k], edges[k + 1]
+        # 下一組的平均點 (最後一組使用最後一個點)
+        next_lo, next_hi = hi, edges[k + 2] if k + 2 < len(edges) else len(x)
+        avg_x = x[next_lo:next_hi].mean() if next_hi > next_lo else x[-1]
+        avg_y = y[next_lo:next_hi].mean() if next_hi > next_lo else y[-1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[k + 1] = a
+    return valid[selected]
+
+def downsampled_traces(data, start, stop, max_buckets):
+    """產生 [start, stop) 區間依畫面解析度合併後的K棒、均線和成交量數據"""
+    buckets = bucket_ohlcv(data, start, stop, max_buckets)
+    hover = pd.DatetimeIndex(buckets['ts']).strftime('%Y-%m-%d %H:%M:%S')
+    lines = {}
+    positions = np.arange(max(int(start), 0), min(int(stop), len(data)))
+    for name in ('MA_5', 'MA_20'):
+        values = data[name].to_numpy()[positions]
+        keep = lttb(positions, values, max_buckets)
+        lines[name] = (positions[keep], values[keep])
+    return buckets, hover, lines
+
+def time_ticks(data, start, stop, n_ticks=8, calendar=None):
+    """
+    在位置座標上產生對應時間的刻度 (x 軸使用K棒位置，以忽略日期跳躍)。
+    指定 calendar (同一份數據的交易時段索引) 時，刻度放在區間內各交易時段的第一根K棒。
+    """
+    start, stop = max(int(start), 0), min(int(stop), len(data))
+    ticks = np.unique(np.linspace(start, max(stop - 1, start), n_ticks).astype(np.int64))
+    if calendar is not None:
+        opens = start + np.flatnonzero(calendar.flags[start:stop] & SESSION_START)
+        if len(opens) >= 2:
+            ticks = opens[np.unique(np.linspace(0, len(opens) - 1, n_ticks).astype(np.int64))]
+    labels = pd.DatetimeIndex(data['ts'].to_numpy()[ticks]).strftime('%Y-%m-%d %H:%M')
+    return ticks, list(labels)
+
+def is_intraday(data):
+    """K棒時間不全在零時 (日K) 時返回 True，只有日內K棒需要交易時段索引"""
+    ts = np.asarray(data['ts'], dtype='datetime64[ns]').view(np.int64)
+    return bool((ts % NS_PER_DAY != 0).any())
+
+@profiled('plot.build_figure_downsampled')
+def build_figure_downsampled(data, max_buckets=1800, calendar=None):
+    """
+    適用於大量K棒的繪圖模式：K棒依畫面解析度合併，均線以 LTTB 降採樣，
+    均線和成交量使用 WebGL (Scattergl)。x 軸使用K棒位置，與原本的字串 x 軸一樣沒有日期跳躍。
+    :param calendar: 同一份數據的交易時段索引，指定時 x 軸刻度對齊交易時段的開始 (見 time_ticks)
+    """
+    data = to_frame(data)
+    data['MA_5'] = data['close'].rolling(window=5).mean()   # 5 根移動平均
+    data['MA_20'] = data['close'].rolling(window=20).mean()  # 20 根移動平均
+    buckets, hover, lines = downsampled_traces(data, 0, len(data), max_buckets)
+
+    fig = go.Figure(data=[go.Candlestick(
+        x=buckets['x'],
+        open=buckets['open'],
+        high=buckets['high'],
+        low=buckets['low'],
+        close=buckets['close'],
+        hovertext=hover,
+        name="K Line",
+        increasing_line_color='limegreen',  # 陽線顏色
+        decreasing_line_color='red'         # 陰線顏色
+    )])
+    fig.add_trace(go.Scattergl(x=lines['MA_5'][0], y=lines['MA_5'][1], mode='lines',
+                               line=dict(color='yellow', width=2), name='5 Bar MA'))
+    fig.add_trace(go.Scattergl(x=lines['MA_20'][0], y=lines['MA_20'][1], mode='lines',
+                               line=dict(color='cyan', width=2), name='20 Bar MA'))
+    fig.add_trace(go.Scattergl(x=buckets['x'], y=buckets['volume'], mode='lines',
+                               line=dict(color='dodgerblue', width=1, shape='hv'), fill='tozeroy',
+                               name='Volume', yaxis='y2'))
+    apply_layout(fig)
+    ticks, labels = time_ticks(data, 0, len(data), calendar=calendar)
+    fig.update_xaxes(tickmode='array', tickvals=ticks, ticktext=labels)
+    return fig
+
+def enable_zoom_reload(fig_widget, data, max_buckets=1800, calendar=None):
+    """
+    在 FigureWidget (Jupyter) 中縮放時，只重新計算可見區間的K棒，取得更細的數據。
+    :param fig_widget: go.FigureWidget(build_figure_downsampled(data))
+    :param calendar: 同一份數據的交易時段索引 (見 time_ticks)
+    """
+    def on_zoom(layout, x_range):
+        if x_range is None:
+            start, stop = 0, len(data)
+        else:
+            start, stop = int(np.floor(x_range[0])), int(np.ceil(x_range[1])) + 1
+        buckets, hover, lines = downsampled_traces(data, start, stop, max_buckets)
+        ticks, labels = time_ticks(data, start, stop, calendar=calendar)
+        with fig_widget.batch_update():
+            candle, ma_5, ma_20, volume = fig_widget.data
+            candle.update(x=buckets['x'], open=buckets['open'], high=buckets['high'],
+                          low=buckets['low'], close=buckets['close'], hovertext=hover)
+            ma_5.update(x=lines['MA_5'][0], y=lines['MA_5'][1])
+            ma_20.update(x=lines['MA_20'][0], y=lines['MA_20'][1])
+            volume.update(x=buckets['x'], y=buckets['volume'])
+            fig_widget.layout.xaxis.update(tickvals=ticks, ticktext=labels)
+
+    fig_widget.layout.on_change(on_zoom, 'xaxis.range')
+    return fig_widget
+
+if __name__ == "__main__":
+    csv_file = 'daily_report.csv'  # 替換為你的 CSV 檔案名稱 (或 bar store 資料夾，例如 bars/TXFR2/daily)
+    max_bars = 5000  # 超過此K棒數量時改用降採樣的繪圖模式
+    data = load_data(csv_file)
+    if len(data) <= max_bars:
+        fig = build_figure(data)
+    else:
+        # 日K不需要交易時段索引，也不在數據旁邊建立 .calendar.npz
+        calendar = load_calendar(csv_file, data['ts']) if is_intraday(data) else None
+        fig = build_figure_downsampled(data, calendar=calendar)
+
+    # 顯示圖表
+    fig.show(renderer='browser')
\ No newline at end of file
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+import atexit
+import cProfile
+import functools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource  # 只有 Unix 提供，Windows 上不記錄 process_max_rss_kb
+except ImportError:
+    resource = None
+
+# 設定環境變數即可在不修改程式的情況下啟用：
+#   TRADE_PROFILE=profile.json              記錄各階段並在結束時寫入 JSON 報告
+#   TRADE_PROFILE_CPROFILE=profile.prof     同時以 cProfile 記錄 (可用 snakeviz 或 flameprof 產生火焰圖)
+#   TRADE_PROFILE_MEMORY=1                  以 tracemalloc 記錄各階段的記憶體峰值 (會拖慢執行)
+#
+# 記憶體數值的意義：
+#   process_max_rss_kb  整個行程從啟動到階段結束的最高常駐記憶體 (ru_maxrss)，不是該階段本身的用量
+#   peak_bytes          階段期間 tracemalloc 記錄的峰值減去開始時的用量；tracemalloc 是整個行程共用的，
+#                       memory_scope 為 'stage' 時只有這個階段所在的執行緒有記錄中的階段，
+#                       為 'process' 時其他執行緒 (例如下載的執行緒池) 同時在執行，峰值包含它們的記憶體
+_state = {
+    'enabled': False,
+    'report_file': None,
+    'cprofile_file': None,
+    'profiler': None,
+    'trace_memory': False,
+    'records': [],
+    'started_at': None,
+}
+_local = threading.local()
+_memory_lock = threading.Lock()
+_open_stages = []  # 所有執行緒中記錄記憶體且尚未結束的階段
+
+
+def process_max_rss_kb():
+    """整個行程到目前為止的最高常駐記憶體 (KB)，不支援的平台返回 None"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss // 1024 if sys.platform == 'darwin' else max_rss  # macOS 的單位為 bytes
+
+
+def enable(report_file='profile.json', cprofile_file=None, trace_memory=False):
+    """
+    啟用各階段的記錄，程式結束時自動寫入報告。
+    :param report_file: JSON 報告的檔案名稱
+    :param cprofile_file: cProfile 輸出檔案 (.prof)，None 代表不使用 cProfile
+    :param trace_memory: 是否以 tracemalloc 記錄各階段的記憶體峰值
+    """
+    if _state['enabled']:
+        return
+    _state.update(enabled=True, report_file=report_file, cprofile_file=cprofile_file,
+                  trace_memory=trace_memory, records=[], started_at=datetime.now().isoformat(timespec='seconds'))
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if cprofile_file:
+        _state['profiler'] = cProfile.Profile()
+        _state['profiler'].enable()
+    atexit.register(write_report)
+
+
+def is_enabled():
+    return _state['enabled']
+
+
+def count_rows(result):
+    """從返回值估計處理的資料筆數 (DataFrame、陣列、tuple 或 dict 的第一個元素)，無法判斷時返回 None"""
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if isinstance(result, dict) and result:
+        result = next(iter(result.values()))
+    if isinstance(result, (str, bytes, dict)):
+        return None
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+class _Stage:
+    """記錄一個階段的 context manager，可以巢狀使用"""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].name if stack else None
+        self.peak_seen = 0
+        if _state['trace_memory']:
+            with _memory_lock:
+                thread = threading.get_ident()
+                self.thread = thread
+                others = [other for other in _open_stages if other.thread != thread]
+                self.shared = bool(others)
+                for other in others:
+                    other.shared = True
+                current, peak = tracemalloc.get_traced_memory()
+                if stack:
+                    stack[-1].peak_seen = max(stack[-1].peak_seen, peak)
+                # reset_peak 會影響所有執行緒，只在沒有其他執行緒的階段進行中時重設
+                if not self.shared:
+                    tracemalloc.reset_peak()
+                self.memory_start = current
+                _open_stages.append(self)
+        stack.append(self)
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        stack = _local.stack
+        stack.pop()
+        record = {
+            'stage': self.name,
+            'parent': self.parent,
+            'thread': threading.current_thread().name,
+            'wall_seconds': wall,
+            'cpu_seconds': cpu,
+            'rows': self.rows,
+            'process_max_rss_kb': process_max_rss_kb(),
+            'error': None if exc_type is None else exc_type.__name__,
+        }
+        if _state['trace_memory']:
+            with _memory_lock:
+                _open_stages.remove(self)
+                _, peak = tracemalloc.get_traced_memory()
+                peak = max(self.peak_seen, peak)
+                record['peak_bytes'] = peak - self.memory_start
+                record['memory_scope'] = 'process' if self.shared else 'stage'
+                if stack:
+                    stack[-1].peak_seen = max(stack[-1].peak_seen, peak)
+        _state['records'].append(record)
+        return False
+
+
+class _NullStage:
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_null_stage = _NullStage()
+
+
+def stage(name):
+    """
+    記錄一段程式的 context manager，未啟用時不做任何事。
+    可在區塊內設定 .rows 記錄處理的資料筆數：
+        with profiling.stage('load') as s:
+            df = ...
+            s.rows = len(df)
+    """
+    return _Stage(name) if _state['enabled'] else _null_stage
+
+
+def profiled(name=None):
+    """
+    記錄函數執行的裝飾器，資料筆數取自返回值 (見 count_rows)。
+    未啟用時只多一次判斷，幾乎沒有額外開銷。
+    """
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state['enabled']:
+                return func(*args, **kwargs)
+            with _Stage(stage_name) as s:
+                result = func(*args, **kwargs)
+                s.rows = count_rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def summarize(records):
+    """依階段名稱合計呼叫次數、時間、筆數和記憶體峰值 (任一次為 'process' 時 memory_scope 為 'process')"""
+    summary = {}
+    for record in records:
+        item = summary.setdefault(record['stage'], {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rows': 0})
+        item['calls'] += 1
+        item['wall_seconds'] += record['wall_seconds']
+        item['cpu_seconds'] += record['cpu_seconds']
+        item['rows'] += record['rows'] or 0
+        if 'peak_bytes' in record:
+            item['peak_bytes'] = max(item.get('peak_bytes', 0), record['peak_bytes'])
+            if record['memory_scope'] == 'process' or 'memory_scope' not in item:
+                item['memory_scope'] = record['memory_scope']
+    return summary
+
+
+def write_report(report_file=None):
+    """寫入 JSON 報告 (以及 cProfile 輸出)，返回報告內容"""
+    if not _state['enabled']:
+        return None
+    report_file = report_file or _state['report_file']
+    profiler = _state['profiler']
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(_state['cprofile_file'])
+    records = list(_state['records'])
+    report = {
+        'started_at': _state['started_at'],
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pid': os.getpid(),
+        'cprofile_file': _state['cprofile_file'],
+        'summary': summarize(records),
+        'records': records,
+    }
+    if report_file:
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    if profiler is not None:
+        profiler.enable()
+    return report
+
+
+if os.environ.get('TRADE_PROFILE'):
+    enable(os.environ['TRADE_PROFILE'], os.environ.get('TRADE_PROFILE_CPROFILE'),
+           os.environ.get('TRADE_PROFILE_MEMORY') == '1')
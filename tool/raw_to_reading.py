@@ -1,110 +1,202 @@
 #!/usr/bin/env python3
 
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
+import hashlib
+import io
+import json
 import os
+import sys
+import bar_store
+from profiling import profiled
+from session_calendar import label_sessions, load_calendar, parse_close_time
 
+@profiled('raw_to_reading.read_csv')
 def read_csv(file_path):
     """讀取CSV檔案並返回DataFrame"""
     df = pd.read_csv(file_path)
     return df
 
-def aggregate_data(df, close_time_str):
-    """根據設定的收盤時間聚合數據"""
-    close_time = datetime.strptime(close_time_str, "%H:%M").time()
-    
+@profiled('raw_to_reading.read_bars')
+def read_bars(path, start=None, end=None):
+    """讀取原始數據，路徑為 bar store 資料夾時直接讀取已解析的欄位，否則讀取CSV"""
+    if bar_store.is_bar_store(path):
+        return bar_store.read_bars(path, start, end)
+    return read_csv(path)
+
+def first_by_day(values, day_idx, mask):
+    """返回每個日期中符合條件的第一筆數值 (依原始順序)，索引為日期索引"""
+    first = pd.Series(values[mask]).groupby(day_idx[mask], sort=False).head(1)
+    return pd.Series(first.to_numpy(), index=day_idx[mask][first.index])
+
+@profiled('raw_to_reading.aggregate_data')
+def aggregate_data(df, close_time_str, calendar=None):
+    """
+    根據設定的收盤時間聚合數據
+    :param calendar: 同一份數據的交易時段索引 (見 session_calendar.load_calendar)，None 代表重新標記交易日
+    """
+    close_offset = parse_close_time(close_time_str)
+
     # 確保 'ts' 列是 datetime 格式
     df['ts'] = pd.to_datetime(df['ts'])
-    
-    # 分割日期和時間
-    df['date'] = df['ts'].dt.date
-    df['time'] = df['ts'].dt.time
-    
-    # 初始化結果 DataFrame
-    result = []
-
-    # 獲取所有日期
-    all_dates = sorted(df['date'].unique())
-    
-    for i in range(1, len(all_dates)):
-        current_date = all_dates[i]
-        previous_date = all_dates[i - 1]
-
-        # 查找前一天的收盤時間之後的所有數據
-        prev_day_end_time = datetime.combine(previous_date, close_time)
-        current_day_start_time = prev_day_end_time + timedelta(seconds=1)
-
-        # 計算當前交易日的時間區間
-        current_day_end_time = datetime.combine(current_date, close_time)
-
-        # 篩選數據
-        relevant_data = df[
-            ((df['ts'] >= current_day_start_time) & (df['ts'] <= current_day_end_time))
-        ]
-
-        if relevant_data.empty:
-            # 如果篩選的數據為空，則跳過此日期
-            continue
-
-        # 獲取當前交易日的開盤數據
-        next_open_data = df[(df['date'] == previous_date) & (df['time'] > close_time)]
-        if not next_open_data.empty:
-            next_open = next_open_data.iloc[0]['open']
-        else:
-            # 如果前一天沒有數據，嘗試向前尋找
-            for j in range(i - 1, -1, -1):
-                fallback_date = all_dates[j]
-                fallback_data = df[df['date'] == fallback_date]
-                next_open_data = fallback_data[fallback_data['time'] > close_time]
-                if not next_open_data.empty:
-                    next_open = next_open_data.iloc[0]['open']
-                    break
-            else:
-                # 如果都找不到數據，則跳過此日期
-                continue
-
-        # 計算當前交易日的 High, Low, Volume
-        day_high = relevant_data['high'].max()
-        day_low = relevant_data['low'].min()
-        day_volume = relevant_data['volume'].sum()
-
-        # 查找當天收盤時間的數據
-        close_time_data = df[(df['date'] == current_date) & (df['time'] == close_time)]
-
-        if not close_time_data.empty:
-            current_day_close = close_time_data.iloc[0]['close']
-        else:
-            # 如果當天在指定時間點沒有數據，跳過此日期
-            continue
-
-        # 記錄結果
-        result.append({
-            'date': current_date,
-            'open': next_open,
-            'high': day_high,
-            'low': day_low,
-            'close': current_day_close,
-            'volume': day_volume
-        })
-
-    df_resampled = pd.DataFrame(result)
-    df_resampled['date'] = pd.to_datetime(df_resampled['date'])
-    df_resampled.set_index('date', inplace=True)
-    
-    # 將 'date' 列移動到最前面
-    df_resampled.reset_index(inplace=True)
-    df_resampled = df_resampled[['date', 'open', 'high', 'low', 'close', 'volume']]
-    
+    ts_ns = df['ts'].to_numpy(dtype='datetime64[ns]').view('i8')
+
+    if calendar is None:
+        all_days, day_idx, session = label_sessions(ts_ns, close_offset)
+    else:
+        all_days, day_idx, session = calendar.trading_days(close_time_str)
+    time_ns = ts_ns - all_days[day_idx]
+    n_days = len(all_days)
+
+    # 每個日期收盤時間之後的第一筆開盤價，作為下一個交易日的開盤價
+    next_open = first_by_day(df['open'].to_numpy(), day_idx, time_ns > close_offset)
+    # 前一天沒有數據時，向前尋找最近一個有收盤後數據的日期
+    open_src = np.full(n_days, -1)
+    open_src[next_open.index] = next_open.index
+    open_src = np.concatenate(([-1], np.maximum.accumulate(open_src)[:-1]))
+
+    # 當天收盤時間點的收盤價
+    day_close = first_by_day(df['close'].to_numpy(), day_idx, time_ns == close_offset)
+
+    # 一次 groupby 計算每個交易日的 High, Low, Volume
+    in_session = session >= 0
+    grouped = df.loc[in_session, ['high', 'low', 'volume']].groupby(session[in_session], sort=True)
+    stats = grouped.agg({'high': 'max', 'low': 'min', 'volume': 'sum'})
+
+    # 套用跳過規則：沒有區間數據、找不到開盤價、或收盤時間點沒有數據
+    keep = stats.index[(open_src[stats.index] >= 0) & stats.index.isin(day_close.index)]
+    stats = stats.loc[keep]
+
+    # 與逐日計算的版本相同，日期由 datetime.date 轉換，保留 pd.to_datetime 對日期物件的解析度
+    dates = all_days[keep].astype('datetime64[ns]').astype('datetime64[D]').astype(object)
+    df_resampled = pd.DataFrame({
+        'date': pd.to_datetime(pd.Series(dates, dtype=object)),
+        'open': next_open.loc[open_src[keep]].to_numpy(),
+        'high': stats['high'].to_numpy(),
+        'low': stats['low'].to_numpy(),
+        'close': day_close.reindex(keep).to_numpy(),
+        'volume': stats['volume'].to_numpy(),
+    })
     return df_resampled
 
+def read_new_rows(file_path, offset, columns):
+    """
+    從上次讀取的位置開始讀取原始CSV新增的資料列，只讀到最後一個完整的換行為止。
+    :param file_path: 原始數據CSV檔案
+    :param offset: 上次讀取結束的位元組位置 (0 代表從頭讀取，包含標題列)
+    :param columns: 欄位名稱 (offset 不為 0 時使用)
+    :return: (新增資料的DataFrame, 新的位元組位置)
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    if end == 0:
+        return pd.DataFrame(columns=columns), offset
+    buffer = io.BytesIO(data[:end])
+    if offset == 0:
+        df = pd.read_csv(buffer)
+    else:
+        df = pd.read_csv(buffer, header=None, names=columns)
+    return df, offset + end
+
+def split_pending(df, close_time_str):
+    """
+    將數據分成已完成的交易日和需要保留到下次計算的資料列。
+    交易日在數據中已出現其收盤時間 (含) 之後的資料時即視為完成。
+    :return: (最後一個已完成的日期 (沒有則為 None), 需保留的資料列)
+    """
+    close_offset = parse_close_time(close_time_str)
+    ts_ns = pd.to_datetime(df['ts']).to_numpy(dtype='datetime64[ns]').view('i8')
+    all_days, day_idx, _ = label_sessions(ts_ns, close_offset)
+    final = np.flatnonzero(all_days + close_offset <= ts_ns.max())
+    if len(final) == 0:
+        return None, df
+    last_final = final[-1]
+
+    # 保留最後完成日期之後的資料，以及其前一晚開盤價的來源列
+    keep = day_idx >= last_final
+    after_close = (ts_ns - all_days[day_idx]) > close_offset
+    if not after_close[day_idx == last_final].any():
+        anchor = np.flatnonzero(after_close & (day_idx < last_final))
+        if len(anchor) > 0:
+            anchor_day = day_idx[anchor].max()
+            keep[anchor[day_idx[anchor] == anchor_day][0]] = True
+    return pd.Timestamp(all_days[last_final]), df[keep]
+
+def prefix_fingerprint(file_path, offset, chunk_size=4096):
+    """
+    計算原始CSV已讀取部分 (前 offset 個位元組) 的指紋，用來確認檔案在上次讀取後沒有被改寫。
+    只讀取開頭和結尾各 chunk_size 個位元組，中間被改寫但長度不變時無法察覺。
+    :return: 十六進位的 sha256 字串
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(min(chunk_size, offset)))
+        f.seek(max(0, offset - chunk_size))
+        digest.update(f.read(offset - max(0, offset - chunk_size)))
+    return digest.hexdigest()
+
+@profiled('raw_to_reading.aggregate_incremental')
+def aggregate_incremental(input_file, output_file, close_time_str, state_file):
+    """
+    增量聚合：只處理原始CSV新增的資料列，並把新完成的交易日附加到輸出檔案。
+    檢查點檔案記錄已讀取的位置、已讀取部分的指紋、最後完成的日期和尚未完成的交易日資料。
+    沒有檢查點、原始檔案被截短或已讀取的部分被改寫時，從頭重建輸出檔案。
+    """
+    state = None
+    if os.path.exists(state_file) and os.path.exists(output_file):
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+        if (state['offset'] > os.path.getsize(input_file)
+                or state.get('fingerprint') != prefix_fingerprint(input_file, state['offset'])):
+            state = None
+
+    if state is None:
+        state = {'offset': 0, 'columns': None, 'last_final_date': None, 'pending': []}
+        if os.path.exists(output_file):
+            os.remove(output_file)
+
+    new_rows, offset = read_new_rows(input_file, state['offset'], state['columns'])
+    columns = list(new_rows.columns)
+    pending = pd.DataFrame(state['pending'], columns=columns)
+    df = pd.concat([pending, new_rows], ignore_index=True) if len(pending) else new_rows
+
+    appended = 0
+    if len(df) > 0:
+        last_final, rest = split_pending(df, close_time_str)
+        if last_final is not None:
+            aggregated = aggregate_data(df.copy(), close_time_str)
+            done = aggregated['date'] <= last_final
+            if state['last_final_date'] is not None:
+                done &= aggregated['date'] > pd.Timestamp(state['last_final_date'])
+            aggregated = aggregated[done]
+            aggregated.to_csv(output_file, mode='a', index=False, header=not os.path.exists(output_file))
+            appended = len(aggregated)
+            state['last_final_date'] = last_final.strftime('%Y-%m-%d')
+        rest = rest.copy()
+        rest['ts'] = pd.to_datetime(rest['ts']).astype(str)
+        state['pending'] = rest.astype(object).values.tolist()
+
+    state['offset'] = offset
+    state['fingerprint'] = prefix_fingerprint(input_file, offset)
+    state['columns'] = columns
+    with open(state_file, 'w') as f:
+        json.dump(state, f)
+    print(f"新增 {appended} 個交易日至 {output_file}")
+    return appended
+
+@profiled('raw_to_reading.save_to_csv')
 def save_to_csv(df, output_file):
     """將聚合後的數據保存為CSV文件"""
     df.to_csv(output_file, index=False)
     print(f"總結已儲存至 {output_file}")
 
-def main():
+def main(incremental=False):
     # 設定檔案路徑
     input_file = 'TXFR2_yearly_report.csv'  # 輸入的原始數據 CSV 檔案
+    store_path = bar_store.dataset_path('bars', 'TXFR2', '1min')  # 原始數據的 bar store (存在時優先使用)
     
     # 創建輸出資料夾
     output_dir = 'output'
@@ -113,15 +205,26 @@ def main():
 
     # 自定義收盤時間
     close_time = "13:45"  # 設定的收盤時間
+
+    if incremental:
+        # 只處理新增的原始數據，並附加到既有的輸出檔案
+        state_file = os.path.join(output_dir, 'daily_report.state.json')
+        aggregate_incremental(input_file, os.path.join(output_dir, 'daily_report.csv'), close_time, state_file)
+        return
     
-    # 讀取CSV檔案
-    df = read_csv(input_file)
+    # 讀取原始數據
+    source = store_path if bar_store.is_bar_store(store_path) else input_file
+    df = read_bars(source)
+
+    # 讀取 (或建立並儲存) 與原始數據一起保存的交易時段索引
+    calendar = load_calendar(source, df['ts'], close_time=close_time)
     
     # 聚合數據
-    aggregated_data = aggregate_data(df, close_time)
+    aggregated_data = aggregate_data(df, close_time, calendar)
     
     # 保存聚合後的數據
     save_to_csv(aggregated_data, os.path.join(output_dir, 'daily_report.csv'))
+    bar_store.write_bars(aggregated_data, bar_store.dataset_path('bars', 'TXFR2', 'daily'))
 
 if __name__ == "__main__":
-    main()
+    main(incremental='--incremental' in sys.argv)
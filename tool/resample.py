@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+import json
+import os
+import bar_store
+from profiling import profiled
+from raw_to_reading import aggregate_data
+from session_calendar import NS_PER_MINUTE, TXF_SESSIONS, load_calendar, session_bounds, source_signature
+
+
+def _reduce(df, labels, valid):
+    """依排序後的標籤合併相鄰的K棒，返回 OHLCV DataFrame"""
+    labels = labels[valid]
+    idx = np.flatnonzero(valid)
+    if len(idx) == 0:
+        return pd.DataFrame({'ts': pd.to_datetime(np.array([], dtype='datetime64[ns]')),
+                             'open': [], 'high': [], 'low': [], 'close': [], 'volume': []})
+    starts = np.flatnonzero(np.concatenate(([True], labels[1:] != labels[:-1])))
+    ends = np.append(starts[1:], len(labels))
+    columns = {name: df[name].to_numpy()[idx] for name in ('open', 'high', 'low', 'close', 'volume')}
+    return pd.DataFrame({
+        'ts': labels[starts].view('datetime64[ns]'),
+        'open': columns['open'][starts],
+        'high': np.maximum.reduceat(columns['high'], starts),
+        'low': np.minimum.reduceat(columns['low'], starts),
+        'close': columns['close'][ends - 1],
+        'volume': np.add.reduceat(columns['volume'], starts),
+    })
+
+
+@profiled('resample.resample_bars')
+def resample_bars(df, freqs, sessions=TXF_SESSIONS, close_time='13:45', calendar=None):
+    """
+    從一分鐘K棒同時產生多個週期的K棒，共用一次交易時段標記。
+    :param df: 依時間排序、包含 ts/open/high/low/close/volume 的 DataFrame
+    :param freqs: 週期列表，可包含 '5min' 等分鐘週期、交易時段名稱 (例如 'day'、'night')
+                  以及 'daily' (與 aggregate_data 相同的日K)
+    :param sessions: 交易時段定義，分鐘K棒不會跨越交易時段
+    :param close_time: 'daily' 使用的收盤時間
+    :param calendar: 同一份數據的交易時段索引 (見 session_calendar.load_calendar)，None 代表重新計算交易時段
+    :return: {週期: DataFrame}，分鐘和時段K棒的 'ts' 為該K棒的結束時間
+    """
+    ts_ns = pd.to_datetime(df['ts']).to_numpy(dtype='datetime64[ns]').view('i8')
+    if calendar is None:
+        session_id, start, end = session_bounds(ts_ns, sessions)
+    elif calendar.sessions != tuple(tuple(session) for session in sessions):
+        raise ValueError("交易時段索引的時段定義與 sessions 不同")
+    else:
+        session_id, start, end = calendar.bounds()
+    valid = session_id >= 0
+    names = [session[0] for session in sessions]
+
+    result = {}
+    for freq in freqs:
+        if freq == 'daily':
+            result[freq] = aggregate_data(df.copy(), close_time, calendar)
+        elif freq in names:
+            result[freq] = _reduce(df, end, valid & (session_id == names.index(freq)))
+        elif freq.endswith('min'):
+            step = int(freq[:-3]) * NS_PER_MINUTE
+            # 每根K棒歸入 (開始 + k*週期, 開始 + (k+1)*週期]，最後一根不超過時段結束時間
+            labels = np.minimum(start + ((ts_ns - start - 1) // step + 1) * step, end)
+            result[freq] = _reduce(df, labels, valid)
+        else:
+            raise ValueError(f"不支援的週期: {freq}")
+    return result
+
+
+@profiled('resample.build_timeframes')
+def build_timeframes(raw_path, root, contract, freqs, sessions=TXF_SESSIONS, close_time='13:45'):
+    """
+    從 bar store 中的一分鐘K棒產生多個週期，並分別快取到 {root}/{contract}/{週期}。
+    :return: {週期: DataFrame}
+    """
+    df = bar_store.read_bars(raw_path)
+    calendar = load_calendar(raw_path, df['ts'], sessions, close_time)
+    frames = resample_bars(df, freqs, sessions, close_time, calendar)
+    signature = source_signature(raw_path)
+    for freq, frame in frames.items():
+        path = bar_store.dataset_path(root, contract, freq)
+        bar_store.clear_bars(path)
+        bar_store.write_bars(frame, path)
+        with open(os.path.join(path, '_source.json'), 'w') as f:
+            json.dump(signature, f)
+    return frames
+
+
+def load_timeframe(raw_path, root, contract, freq, sessions=TXF_SESSIONS, close_time='13:45'):
+    """讀取已快取的週期K棒；原始數據有更新或尚未快取時才重新計算"""
+    path = bar_store.dataset_path(root, contract, freq)
+    source_file = os.path.join(path, '_source.json')
+    if os.path.exists(source_file):
+        with open(source_file, 'r') as f:
+            if json.load(f) == source_signature(raw_path):
+                return bar_store.read_bars(path)
+    return build_timeframes(raw_path, root, contract, [freq], sessions, close_time)[freq]
+
+
+def main():
+    raw_path = bar_store.dataset_path('bars', 'TXFR2', '1min')  # 原始一分鐘K棒的 bar store
+    freqs = ['5min', '15min', '60min', 'day', 'night', 'daily']
+    frames = build_timeframes(raw_path, 'bars', 'TXFR2', freqs)
+    for freq, frame in frames.items():
+        print(f"{freq}: {len(frame)} 根K棒已儲存至 {bar_store.dataset_path('bars', 'TXFR2', freq)}")
+
+
+if __name__ == "__main__":
+    main()
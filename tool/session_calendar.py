@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+import json
+import os
+import bar_store
+from profiling import profiled
+
+NS_PER_DAY = 86400 * 10**9
+NS_PER_SECOND = 10**9
+NS_PER_MINUTE = 60 * NS_PER_SECOND
+NAT = np.iinfo(np.int64).min
+
+# 台指期交易時段 (名稱, 開始, 結束)，K棒時間為該分鐘的結束時間，時段涵蓋 (開始, 結束]
+# 夜盤的結束時間早於開始時間，代表跨越午夜到隔天
+TXF_SESSIONS = (
+    ('day', '08:45', '13:45'),
+    ('night', '15:00', '05:00'),
+)
+
+# 每根K棒的缺口旗標 (可組合)
+SESSION_START = 1  # 該時段在數據中的第一根K棒 (與前一根K棒之間有休市)
+SESSION_END = 2  # 該時段在數據中的最後一根K棒
+MISSING_BARS = 4  # 同一時段內與前一根K棒 (或時段開始) 相隔超過一根K棒的時間
+
+
+def _minutes(time_str):
+    hour, minute = time_str.split(':')
+    return (int(hour) * 60 + int(minute)) * NS_PER_MINUTE
+
+
+def parse_close_time(close_time_str):
+    """將 "HH:MM" 格式的收盤時間轉換為當日的奈秒偏移量"""
+    close_time = datetime.strptime(close_time_str, "%H:%M").time()
+    return (close_time.hour * 3600 + close_time.minute * 60) * NS_PER_SECOND
+
+
+def label_sessions(ts_ns, close_offset):
+    """
+    一次性為每根K棒標記所屬交易日。
+    交易日 i 涵蓋 (前一日收盤時間 + 1 秒) 到 (當日收盤時間) 之間的數據。
+    :param ts_ns: int64 奈秒時間戳陣列
+    :param close_offset: 收盤時間的當日奈秒偏移量
+    :return: (所有日期的奈秒陣列, 每根K棒的日期索引, 每根K棒的交易日索引 (不屬於任何交易日為 -1))
+    """
+    day_ns = ts_ns - ts_ns % NS_PER_DAY
+    all_days, day_idx = np.unique(day_ns, return_inverse=True)
+    close_ns = all_days + close_offset
+
+    # 找出第一個收盤時間 >= ts 的日期
+    session = np.searchsorted(close_ns, ts_ns, side='left')
+    prev_close = close_ns[np.clip(session - 1, 0, None)]
+    valid = (session >= 1) & (session < len(all_days)) & (ts_ns >= prev_close + NS_PER_SECOND)
+    session = np.where(valid, session, -1)
+    return all_days, day_idx, session
+
+
+def session_bounds(ts_ns, sessions=TXF_SESSIONS):
+    """
+    為每根K棒找出所屬交易時段的開始和結束時間。
+    :param ts_ns: int64 奈秒時間戳陣列
+    :param sessions: 交易時段定義 (見 TXF_SESSIONS)
+    :return: (時段編號陣列 (不在任何時段為 -1), 時段開始奈秒陣列, 時段結束奈秒陣列)
+    """
+    day_ns = ts_ns - ts_ns % NS_PER_DAY
+    time_ns = ts_ns - day_ns
+    session_id = np.full(len(ts_ns), -1)
+    start = np.zeros(len(ts_ns), dtype=np.int64)
+    end = np.zeros(len(ts_ns), dtype=np.int64)
+    for k, (_, start_str, end_str) in enumerate(sessions):
+        open_ns, close_ns = _minutes(start_str), _minutes(end_str)
+        if close_ns > open_ns:
+            masks = [((time_ns > open_ns) & (time_ns <= close_ns), 0)]
+        else:
+            # 跨越午夜：開始當天的後半段，以及隔天的前半段
+            masks = [(time_ns > open_ns, 0), (time_ns <= close_ns, NS_PER_DAY)]
+        length = (close_ns - open_ns) % NS_PER_DAY
+        for mask, shift in masks:
+            mask &= session_id < 0
+            session_id[mask] = k
+            start[mask] = day_ns[mask] - shift + open_ns
+            end[mask] = start[mask] + length
+    return session_id, start, end
+
+
+def to_nanoseconds(ts):
+    """將時間陣列 (datetime64、字串或 int64 奈秒) 轉換為 int64 奈秒陣列，NaT 為 NAT"""
+    ts = np.asarray(ts)
+    if ts.dtype == np.int64:
+        return ts
+    if ts.dtype.kind != 'M':
+        ts = pd.to_datetime(ts).to_numpy()
+    return ts.astype('datetime64[ns]', copy=False).view(np.int64)
+
+
+class SessionCalendar:
+    """
+    數據集的交易時段索引，每個數據集只需建立一次 (見 load_calendar)，之後以陣列索引直接查詢：
+    每根K棒的時段 (session，不在任何時段為 -1)、距時段開始的時間 (offset)、缺口旗標 (flags)，
+    以及 aggregate_data 使用的日期和交易日索引 (day、trading_day)。
+    時段相關的陣列以時段索引，例如 session_close[session[i]] 為第 i 根K棒所屬時段的結束時間。
+    K棒需依時間排序。
+    """
+    __slots__ = ('ts', 'session', 'offset', 'flags', 'day', 'trading_day', 'days',
+                 'session_kind', 'session_open', 'session_close', 'session_first', 'session_count',
+                 'sessions', 'close_time', 'step')
+
+    # 儲存到 .npz 的陣列欄位
+    ARRAYS = ('ts', 'session', 'offset', 'flags', 'day', 'trading_day', 'days',
+              'session_kind', 'session_open', 'session_close', 'session_first', 'session_count')
+
+    def __init__(self, sessions, close_time, step, **arrays):
+        self.sessions = tuple(tuple(session) for session in sessions)
+        self.close_time = close_time
+        self.step = step
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def n_sessions(self):
+        return len(self.session_open)
+
+    def session_slice(self, k):
+        """第 k 個時段的K棒位置"""
+        first = int(self.session_first[k])
+        return slice(first, first + int(self.session_count[k]))
+
+    def session_name(self, k):
+        """第 k 個時段的名稱 (例如 'day'、'night')"""
+        return self.sessions[self.session_kind[k]][0]
+
+    def bounds(self):
+        """返回與 session_bounds 相同的 (時段種類, 時段開始, 時段結束) 陣列"""
+        valid = self.session >= 0
+        kind = np.full(len(self.ts), -1)
+        start = np.zeros(len(self.ts), dtype=np.int64)
+        end = np.zeros(len(self.ts), dtype=np.int64)
+        kind[valid] = self.session_kind[self.session[valid]]
+        start[valid] = self.session_open[self.session[valid]]
+        end[valid] = self.session_close[self.session[valid]]
+        return kind, start, end
+
+    def trading_days(self, close_time_str):
+        """返回與 label_sessions 相同的 (所有日期, 日期索引, 交易日索引)"""
+        if close_time_str != self.close_time:
+            raise ValueError(f"交易時段索引的收盤時間為 {self.close_time}，與 {close_time_str} 不同")
+        return self.days, self.day, self.trading_day
+
+    def trading_clock(self):
+        """
+        只計算交易時間的時鐘 (int64 奈秒)：休市時間 (午休、夜盤結束到日盤開始、週末、假日) 不計入，
+        相鄰K棒的差即為兩者之間實際經過的交易時間。不在任何時段的K棒對應到下一個時段的開始，NaT 仍為 NAT。
+        """
+        lengths = self.session_close - self.session_open
+        before = np.concatenate(([0], np.cumsum(lengths)))  # 每個時段開始前累計的交易時間
+        valid = self.session >= 0
+        clock = np.empty(len(self.ts), dtype=np.int64)
+        clock[valid] = before[self.session[valid]] + self.offset[valid]
+        outside = ~valid
+        clock[outside] = before[np.searchsorted(self.session_open, self.ts[outside], side='left')]
+        clock[self.ts == NAT] = NAT
+        return clock
+
+    def positions(self, ts):
+        """
+        返回每個時間在索引中的K棒位置 (NaT 為 -1)，用於數據切片或子集對應到建立索引時的完整數據。
+        時間不在索引中 (例如數據已更新但索引沒有重建) 時拋出 ValueError。
+        """
+        ts_ns = to_nanoseconds(ts)
+        if len(ts_ns) == len(self.ts) and np.array_equal(ts_ns, self.ts):
+            return np.arange(len(ts_ns))
+        is_nat = ts_ns == NAT
+        order = np.argsort(self.ts, kind='stable')
+        sorted_ts = np.append(self.ts[order], NAT)  # 最後一個元素讓超出範圍的位置比較失敗
+        pos = np.searchsorted(sorted_ts[:-1], ts_ns)
+        found = is_nat | (sorted_ts[pos] == ts_ns)
+        if not found.all():
+            missing = np.flatnonzero(~found)
+            raise ValueError(f"{len(missing)} 根K棒的時間不在交易時段索引中 (第一根為 "
+                             f"{pd.Timestamp(ts_ns[missing[0]])})，請使用同一份數據建立的索引")
+        result = np.append(order, -1)[pos]
+        result[is_nat] = -1
+        return result
+
+    def trading_clock_at(self, ts):
+        """
+        返回指定K棒時間的交易時間時鐘 (見 trading_clock)，K棒可以是建立索引的數據的切片或子集。
+        時間不在索引中時拋出 ValueError。
+        """
+        index = self.positions(ts)
+        clock = self.trading_clock()[index]
+        clock[index < 0] = NAT
+        return clock
+
+
+@profiled('session_calendar.build_calendar')
+def build_calendar(ts, sessions=TXF_SESSIONS, close_time='13:45', step=NS_PER_MINUTE):
+    """
+    為依時間排序的K棒建立交易時段索引。
+    :param ts: K棒時間陣列 (datetime64 或 int64 奈秒)
+    :param sessions: 交易時段定義 (見 TXF_SESSIONS)
+    :param close_time: 交易日的收盤時間 (見 aggregate_data)
+    :param step: K棒的週期 (奈秒)，用於判斷缺少的K棒
+    :return: SessionCalendar
+    """
+    ts_ns = to_nanoseconds(ts)
+    n = len(ts_ns)
+    kind, start, end = session_bounds(ts_ns, sessions)
+    valid = (kind >= 0) & (ts_ns != NAT)
+
+    # 每個時段 (以開始時間區分) 在數據中的第一根K棒和K棒數量
+    positions = np.flatnonzero(valid)
+    session_open, first, inverse = np.unique(start[valid], return_index=True, return_inverse=True)
+    session = np.full(n, -1, dtype=np.int32)
+    session[valid] = inverse
+    offset = np.zeros(n, dtype=np.int64)
+    offset[valid] = ts_ns[valid] - start[valid]
+
+    same_as_prev = np.zeros(n, dtype=bool)
+    same_as_prev[1:] = valid[1:] & (session[1:] == session[:-1])
+    same_as_next = np.zeros(n, dtype=bool)
+    same_as_next[:-1] = same_as_prev[1:]
+    gap = np.zeros(n, dtype=np.int64)
+    gap[1:] = ts_ns[1:] - ts_ns[:-1]
+    gap = np.where(same_as_prev, gap, offset)
+
+    flags = np.zeros(n, dtype=np.uint8)
+    flags[valid & ~same_as_prev] |= SESSION_START
+    flags[valid & ~same_as_next] |= SESSION_END
+    flags[valid & (gap > step)] |= MISSING_BARS
+
+    days, day, trading_day = label_sessions(ts_ns, parse_close_time(close_time))
+    return SessionCalendar(
+        sessions, close_time, step,
+        ts=ts_ns, session=session, offset=offset, flags=flags,
+        day=day.astype(np.int32), trading_day=trading_day.astype(np.int32), days=days,
+        session_kind=kind[valid][first].astype(np.int8), session_open=session_open,
+        session_close=end[valid][first], session_first=positions[first],
+        session_count=np.bincount(inverse, minlength=len(session_open)).astype(np.int64),
+    )
+
+
+def calendar_file(path):
+    """交易時段索引的檔案：bar store 存在資料夾內，CSV 存在檔案旁"""
+    if bar_store.is_bar_store(path):
+        return os.path.join(path, '_calendar.npz')
+    return path + '.calendar.npz'
+
+
+def source_signature(path):
+    """以 bar store 各分區 (或 CSV 檔案) 的大小和修改時間判斷是否需要重新計算"""
+    if not bar_store.is_bar_store(path):
+        stat = os.stat(path)
+        return {os.path.basename(path): [stat.st_size, stat.st_mtime_ns]}
+    signature = {}
+    for partition in sorted(p for p in os.listdir(path) if bar_store._is_partition(path, p)):
+        for name in bar_store.TIME_COLUMNS:
+            ts_file = os.path.join(path, partition, f"{name}.npy")
+            if os.path.exists(ts_file):
+                stat = os.stat(ts_file)
+                signature[partition] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def _meta(sessions, close_time, step, signature):
+    return {'sessions': [list(session) for session in sessions], 'close_time': close_time,
+            'step': int(step), 'source': signature}
+
+
+def save_calendar(calendar, path):
+    """將交易時段索引和數據來源的簽章存到 calendar_file(path) (先寫入暫存檔再替換)"""
+    meta = _meta(calendar.sessions, calendar.close_time, calendar.step, source_signature(path))
+    file = calendar_file(path)
+    tmp_file = file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        np.savez(f, meta=np.array(json.dumps(meta)),
+                 **{name: getattr(calendar, name) for name in SessionCalendar.ARRAYS})
+    os.replace(tmp_file, file)
+
+
+def _read_times(path):
+    if bar_store.is_bar_store(path):
+        df = bar_store.read_bars(path, columns=[])
+        return df[df.columns[0]]
+    from bar_series import read_bar_series
+    return read_bar_series(path).ts
+
+
+@profiled('session_calendar.load_calendar')
+def load_calendar(path, ts=None, sessions=TXF_SESSIONS, close_time='13:45', step=NS_PER_MINUTE):
+    """
+    讀取與數據一起儲存的交易時段索引；數據有更新、設定不同或尚未建立時重新建立並儲存。
+    :param path: bar store 資料夾或 CSV 檔案
+    :param ts: 已讀入的K棒時間 (避免重新讀取數據)，None 代表從 path 讀取
+    :return: SessionCalendar
+    """
+    file = calendar_file(path)
+    meta = _meta(sessions, close_time, step, source_signature(path))
+    if os.path.exists(file):
+        with np.load(file) as saved:
+            if json.loads(str(saved['meta'])) == meta and (ts is None or np.array_equal(saved['ts'], to_nanoseconds(ts))):
+                return SessionCalendar(sessions, close_time, step,
+                                       **{name: saved[name] for name in SessionCalendar.ARRAYS})
+
+    calendar = build_calendar(_read_times(path) if ts is None else ts, sessions, close_time, step)
+    save_calendar(calendar, path)
+    return calendar
+
+
+def main():
+    path = bar_store.dataset_path('bars', 'TXFR2', '1min')  # 一分鐘K棒的 bar store
+    calendar = load_calendar(path)
+    missing = np.count_nonzero(calendar.flags & MISSING_BARS)
+    print(f"{len(calendar)} 根K棒，{calendar.n_sessions} 個交易時段，{missing} 處缺少K棒")
+    print(f"交易時段索引已儲存至 {calendar_file(path)}")
+
+
+if __name__ == "__main__":
+    main()
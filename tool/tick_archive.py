@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+import os
+from profiling import profiled
+
+# 資料夾結構: {root}/{contract}/{YYYY-MM}/{YYYY-MM-DD}.npz，每個交易日一個壓縮檔 (np.savez_compressed)。
+# 檔案寫入後不再修改 (只會新增交易日)，已存在的交易日代表已下載完成，可作為續傳的進度。
+# 時間和價格以差分編碼儲存：相鄰逐筆的差值很小，可以用 int8/int16 存放，壓縮後只需原本的一小部分。
+# 時間以所有成交共同的最大單位 (毫秒、微秒或奈秒) 計算差值；休市之類少數放不進 int16 的差值
+# 另外記錄位置和數值 (*_jump_index、*_jump)，不會讓整個陣列變成 int32/int64。
+COLUMNS = ('ts', 'price', 'volume', 'tick_type')
+
+
+def archive_path(root, contract):
+    """返回指定合約的逐筆成交資料夾路徑，例如 ticks/TXFR1"""
+    return os.path.join(root, contract)
+
+
+def day_file(path, day):
+    """返回交易日 (YYYY-MM-DD) 的檔案路徑"""
+    return os.path.join(path, day[:7], f"{day}.npz")
+
+
+def has_day(path, day):
+    return os.path.exists(day_file(path, day))
+
+
+def archived_days(path):
+    """返回已儲存的所有交易日 (依日期排序)"""
+    if not os.path.isdir(path):
+        return []
+    days = []
+    for month in os.listdir(path):
+        month_dir = os.path.join(path, month)
+        if os.path.isdir(month_dir):
+            days.extend(name[:-4] for name in os.listdir(month_dir) if name.endswith('.npz'))
+    return sorted(days)
+
+
+def smallest_int(values):
+    """以能容納所有數值的最小整數型態返回陣列"""
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+            return values.astype(dtype)
+    return values.astype(np.int64)
+
+
+JUMP_DTYPE = np.int16  # 超出此範圍的差值另外存放
+TIME_UNITS = (10**6, 10**3, 1)  # 毫秒、微秒、奈秒
+
+
+def split_jumps(deltas):
+    """
+    將超出 JUMP_DTYPE 範圍的少數差值分開存放 (原位置設為 0)。
+    分開後沒有比較小 (超出範圍的差值很多) 時不拆分。
+    :return: (差值陣列, 超出範圍的位置, 超出範圍的差值)
+    """
+    info = np.iinfo(JUMP_DTYPE)
+    jump_index = np.flatnonzero((deltas < info.min) | (deltas > info.max))
+    plain = smallest_int(deltas)
+    if len(jump_index) == 0:
+        return plain, jump_index, deltas[jump_index]
+    narrow = deltas.copy()
+    narrow[jump_index] = 0
+    narrow = smallest_int(narrow)
+    if narrow.nbytes + len(jump_index) * 16 >= plain.nbytes:
+        return plain, jump_index[:0], deltas[:0]
+    return narrow, jump_index, deltas[jump_index]
+
+
+def delta_encode(values):
+    """
+    返回第一個數值、相鄰的差值陣列 (最小整數型態) 和另外存放的大差值 (見 split_jumps)。
+    :return: (first, deltas, jump_index, jumps)
+    """
+    values = np.asarray(values, dtype=np.int64)
+    if len(values) == 0:
+        return 0, np.array([], dtype=np.int8), np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    return (int(values[0]), *split_jumps(np.diff(values)))
+
+
+def delta_decode(first, deltas, jump_index=(), jumps=()):
+    """delta_encode 的反向運算，返回 int64 陣列"""
+    deltas = np.asarray(deltas, dtype=np.int64)
+    if len(jump_index):
+        deltas = deltas.copy()
+        deltas[np.asarray(jump_index)] = jumps
+    values = np.empty(len(deltas) + 1, dtype=np.int64)
+    values[0] = first
+    np.cumsum(deltas, out=values[1:])
+    values[1:] += first
+    return values
+
+
+def time_unit(ts):
+    """返回能整除所有時間 (int64 奈秒) 的最大單位 (見 TIME_UNITS)"""
+    for unit in TIME_UNITS:
+        if np.all(ts % unit == 0):
+            return unit
+    return 1
+
+
+def encode_ticks(df, price_scale=1):
+    """
+    將逐筆成交轉換為儲存用的陣列。
+    :param df: 包含 ts/price/volume 列 (可選 tick_type) 的 DataFrame，依成交順序排列
+    :param price_scale: 價格乘上此數值後必須為整數 (期貨為 1，兩位小數的股票為 100)
+    :return: {名稱: 陣列}
+    """
+    ts = pd.to_datetime(df['ts']).to_numpy(dtype='datetime64[ns]').view(np.int64)
+    price = df['price'].to_numpy(dtype=np.float64)
+    scaled = np.round(price * price_scale)
+    if not np.array_equal(scaled / price_scale, price):
+        raise ValueError(f"價格無法以 price_scale={price_scale} 表示為整數")
+    volume = df['volume'].to_numpy(dtype=np.int64)
+    tick_type = df['tick_type'].to_numpy() if 'tick_type' in df.columns else np.zeros(len(df))
+
+    unit = time_unit(ts)
+    ts_first, ts_delta, ts_jump_index, ts_jump = delta_encode(ts // unit)
+    price_first, price_delta, price_jump_index, price_jump = delta_encode(scaled)
+    return {
+        'rows': np.int64(len(df)),
+        'price_scale': np.int64(price_scale),
+        'ts_unit': np.int64(unit),
+        'ts_first': np.int64(ts_first),
+        'ts_delta': ts_delta,
+        'ts_jump_index': ts_jump_index,
+        'ts_jump': ts_jump,
+        'price_first': np.int64(price_first),
+        'price_delta': price_delta,
+        'price_jump_index': price_jump_index,
+        'price_jump': price_jump,
+        'volume': smallest_int(volume),
+        'tick_type': tick_type.astype(np.int8),
+    }
+
+
+def decode_ticks(data):
+    """
+    encode_ticks 的反向運算，返回 {欄位: 陣列} (ts 為 int64 奈秒，price 為 float64)。
+    也能讀取沒有 ts_unit 和 *_jump 欄位的舊檔案 (以奈秒計算差值、沒有另外存放的差值)。
+    """
+    if int(data['rows']) == 0:
+        return {'ts': np.array([], dtype=np.int64), 'price': np.array([], dtype=np.float64),
+                'volume': np.array([], dtype=np.int64), 'tick_type': np.array([], dtype=np.int8)}
+    jumps = {name: data[name] if name in data else () for name in
+             ('ts_jump_index', 'ts_jump', 'price_jump_index', 'price_jump')}
+    unit = int(data['ts_unit']) if 'ts_unit' in data else 1
+    return {
+        'ts': delta_decode(int(data['ts_first']), data['ts_delta'], jumps['ts_jump_index'], jumps['ts_jump']) * unit,
+        'price': delta_decode(int(data['price_first']), data['price_delta'],
+                              jumps['price_jump_index'], jumps['price_jump']) / int(data['price_scale']),
+        'volume': data['volume'].astype(np.int64),
+        'tick_type': data['tick_type'],
+    }
+
+
+def write_day(path, day, df, price_scale=1):
+    """
+    新增一個交易日的逐筆成交 (沒有成交的交易日也會寫入空檔案，代表已下載)。
+    先寫入暫存檔再改名，中斷時不會留下寫到一半的檔案。
+    :return: 檔案大小 (bytes)
+    """
+    file = day_file(path, day)
+    if os.path.exists(file):
+        raise FileExistsError(f"{day} 已存在，逐筆成交檔案不會被覆寫")
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    tmp_file = file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        np.savez_compressed(f, **encode_ticks(df, price_scale))
+    os.replace(tmp_file, file)
+    return os.path.getsize(file)
+
+
+def read_day(path, day):
+    """讀取單一交易日，返回 {欄位: 陣列}"""
+    with np.load(day_file(path, day)) as data:
+        return decode_ticks(data)
+
+
+@profiled('tick_archive.read_ticks')
+def read_ticks(path, start_date=None, end_date=None):
+    """
+    讀取交易日在 [start_date, end_date] 之間的逐筆成交。
+    :param start_date: 開始的交易日 (YYYY-MM-DD)，None 代表不限制
+    :param end_date: 結束的交易日 (YYYY-MM-DD)，None 代表不限制
+    :return: 依交易日和成交順序排列的 DataFrame (ts/price/volume/tick_type)
+    """
+    days = [day for day in archived_days(path)
+            if (start_date is None or day >= start_date) and (end_date is None or day <= end_date)]
+    chunks = [read_day(path, day) for day in days]
+    if not chunks:
+        chunks = [decode_ticks({'rows': 0})]
+    data = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in COLUMNS}
+    data['ts'] = data['ts'].view('datetime64[ns]')
+    return pd.DataFrame(data)
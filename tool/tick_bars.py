@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+import sys
+import bar_store
+import tick_archive
+from profiling import profiled
+from session_calendar import NS_PER_MINUTE, TXF_SESSIONS, session_bounds
+
+BAR_COLUMNS = ('ts', 'open', 'high', 'low', 'close', 'volume', 'ticks')
+
+
+def _tick_arrays(ticks):
+    """從 read_ticks 的 DataFrame (或 {欄位: 陣列}) 取出 int64 時間、價格和成交量陣列"""
+    ts = np.asarray(ticks['ts'])
+    if ts.dtype.kind == 'M':
+        ts = ts.astype('datetime64[ns]', copy=False).view(np.int64)
+    return ts, np.asarray(ticks['price'], dtype=np.float64), np.asarray(ticks['volume'], dtype=np.int64)
+
+
+def _reduce(price, volume, starts, labels):
+    """依每根K棒第一筆成交的位置合併，返回 OHLCV 和成交筆數的 DataFrame"""
+    if len(starts) == 0:
+        return pd.DataFrame({name: np.array([], dtype=np.float64) for name in BAR_COLUMNS}).astype(
+            {'ts': 'datetime64[ns]', 'volume': np.int64, 'ticks': np.int64})
+    ends = np.append(starts[1:], len(price))
+    return pd.DataFrame({
+        'ts': labels.view('datetime64[ns]'),
+        'open': price[starts],
+        'high': np.maximum.reduceat(price, starts),
+        'low': np.minimum.reduceat(price, starts),
+        'close': price[ends - 1],
+        'volume': np.add.reduceat(volume, starts),
+        'ticks': ends - starts,
+    })
+
+
+def _change_points(keys):
+    """返回 keys 中每段連續相同數值的開始位置"""
+    if len(keys) == 0:
+        return np.array([], dtype=np.int64)
+    return np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+
+
+def session_keys(ts_ns, sessions=TXF_SESSIONS):
+    """
+    每筆成交所屬交易時段的開始時間 (不在任何時段為 0)，用於讓成交量和成交筆數K棒不跨越交易時段。
+    以成交所屬一分鐘K棒的結束時間判斷，與一分鐘K棒的時段歸屬相同。
+    """
+    _, start, _ = session_bounds((ts_ns // NS_PER_MINUTE + 1) * NS_PER_MINUTE, sessions)
+    return start
+
+
+@profiled('tick_bars.build_time_bars')
+def build_time_bars(ticks, freq='1min'):
+    """
+    時間K棒：ts 為該K棒的結束時間 (與 fetch_kbars 相同，08:45:00 ~ 08:45:59 的成交屬於 08:46 的K棒)。
+    :param ticks: 依成交順序排列的逐筆成交 (見 tick_archive.read_ticks)
+    :param freq: 週期，例如 '5s'、'30s'、'1min'
+    """
+    ts, price, volume = _tick_arrays(ticks)
+    step = pd.Timedelta(freq).value
+    labels = (ts // step + 1) * step
+    starts = _change_points(labels)
+    return _reduce(price, volume, starts, labels[starts])
+
+
+def _bucket_bars(ts, price, volume, counts, size, by_session, sessions):
+    """
+    依每個時段內累計的 counts (成交筆數或成交量) 每跨過 size 的倍數切一根K棒，
+    ts 為K棒最後一筆成交的時間。
+    """
+    if len(ts) == 0:
+        return _reduce(price, volume, np.array([], dtype=np.int64), ts)
+    segment = session_keys(ts, sessions) if by_session else np.zeros(len(ts), dtype=np.int64)
+    segment_starts = _change_points(segment)
+    lengths = np.diff(np.append(segment_starts, len(ts)))
+    cumulative = np.cumsum(counts) - counts  # 這筆成交之前的累計數量
+    before = cumulative - np.repeat(cumulative[segment_starts], lengths)  # 同一時段內之前的累計數量
+    bucket = before // size
+    change = (segment[1:] != segment[:-1]) | (bucket[1:] != bucket[:-1])
+    starts = np.flatnonzero(np.concatenate(([True], change)))
+    ends = np.append(starts[1:], len(ts))
+    return _reduce(price, volume, starts, ts[ends - 1])
+
+
+@profiled('tick_bars.build_volume_bars')
+def build_volume_bars(ticks, size, by_session=True, sessions=TXF_SESSIONS):
+    """
+    成交量K棒：時段內的累計成交量每跨過 size 的倍數切一根K棒。
+    單筆成交不拆開，跨過倍數的那筆成交屬於前一根K棒，因此各K棒的成交量會在 size 上下。
+    :param by_session: 每個交易時段重新累計，K棒不跨越交易時段
+    """
+    ts, price, volume = _tick_arrays(ticks)
+    return _bucket_bars(ts, price, volume, volume, size, by_session, sessions)
+
+
+@profiled('tick_bars.build_tick_bars')
+def build_tick_bars(ticks, size, by_session=True, sessions=TXF_SESSIONS):
+    """
+    成交筆數K棒：每 size 筆成交切一根K棒。
+    :param by_session: 每個交易時段重新計數，K棒不跨越交易時段
+    """
+    ts, price, volume = _tick_arrays(ticks)
+    return _bucket_bars(ts, price, volume, np.ones(len(ts), dtype=np.int64), size, by_session, sessions)
+
+
+def build_bars(path, kind, size, start_date=None, end_date=None):
+    """
+    從逐筆成交檔案庫產生K棒。
+    :param path: 逐筆成交資料夾 (見 tick_archive.archive_path)
+    :param kind: 'time' (size 為週期，例如 '10s')、'volume' (size 為口數) 或 'tick' (size 為筆數)
+    :param start_date: 開始的交易日，None 代表不限制
+    :param end_date: 結束的交易日，None 代表不限制
+    :return: 包含 ts/open/high/low/close/volume/ticks 的 DataFrame
+    """
+    ticks = tick_archive.read_ticks(path, start_date, end_date)
+    if kind == 'time':
+        return build_time_bars(ticks, size)
+    if kind == 'volume':
+        return build_volume_bars(ticks, int(size))
+    if kind == 'tick':
+        return build_tick_bars(ticks, int(size))
+    raise ValueError(f"未知的K棒類型: {kind}")
+
+
+def main(kind='time', size='10s'):
+    path = tick_archive.archive_path('ticks', 'TXFR1')  # get_ticks_from_shioaji 下載的逐筆成交
+    bars = build_bars(path, kind, size)
+    store_path = bar_store.dataset_path('bars', 'TXFR1', f"{kind}_{size}")
+    bar_store.write_bars(bars, store_path)
+    print(f"{len(bars)} 根K棒已儲存至 {store_path}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
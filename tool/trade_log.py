@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+# 交易方向
+BUY = 1
+SELL = -1
+
+# 每筆交易的欄位 (時間, 方向, 成交點數, 成交價金, 手續費, 交易稅, 淨收付, 淨獲利)
+# 買入的淨獲利為 NaN；策略可以在後面加上自己的欄位 (例如均線數值)
+TRADE_FIELDS = [
+    ('ts', 'datetime64[ns]'),
+    ('side', 'i1'),
+    ('price', 'f8'),
+    ('total', 'f8'),
+    ('fee', 'f8'),
+    ('tax', 'f8'),
+    ('net', 'f8'),
+    ('profit', 'f8'),
+]
+
+
+def make_trades(buys, sells, extra_fields=()):
+    """
+    將買入和賣出的欄位陣列依交易順序 (買、賣交錯) 合併成一個結構化陣列。
+    :param buys: {欄位名稱: 陣列}，每筆買入一個值 ('side' 和 'profit' 可省略)
+    :param sells: {欄位名稱: 陣列}，每筆賣出一個值，數量等於買入數量或少一筆
+    :param extra_fields: 額外的欄位定義，例如 [('short_ma', 'f8')]
+    :return: dtype 為 TRADE_FIELDS + extra_fields 的結構化陣列
+    """
+    dtype = np.dtype(TRADE_FIELDS + list(extra_fields))
+    n_buys, n_sells = len(buys['ts']), len(sells['ts'])
+    trades = np.zeros(n_buys + n_sells, dtype=dtype)
+    trades['side'][0::2] = BUY
+    trades['side'][1::2] = SELL
+    trades['profit'][0::2] = np.nan
+    for name in dtype.names:
+        if name in buys:
+            trades[name][0::2] = buys[name]
+        if name in sells:
+            trades[name][1::2] = sells[name]
+    return trades
+
+
+def save_trades(file_name, trades):
+    """以欄位為單位將交易紀錄一次寫入 .npz 檔案 (不產生文字)"""
+    np.savez(file_name, **{name: trades[name] for name in trades.dtype.names})
+
+
+def load_trades(file_name):
+    """讀取 save_trades 寫入的交易紀錄，返回結構化陣列"""
+    with np.load(file_name) as data:
+        names = list(data.files)
+        trades = np.zeros(len(data[names[0]]) if names else 0,
+                          dtype=[(name, data[name].dtype) for name in names])
+        for name in names:
+            trades[name] = data[name]
+    return trades